@@ -0,0 +1,110 @@
+# benchmarks/bench_aggregates.py
+"""
+Spending rollups vs aggregating the expenses table on every request.
+
+Bulk-loads synthetic expenses into a throwaway SQLite database, rebuilds the
+rollups, checks they match a GROUP BY over expenses, then times the dashboard
+queries both ways plus the spending-limit lookup and the per-expense write cost.
+
+    python -m benchmarks.bench_aggregates [--expenses 500000] [--days 90]
+"""
+from benchmarks.common import use_temp_workdir
+
+use_temp_workdir()
+
+import argparse
+import datetime
+import random
+import time
+import warnings
+
+from sqlalchemy import case, func, insert, select
+
+from benchmarks.common import print_row, time_calls
+from src import aggregates, crud, models
+from src.database import SessionLocal, init_db
+
+warnings.filterwarnings("ignore")
+
+
+def seed_expenses(db, n, days, citizens=50000, vendors=200, schemes=20, seed=5):
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    rows = [
+        {
+            "expense_id": f"EXP{i:010d}",
+            "cnic": f"{rng.randrange(citizens):013d}",
+            "scheme_id": f"scheme_{rng.randrange(schemes):02d}",
+            "vendor_cnic": f"V{rng.randrange(vendors):05d}",
+            "total_amount": float(rng.choice([1000, 2500, 4000, 6000])),
+            "is_fraudulent": rng.random() < 0.05,
+            "created_at": now - datetime.timedelta(seconds=rng.uniform(0, days * 86400)),
+        }
+        for i in range(n)
+    ]
+    for start in range(0, n, 50000):
+        db.execute(insert(models.Expense), rows[start:start + 50000])
+    db.commit()
+
+
+def scan_query(column, day_from):
+    """The same per-key, per-day rollup computed from expenses."""
+    E = models.Expense
+    day = func.date(E.created_at)
+    return (
+        select(getattr(E, column).label("key"), day.label("day"), func.count().label("expense_count"),
+               func.sum(E.total_amount).label("total_amount"),
+               func.sum(case((E.is_fraudulent.is_(True), 1), else_=0)).label("fraud_count"))
+        .where(E.created_at >= datetime.datetime.combine(day_from, datetime.time()))
+        .group_by(getattr(E, column), day).order_by(getattr(E, column), day)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--expenses", type=int, default=500_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    init_db()
+    db = SessionLocal()
+    started = time.perf_counter()
+    seed_expenses(db, args.expenses, args.days)
+    print(f"seeded {args.expenses:,} expenses over {args.days} days in {time.perf_counter() - started:.1f}s")
+
+    started = time.perf_counter()
+    aggregates.rebuild(db)
+    rollups = db.scalar(select(func.count()).select_from(models.SpendingRollup))
+    print(f"rebuilt {rollups:,} rollups in {time.perf_counter() - started:.2f}s")
+
+    week_ago = datetime.datetime.utcnow().date() - datetime.timedelta(days=6)
+    fields = ("key", "day", "expense_count", "total_amount", "fraud_count")
+    scanned = [tuple(r) for r in db.execute(scan_query("scheme_id", week_ago))]
+    rolled = [
+        tuple(row[f] if f != "day" else row[f].isoformat() for f in fields)
+        for row in crud.spending_rollups(db, "scheme", day_from=week_ago, limit=100000)
+    ]
+    print(f"parity with a GROUP BY over expenses: {'OK' if scanned == rolled else 'MISMATCH'}")
+
+    calls = [()] * args.repeat
+    cases = {
+        "scan: per scheme per day, last 7d": lambda: db.execute(scan_query("scheme_id", week_ago)).all(),
+        "rollup: per scheme per day, last 7d": lambda: crud.spending_rollups(db, "scheme", day_from=week_ago),
+        "scan: top vendors, all time": lambda: db.execute(scan_query("vendor_cnic", datetime.date.min)).all(),
+        "rollup: top vendors, all time": lambda: crud.spending_rollups(db, "vendor", by_day=False, sort="total", limit=20),
+        "rollup: one citizen, by day": lambda: crud.spending_rollups(db, "citizen", key=f"{7:013d}"),
+        "spending limit lookup": lambda: crud.spending_limit_exceeded(db, f"{7:013d}", 2500),
+    }
+    for label, fn in cases.items():
+        print_row(label, time_calls(fn, calls, warmup=2))
+
+    expense = {"cnic": f"{7:013d}", "scheme_id": "scheme_00", "vendor_cnic": "V00000",
+               "total_amount": 2500.0, "products": [], "is_fraudulent": False}
+    writes = [(dict(expense, expense_id=f"NEW{i:08d}"),) for i in range(args.repeat * 10)]
+    print_row("create_expense_record (+ rollups)", time_calls(lambda e: crud.create_expense_record(db, e), writes, warmup=0))
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_async.py
+"""
+Sync vs async throughput on the existing endpoints.
+
+The "sync" app re-creates the original blocking routes (def handlers on the
+threadpool, SessionLocal, inline inference) on top of the sync crud
+functions; the "async" app is main.app. Both run in-process against the
+same temporary SQLite database via httpx's ASGI transport.
+
+    python -m benchmarks.bench_async [--requests 2000] [--concurrency 1 16 64]
+"""
+from benchmarks.common import use_temp_workdir
+
+use_temp_workdir()
+
+import argparse
+import asyncio
+import warnings
+
+import httpx
+from fastapi import Depends, FastAPI, Response
+from sqlalchemy.orm import Session
+
+import main
+from benchmarks.common import run_load
+from src import crud
+from src.database import get_db
+from src.schemas import TrustScoreRequest, VerifyEligibilityRequest
+
+warnings.filterwarnings("ignore")
+
+
+def build_sync_app():
+    sync_app = FastAPI()
+
+    @sync_app.post("/verify-eligibility")
+    def verify(request: VerifyEligibilityRequest, db: Session = Depends(get_db)):
+        eligible, reasons = crud.check_scheme_eligibility(db, request.cnic, request.scheme_id)
+        crud.create_application(db, request.cnic, request.scheme_id, eligible)
+        return {"eligible": eligible, "reasons": reasons}
+
+    @sync_app.post("/trust-score")
+    def trust(request: TrustScoreRequest):
+        score, verified, reasons = crud.calculate_trust_score(request.cnic, request.phone_number)
+        return {"trust_score": score, "reasons": reasons}
+
+    @sync_app.get("/expenses")
+    def expenses(response: Response, db: Session = Depends(get_db)):
+        rows, _ = crud.list_expenses(db, {}, None, 100)
+        return [dict(row) for row in rows]
+
+    return sync_app
+
+
+ENDPOINTS = {
+    "POST /verify-eligibility": lambda c, i, tag: c.post(
+        "/verify-eligibility", json={"cnic": f"{tag}{i:010d}", "scheme_id": "rashan_scheme"}),
+    "POST /trust-score": lambda c, i, tag: c.post(
+        "/trust-score", json={"cnic": f"{tag}{i:010d}", "phone_number": "03001234567"}),
+    "GET /expenses": lambda c, i, tag: c.get("/expenses"),
+}
+
+
+async def bench(args):
+    await main.startup()
+    await main.app.state.warmup
+    apps = {"sync": build_sync_app(), "async": main.app}
+    print(f"{'endpoint':<26}{'mode':<7}{'conc':>5}{'req/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, make in ENDPOINTS.items():
+        for concurrency in args.concurrency:
+            for mode, app in apps.items():
+                # Fresh CNICs per run so the result caches never short-circuit the work
+                tag = f"{mode[0]}{concurrency:02d}"[:3]
+                transport = httpx.ASGITransport(app=app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                    stats = await run_load(lambda i: make(client, i, tag), args.requests, concurrency)
+                print(
+                    f"{name:<26}{mode:<7}{concurrency:>5}{stats['calls_per_s']:>10.0f}"
+                    f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}"
+                    + (f"  errors={stats['errors']}" if stats["errors"] else "")
+                )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    asyncio.run(bench(parser.parse_args()))
@@ -0,0 +1,73 @@
+# benchmarks/bench_fraud.py
+"""
+Replays a synthetic expense stream through the streaming fraud engine and
+reports throughput, per-expense latency and how many expenses each rule flagged.
+
+    python -m benchmarks.bench_fraud [--expenses 1000000] [--citizens 200000] [--days 30]
+"""
+import argparse
+import random
+import resource
+import time
+
+from benchmarks.common import summarize
+from src.fraud import FraudEngine
+
+ITEMS = [("Wheat Flour", 1500), ("Rice", 1000), ("Sugar", 700), ("Cooking Oil", 1200), ("Lentils", 600)]
+
+
+def synthetic_stream(n, citizens, vendors, days, seed=7):
+    rng = random.Random(seed)
+    baskets = [
+        [{"item": item, "qty": "1", "price": price} for item, price in rng.sample(ITEMS, rng.randint(1, 4))]
+        for _ in range(40)
+    ]
+    start = time.time() - days * 86400
+    step = days * 86400 / n
+    for i in range(n):
+        basket = rng.choice(baskets)
+        yield {
+            "cnic": f"{rng.randrange(citizens):013d}",
+            "scheme_id": rng.choice(["rashan_scheme", "scholarship_scheme", "health_scheme"]),
+            "vendor_cnic": f"V{rng.randrange(vendors):05d}",
+            "total_amount": float(sum(p["price"] for p in basket)),
+            "products": basket,
+            "created_at": start + i * step,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--expenses", type=int, default=1_000_000)
+    parser.add_argument("--citizens", type=int, default=200_000)
+    parser.add_argument("--vendors", type=int, default=500)
+    parser.add_argument("--days", type=float, default=30)
+    args = parser.parse_args()
+
+    stream = list(synthetic_stream(args.expenses, args.citizens, args.vendors, args.days))
+    engine = FraudEngine()
+    engine.limits = {f"{i:013d}": 20000.0 for i in range(0, args.citizens, 10)}
+
+    samples = []
+    perf = time.perf_counter
+    started = perf()
+    for i, expense in enumerate(stream):
+        if i % 100 == 0:
+            t0 = perf()
+            engine.check(expense)
+            samples.append(perf() - t0)
+        else:
+            engine.check(expense)
+    elapsed = perf() - started
+
+    stats = summarize(samples)
+    print(f"replayed {args.expenses:,} expenses in {elapsed:.2f}s -> {args.expenses / elapsed:,.0f} expenses/s")
+    print(f"per expense: p50 {stats['p50_ms'] * 1000:.1f}us  p99 {stats['p99_ms'] * 1000:.1f}us")
+    print(f"peak RSS: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    report = engine.stats()
+    print("flagged:", ", ".join(f"{k}={v:,}" for k, v in sorted(report["flagged"].items())))
+    print("tracked keys:", report["tracked_keys"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# benchmarks/bench_inference.py
+"""
+Parity check and microbenchmark for the compiled inference kernels.
+
+1. Verifies that the kernels in src/inference.py reproduce model.predict
+   exactly on every row of synthetic_data.csv (exits non-zero otherwise).
+2. Times single-row scoring through pandas + model.predict against the
+   kernel path used by src/crud.py, and the flattened trust forest
+   (src/trust_model_flat.npz) when it is available.
+"""
+import sys
+import warnings
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import time_calls, print_row
+from src.registry import MODEL_REGISTRY
+from src.inference import ELIGIBILITY_FEATURES, TRUST_FEATURES, flatten_forest
+
+warnings.filterwarnings("ignore")
+
+
+def check_parity(name, model, kernel, df, features, rows=1000):
+    if model is None:
+        print(f"[{name}] model not found, skipping")
+        return True
+    expected = model.predict(df[features])
+    batch = kernel.predict(df[features].to_numpy(dtype=float))
+    records = df[features].to_dict("records")
+    single = np.array([kernel.predict_one(r) for r in records[:rows]])
+    ok = np.array_equal(expected, batch) and np.array_equal(expected[:rows], single)
+    print(f"[{name}] parity on {len(df)} rows (batch) / {rows} rows (single): {'OK' if ok else 'MISMATCH'}")
+    if not ok:
+        print(f"  max abs diff: {np.max(np.abs(expected.astype(float) - batch.astype(float)))}")
+    return ok
+
+
+def bench(name, model, kernel, df, features, calls=2000, flat=None):
+    if model is None:
+        return
+    records = df[features].head(calls).to_dict("records")
+    args = [(r,) for r in records]
+    print_row(f"{name}: pandas + model.predict", time_calls(lambda r: model.predict(pd.DataFrame([r])), args))
+    print_row(f"{name}: compiled kernel", time_calls(kernel.predict_one, args))
+    if flat is not None:
+        print_row(f"{name}: flattened forest", time_calls(flat.predict_one, args))
+        X = df[features].to_numpy(dtype=float)
+        print_row(f"{name}: compiled kernel (batch of {len(X)})", time_calls(kernel.predict, [(X,)] * 5, warmup=1))
+        print_row(f"{name}: flattened forest (batch of {len(X)})", time_calls(flat.predict, [(X,)] * 5, warmup=1))
+
+
+def main():
+    df = pd.read_csv("synthetic_data.csv")
+    m = MODEL_REGISTRY.current()
+    print(f"Model version: {m.version}")
+    ok = check_parity("eligibility", m.eligibility_model, m.eligibility_kernel, df, ELIGIBILITY_FEATURES)
+    ok &= check_parity("trust", m.trust_model, m.trust_kernel, df, TRUST_FEATURES)
+    flat = m.trust_flat
+    if flat is None and m.trust_model is not None:
+        flat = flatten_forest(m.trust_model)
+    ok &= check_parity("trust (flat)", m.trust_model, flat, df, TRUST_FEATURES)
+    if not ok:
+        sys.exit(1)
+    bench("eligibility", m.eligibility_model, m.eligibility_kernel, df, ELIGIBILITY_FEATURES)
+    bench("trust", m.trust_model, m.trust_kernel, df, TRUST_FEATURES, calls=300, flat=flat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+# benchmarks/bench_ingest.py
+"""
+Bulk expense ingestion throughput, in-process against a throwaway SQLite database.
+
+Streams synthetic POS sales as NDJSON through POST /expenses/bulk at several
+chunk sizes, and compares them with creating the same number of expenses one
+request at a time through /submit-proposal. First checks that clean uploads
+are not flagged as fraud: a vendor's day of sales for one scheme without
+created_at, and rows backdated behind a citizen's live expenses.
+
+    python -m benchmarks.bench_ingest [--rows 50000] [--chunk-sizes 100 1000 5000]
+"""
+from benchmarks.common import use_temp_workdir
+
+use_temp_workdir()
+
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import sys
+import time
+import warnings
+
+import httpx
+
+import main
+from src import crud
+from src.database import SessionLocal
+
+warnings.filterwarnings("ignore")
+
+VENDOR = "9999999999999"
+PRODUCTS = [{"item": "Wheat Flour", "qty": "10kg", "price": 1500}, {"item": "Rice", "qty": "5kg", "price": 1000}]
+
+
+def ndjson(rows, tag, seed=9):
+    rng = random.Random(seed)
+    start = datetime.datetime(2026, 1, 1)
+    return "".join(
+        json.dumps({
+            "cnic": f"{tag}{rng.randrange(10**9):09d}",
+            "scheme_id": "rashan_scheme",
+            "vendor_cnic": VENDOR,
+            "total_amount": 2500.0,
+            "products": PRODUCTS,
+            # Spread over a day so the fraud windows see realistic traffic
+            "created_at": (start + datetime.timedelta(seconds=86400 * i / rows)).isoformat(),
+        }) + "\n"
+        for i in range(rows)
+    ).encode()
+
+
+async def stream(body, piece=1 << 16):
+    for i in range(0, len(body), piece):
+        yield body[i:i + piece]
+
+
+async def upload(client, entries):
+    body = "".join(json.dumps(entry) + "\n" for entry in entries).encode()
+    response = await client.post("/expenses/bulk", content=body, headers={"content-type": "application/x-ndjson"})
+    return response.json()
+
+
+async def check_fraud_flags(client, rows=2500):
+    """True when none of the clean uploads below gets a fraud flag."""
+    # One vendor's upload for one scheme, all stamped "now" by the server
+    same_minute = [
+        {"cnic": f"F{i:012d}", "scheme_id": "rashan_scheme", "vendor_cnic": VENDOR,
+         "total_amount": 2500.0, "products": PRODUCTS}
+        for i in range(rows)
+    ]
+    report = await upload(client, same_minute)
+    ok = report["inserted"] == rows and report["fraud_flagged"] == 0
+    print(f"{rows:,} rows for one scheme in one upload: flagged {report['fraud_flagged']:,}  {'OK' if ok else 'MISMATCH'}")
+
+    # Two expenses now, then three from 20h ago: three in 24h at most, at any point in time
+    now = datetime.datetime.now(datetime.timezone.utc)
+    def sale(i, at=None):
+        entry = {"cnic": "G000000000001", "scheme_id": "rashan_scheme", "vendor_cnic": VENDOR,
+                 "total_amount": 1000.0, "products": [{"item": f"Item {i}", "qty": "1", "price": 1000}]}
+        return dict(entry, created_at=at.isoformat()) if at else entry
+    live = await upload(client, [sale(0), sale(1)])
+    backdated = await upload(client, [sale(2 + i, now - datetime.timedelta(hours=20, minutes=i)) for i in range(3)])
+    flagged = live["fraud_flagged"] + backdated["fraud_flagged"]
+    backdated_ok = live["inserted"] + backdated["inserted"] == 5 and flagged == 0
+    print(f"backdated rows behind live expenses: flagged {flagged}  {'OK' if backdated_ok else 'MISMATCH'}")
+    return ok and backdated_ok
+
+
+async def run(args):
+    await main.startup()
+    await main.app.state.warmup
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        ok = await check_fraud_flags(client)
+        for chunk_size in args.chunk_sizes:
+            body = ndjson(args.rows, f"B{chunk_size:05d}")
+            started = time.perf_counter()
+            response = await client.post(
+                f"/expenses/bulk?chunk_size={chunk_size}", content=stream(body),
+                headers={"content-type": "application/x-ndjson"}
+            )
+            elapsed = time.perf_counter() - started
+            report = response.json()
+            print(f"bulk, chunks of {chunk_size:<6,} {args.rows / elapsed:>10,.0f} rows/s  "
+                  f"inserted {report['inserted']:,}  rejected {report['rejected']:,}  flagged {report['fraud_flagged']:,}")
+
+        n = min(args.rows, args.single)
+        db = SessionLocal()
+        try:
+            crud.create_applications_bulk(db, [
+                {"cnic": f"S{i:012d}", "scheme_id": "rashan_scheme", "eligible": True} for i in range(n)
+            ])
+        finally:
+            db.close()
+        started = time.perf_counter()
+        for i in range(n):
+            await client.post("/submit-proposal", json={
+                "cnic": f"S{i:012d}", "scheme_id": "rashan_scheme", "government_decision": "ACCEPTED"
+            })
+        elapsed = time.perf_counter() - started
+        print(f"one at a time (/submit-proposal) {n / elapsed:>10,.0f} rows/s  ({n:,} requests)")
+    return ok
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--single", type=int, default=2000, help="Requests for the one-at-a-time comparison")
+    if not asyncio.run(run(parser.parse_args())):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,79 @@
+# benchmarks/bench_jobs.py
+"""
+Background eligibility jobs vs synchronous /verify-eligibility, in-process.
+
+Sends the same burst of eligibility checks both ways at a fixed concurrency:
+synchronously (each request waits for the model), and as jobs (each request
+only stores the job; workers run them in micro-batches). For jobs it reports
+how long submitting took, how long until every job finished, and how many
+model calls (batches) that took.
+
+    python -m benchmarks.bench_jobs [--jobs 2000] [--concurrency 16]
+"""
+from benchmarks.common import use_temp_workdir
+
+use_temp_workdir()
+
+import argparse
+import asyncio
+import time
+import warnings
+
+import httpx
+
+import main
+from src.jobs import JOB_QUEUE
+
+warnings.filterwarnings("ignore")
+
+
+async def burst(client, n, concurrency, path, tag):
+    """Sends n eligibility requests with at most `concurrency` in flight; returns their responses."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            return await client.post(path, json={"cnic": f"{tag}{i:012d}", "scheme_id": "rashan_scheme"})
+
+    return await asyncio.gather(*[one(i) for i in range(n)])
+
+
+async def drained(kind, expected, poll=0.01):
+    while sum(n for (k, _), n in JOB_QUEUE.finished.items() if k == kind) < expected:
+        await asyncio.sleep(poll)
+
+
+async def run(args):
+    await main.startup()
+    await main.app.state.warmup
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        responses = await burst(client, args.jobs, args.concurrency, "/verify-eligibility", "S")
+        elapsed = time.perf_counter() - started
+        errors = sum(r.status_code != 200 for r in responses)
+        print(f"synchronous   {args.jobs:,} requests in {elapsed:6.2f}s  ({args.jobs / elapsed:,.0f}/s), {errors} errors")
+
+        batches = JOB_QUEUE.batches["verify_eligibility"]
+        started = time.perf_counter()
+        responses = await burst(client, args.jobs, args.concurrency, "/jobs/verify-eligibility", "J")
+        submitted = time.perf_counter() - started
+        accepted = sum(r.status_code == 202 for r in responses)
+        await drained("verify_eligibility", accepted)
+        finished = time.perf_counter() - started
+        batches = JOB_QUEUE.batches["verify_eligibility"] - batches
+        print(f"jobs          {accepted:,} submitted in {submitted:6.2f}s  ({accepted / submitted:,.0f}/s), "
+              f"all finished after {finished:.2f}s ({accepted / finished:,.0f}/s) in {batches:,} batches "
+              f"(avg {accepted / max(batches, 1):.1f} jobs)")
+    await main.shutdown()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
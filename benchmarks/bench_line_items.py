@@ -0,0 +1,144 @@
+# benchmarks/bench_line_items.py
+"""
+Product line items (expense_items) vs the old JSON string in expenses.products.
+
+Builds a throwaway SQLite database with the pre-migration schema, measures its
+size and the item queries it allows (parse JSON client-side, or json_each in
+SQL), runs the migration, then measures the same database and queries on
+expense_items. Item totals are checked to match before and after.
+
+    python -m benchmarks.bench_line_items [--expenses 300000] [--repeat 5]
+"""
+from benchmarks.common import use_temp_workdir
+
+use_temp_workdir()
+
+import argparse
+import datetime
+import json
+import random
+import time
+import warnings
+from collections import defaultdict
+
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, MetaData, String, Table, insert, text
+
+from benchmarks.common import print_row, time_calls
+from src import crud
+from src.database import SessionLocal, engine, init_db
+
+warnings.filterwarnings("ignore")
+
+ITEMS = [("Wheat Flour", "10kg", 1500), ("Rice", "5kg", 1000), ("Sugar", "2kg", 400), ("Cooking Oil", "1L", 600),
+         ("Lentils", "1kg", 350), ("Tea", "250g", 300), ("Milk Powder", "1kg", 1200), ("Salt", "1kg", 60)]
+SCHEMES = ["rashan_scheme", "scholarship_scheme", "health_scheme", "flood_relief"]
+
+# expenses as they were before expense_items existed
+legacy_metadata = MetaData()
+legacy_expenses = Table(
+    "expenses", legacy_metadata,
+    Column("id", Integer, primary_key=True),
+    Column("expense_id", String, unique=True),
+    Column("cnic", String), Column("scheme_id", String), Column("vendor_cnic", String),
+    Column("total_amount", Float), Column("products", String),
+    Column("is_fraudulent", Boolean), Column("reason", String, nullable=True), Column("created_at", DateTime),
+)
+
+
+def seed_legacy(n, seed=11):
+    rng = random.Random(seed)
+    now = datetime.datetime.utcnow()
+    legacy_metadata.create_all(engine)
+    with engine.begin() as conn:
+        for start in range(0, n, 50000):
+            rows = []
+            for i in range(start, min(n, start + 50000)):
+                basket = [{"item": item, "qty": qty, "price": price} for item, qty, price in rng.sample(ITEMS, rng.randint(1, 5))]
+                rows.append({
+                    "id": i + 1, "expense_id": f"EXP{i:012d}", "cnic": f"{rng.randrange(100000):013d}",
+                    "scheme_id": rng.choice(SCHEMES), "vendor_cnic": f"V{rng.randrange(300):05d}",
+                    "total_amount": float(sum(p["price"] for p in basket)), "products": json.dumps(basket),
+                    "is_fraudulent": False, "reason": None, "created_at": now - datetime.timedelta(seconds=i),
+                })
+            conn.execute(insert(legacy_expenses), rows)
+
+
+def database_size():
+    """Bytes used once free pages are reclaimed (VACUUM)."""
+    with engine.connect() as conn:
+        conn.execute(text("VACUUM"))
+        return conn.execute(text("PRAGMA page_count")).scalar() * conn.execute(text("PRAGMA page_size")).scalar()
+
+
+def json_client_side(db, item):
+    """What clients did: fetch every products string and parse it."""
+    totals = defaultdict(float)
+    for scheme_id, products in db.execute(text("SELECT scheme_id, products FROM expenses")):
+        for product in json.loads(products):
+            if product["item"] == item:
+                totals[scheme_id] += product["price"]
+    return dict(totals)
+
+
+def json_each_sql(db, item):
+    """The same total in SQL over the JSON column (SQLite JSON1)."""
+    return dict(db.execute(text(
+        "SELECT e.scheme_id, SUM(json_extract(j.value, '$.price')) FROM expenses e, json_each(e.products) j "
+        "WHERE json_extract(j.value, '$.item') = :item GROUP BY e.scheme_id"
+    ), {"item": item}).all())
+
+
+def line_items_sql(db, item):
+    return {row["key"]: row["total_amount"] for row in crud.item_totals(db, "scheme", item=item)}
+
+
+def legacy_page(db, item):
+    # 100 expenses containing the item, products as stored (JSON text)
+    return db.execute(text(
+        "SELECT * FROM expenses WHERE EXISTS (SELECT 1 FROM json_each(products) j "
+        "WHERE json_extract(j.value, '$.item') = :item) ORDER BY id LIMIT 100"
+    ), {"item": item}).all()
+
+
+def close(a, b):
+    return a.keys() == b.keys() and all(abs(a[k] - b[k]) < 1e-6 * max(1.0, abs(a[k])) for k in a)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--expenses", type=int, default=300_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    seed_legacy(args.expenses)
+    print(f"seeded {args.expenses:,} expenses with JSON products in {time.perf_counter() - started:.1f}s")
+    legacy_size = database_size()
+
+    calls = [("Wheat Flour",)] * args.repeat
+    db = SessionLocal()
+    expected = json_client_side(db, "Wheat Flour")
+    print(f"json_each parity: {'OK' if close(json_each_sql(db, 'Wheat Flour'), expected) else 'MISMATCH'}")
+    print_row("JSON: parse client-side, per scheme", time_calls(lambda item: json_client_side(db, item), calls, warmup=0))
+    print_row("JSON: json_each in SQL, per scheme", time_calls(lambda item: json_each_sql(db, item), calls, warmup=1))
+    print_row("JSON: 100 expenses with the item", time_calls(lambda item: legacy_page(db, item), calls * 10, warmup=1))
+    db.close()
+
+    started = time.perf_counter()
+    init_db()  # migrates expenses.products into expense_items
+    print(f"migrated to expense_items in {time.perf_counter() - started:.1f}s")
+    items_size = database_size()
+
+    db = SessionLocal()
+    print(f"line items parity: {'OK' if close(line_items_sql(db, 'Wheat Flour'), expected) else 'MISMATCH'}")
+    print_row("items: indexed SQL, per scheme", time_calls(lambda item: line_items_sql(db, item), calls, warmup=1))
+    print_row("items: 100 expenses with the item", time_calls(
+        lambda item: crud.list_expenses(db, {"item": item}, limit=100), calls * 10, warmup=1))
+    db.close()
+
+    print(f"database size: JSON column {legacy_size / 2**20:,.1f} MiB, "
+          f"expense_items {items_size / 2**20:,.1f} MiB ({items_size / legacy_size:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+# benchmarks/bench_schemes.py
+"""
+Multi-scheme eligibility against a large in-memory scheme catalog.
+
+Compares the compiled catalog (match_schemes: one model call, broadcast
+comparisons over every scheme) with calling score_scheme_eligibility once per
+scheme, for a single citizen and for a batch, and checks that both agree.
+No database: the catalog is loaded from synthetic scheme rows.
+
+    python -m benchmarks.bench_schemes [--schemes 5000] [--batch 100] [--repeat 20]
+"""
+import argparse
+import random
+import time
+import warnings
+
+from benchmarks.common import print_row, time_calls
+from src import crud
+from src.schemes import SchemeCatalog
+
+warnings.filterwarnings("ignore")
+
+
+def synthetic_schemes(n, seed=3):
+    rng = random.Random(seed)
+    return [
+        {
+            "scheme_id": f"scheme_{i:05d}",
+            "name": f"Scheme {i}",
+            "max_income": rng.choice([None, 30000, 45000, 50000, 70000, 90000, 150000]),
+            "min_family_size": rng.choice([None, 0, 2, 3, 4, 5, 6]),
+        }
+        for i in range(n)
+    ]
+
+
+def per_scheme_loop(cnic, schemes, model_set):
+    return [
+        (scheme_id, *crud.score_scheme_eligibility(cnic, schemes.get(scheme_id), model_set=model_set))
+        for scheme_id in schemes.ids
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--schemes", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=100, help="CNICs per batch call")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed calls per case")
+    args = parser.parse_args()
+
+    catalog = SchemeCatalog()
+    started = time.perf_counter()
+    schemes = catalog.load(synthetic_schemes(args.schemes))
+    print(f"compiled {len(schemes):,} schemes in {(time.perf_counter() - started) * 1000:.1f}ms")
+
+    model_set = crud.current_models()
+    print(f"models: {model_set.version or 'none (rule fallback)'}")
+    cnics = [f"{i:013d}" for i in range(args.batch * args.repeat)]
+    for cnic in cnics:
+        crud.get_synthetic_profile(cnic)  # profiles are cached in the API too
+
+    mismatches = 0
+    for cnic in cnics[:20]:
+        mismatches += crud.match_schemes([cnic], schemes=schemes, model_set=model_set)[0] != per_scheme_loop(
+            cnic, schemes, model_set
+        )
+    print(f"parity with per-scheme scoring on 20 CNICs: {'OK' if not mismatches else f'{mismatches} MISMATCHES'}")
+
+    singles = [([cnic],) for cnic in cnics[:args.repeat]]
+    batches = [(cnics[i:i + args.batch],) for i in range(0, len(cnics), args.batch)]
+    cases = {
+        "per-scheme loop, 1 CNIC": (lambda c: per_scheme_loop(c[0], schemes, model_set), singles),
+        "catalog, 1 CNIC": (lambda c: crud.match_schemes(c, schemes=schemes, model_set=model_set), singles),
+        "catalog, 1 CNIC, only eligible": (
+            lambda c: crud.match_schemes(c, only_eligible=True, schemes=schemes, model_set=model_set), singles
+        ),
+        f"catalog, {args.batch} CNICs": (lambda c: crud.match_schemes(c, schemes=schemes, model_set=model_set), batches),
+        f"catalog, {args.batch} CNICs, only eligible": (
+            lambda c: crud.match_schemes(c, only_eligible=True, schemes=schemes, model_set=model_set), batches
+        ),
+    }
+    print(f"{'calls/s for ' + str(args.schemes) + ' schemes':<40}")
+    for label, (fn, calls) in cases.items():
+        print_row(label, time_calls(fn, calls, warmup=2))
+
+
+if __name__ == "__main__":
+    main()
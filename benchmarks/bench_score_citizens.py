@@ -0,0 +1,96 @@
+# benchmarks/bench_score_citizens.py
+"""
+Throughput and API parity check for the offline scorer (score_citizens.py).
+
+Writes a synthetic citizen file, scores it in-process and across a process
+pool (the platform's start method, then "spawn", which pickles the model set
+into the workers), and compares a sample of output rows against the
+single-row API path (score_scheme_eligibility / calculate_trust_score).
+Exits non-zero on mismatch.
+
+    python -m benchmarks.bench_score_citizens [--rows 200000] [--workers 4] [--format csv|parquet]
+"""
+import argparse
+import os
+import random
+import sys
+from types import SimpleNamespace
+
+import pandas as pd
+
+from benchmarks.common import use_temp_workdir
+
+use_temp_workdir()
+
+from score_citizens import score_file  # noqa: E402
+from src import crud  # noqa: E402
+
+SCHEMES = {
+    "rashan_scheme": SimpleNamespace(scheme_id="rashan_scheme", max_income=50000, min_family_size=3),
+    "scholarship_scheme": SimpleNamespace(scheme_id="scholarship_scheme", max_income=70000, min_family_size=None),
+}
+
+
+def write_citizens(path, rows, seed=11):
+    rng = random.Random(seed)
+    frame = pd.DataFrame({
+        "cnic": [f"{rng.randrange(10**13):013d}" for _ in range(rows)],
+        # Every 10th phone fails the mock identity check
+        "phone_number": [f"0300{rng.randrange(10**7):07d}" if i % 10 else "03001230000" for i in range(rows)],
+    })
+    if path.endswith(".parquet"):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def check_parity(output_path, sample=2000):
+    if output_path.endswith(".parquet"):
+        out = pd.read_parquet(output_path)
+    else:
+        out = pd.read_csv(output_path, dtype={"cnic": str, "phone_number": str}, keep_default_na=False)
+    rows = out.sample(min(sample, len(out)), random_state=0)
+    phones = pd.read_csv("citizens.csv", dtype=str) if os.path.exists("citizens.csv") else pd.read_parquet("citizens.parquet")
+    phone_of = dict(zip(phones["cnic"], phones["phone_number"]))
+    mismatches = 0
+    for row in rows.to_dict("records"):
+        cnic = row["cnic"]
+        for scheme_id, scheme in SCHEMES.items():
+            eligible, reasons = crud.score_scheme_eligibility(cnic, scheme)
+            got = (str(row[f"{scheme_id}_eligible"]) == "True", row[f"{scheme_id}_reasons"] or "")
+            mismatches += got != (eligible, "; ".join(reasons))
+        score, verified, reasons = crud.calculate_trust_score(cnic, phone_of[cnic])
+        got = (float(row["trust_score"]), str(row["is_identity_verified"]) == "True", row["trust_reasons"] or "")
+        mismatches += got != (score, verified, "; ".join(reasons))
+    print(f"API parity on {len(rows)} sampled rows: {'OK' if not mismatches else f'{mismatches} MISMATCHES'}")
+    return mismatches == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline scorer throughput and parity check.")
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=20000)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    args = parser.parse_args()
+
+    source = f"citizens.{args.format}"
+    write_citizens(source, args.rows)
+    print(f"{args.rows:,} citizens x {len(SCHEMES)} schemes, chunks of {args.chunk_size:,} ({args.format})")
+
+    ok = True
+    runs = [(1, None)]
+    if args.workers > 1:
+        runs += [(args.workers, None), (args.workers, "spawn")]
+    for workers, start_method in runs:
+        output = f"scored_{workers}_{start_method or 'default'}.{args.format}"
+        rows, seconds = score_file(source, output, SCHEMES, workers=workers, chunk_size=args.chunk_size,
+                                   progress=False, start_method=start_method)
+        print(f"  workers={workers:<3} {start_method or '':<6} {seconds:6.2f}s  {rows / seconds:>10,.0f} rows/s")
+        ok &= check_parity(output)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
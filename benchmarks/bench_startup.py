@@ -0,0 +1,129 @@
+# benchmarks/bench_startup.py
+"""
+Cold-start benchmark: how long until a fresh process can serve traffic.
+
+1. `import main` in a new interpreter (median of --imports runs), plus the
+   slowest of our own modules from `python -X importtime`.
+2. A real uvicorn process per run, timed from spawn until /health answers
+   (live) and until /ready returns 200 (models loaded, fraud windows and
+   vendor index warmed). The first boot creates and seeds a fresh database;
+   the second boots against the already seeded one.
+
+    python -m benchmarks.bench_startup [--imports 5] [--boots 3] [--json]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env():
+    return dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+
+
+def time_import(workdir):
+    code = "import time; t = time.perf_counter(); import main; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=workdir, env=_env(),
+                         capture_output=True, text=True, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def slowest_own_modules(workdir, top=5):
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=workdir, env=_env(),
+                         capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = [p.strip() for p in line.removeprefix("import time:").split("|")]
+        if len(parts) == 3 and parts[2].startswith(("src", "main")):
+            rows.append((int(parts[1]) / 1000, parts[2]))
+    return sorted(rows, reverse=True)[:top]
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _status(url):
+    try:
+        with urllib.request.urlopen(url, timeout=1) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except OSError:
+        return None
+
+
+def time_boot(workdir, timeout=60):
+    """Milliseconds from spawning uvicorn until /health answers and until /ready is 200."""
+    port = _free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=workdir, env=_env(), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    live_ms = ready_ms = None
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode} (run it by hand to see why)")
+            if live_ms is None and _status(f"http://127.0.0.1:{port}/health") == 200:
+                live_ms = (time.perf_counter() - started) * 1000
+            if live_ms is not None and _status(f"http://127.0.0.1:{port}/ready") == 200:
+                ready_ms = (time.perf_counter() - started) * 1000
+                break
+            time.sleep(0.005)
+    finally:
+        server.terminate()
+        server.wait()
+    if ready_ms is None:
+        raise RuntimeError(f"/ready did not return 200 within {timeout}s")
+    return live_ms, ready_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start benchmark")
+    parser.add_argument("--imports", type=int, default=5)
+    parser.add_argument("--boots", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results = {"import_ms": [], "first_boot": [], "seeded_boot": []}
+    with tempfile.TemporaryDirectory(prefix="expenseai-startup-") as workdir:
+        results["import_ms"] = [time_import(workdir) for _ in range(args.imports)]
+        modules = slowest_own_modules(workdir)
+        for i in range(args.boots):
+            db_dir = os.path.join(workdir, f"boot{i}")
+            os.makedirs(db_dir)
+            results["first_boot"].append(time_boot(db_dir))
+            results["seeded_boot"].append(time_boot(db_dir))
+
+    summary = {
+        "import_main_ms": statistics.median(results["import_ms"]),
+        "first_boot_live_ms": statistics.median(live for live, _ in results["first_boot"]),
+        "first_boot_ready_ms": statistics.median(ready for _, ready in results["first_boot"]),
+        "seeded_boot_live_ms": statistics.median(live for live, _ in results["seeded_boot"]),
+        "seeded_boot_ready_ms": statistics.median(ready for _, ready in results["seeded_boot"]),
+    }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    for name, value in summary.items():
+        print(f"{name:<24} {value:>9.1f} ms")
+    print("slowest own modules (cumulative import ms):")
+    for ms, name in modules:
+        print(f"  {name:<22} {ms:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# benchmarks/bench_submit_proposal.py
+"""
+Write throughput of POST /submit-proposal with and without the SQLite tuning
+(WAL, synchronous=NORMAL, busy_timeout, mmap). Each configuration runs in its
+own subprocess against a fresh temporary database, because the engines are
+built from the environment at import time.
+
+    python -m benchmarks.bench_submit_proposal [--requests 500] [--concurrency 1 8 32]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+CONFIGS = {
+    "baseline (SQLite defaults)": {"EXPENSEAI_SQLITE_TUNING": "0"},
+    "tuned (WAL + NORMAL + busy_timeout)": {"EXPENSEAI_SQLITE_TUNING": "1"},
+}
+
+
+def child(requests, concurrency):
+    from benchmarks.common import use_temp_workdir
+    use_temp_workdir()
+
+    import asyncio
+    import warnings
+    import httpx
+    import main
+    from benchmarks.common import run_load
+    from src.crud import create_applications_bulk
+    from src.database import SessionLocal
+
+    warnings.filterwarnings("ignore")
+
+    async def run():
+        await main.startup()
+        await main.app.state.warmup
+        db = SessionLocal()
+        create_applications_bulk(db, [
+            {"cnic": f"{i:013d}", "scheme_id": "rashan_scheme", "eligible": True} for i in range(requests)
+        ])
+        db.close()
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_load(
+                lambda i: client.post("/submit-proposal", json={
+                    "cnic": f"{i:013d}", "scheme_id": "rashan_scheme", "government_decision": "ACCEPTED"
+                }),
+                requests, concurrency
+            )
+
+    print(json.dumps(asyncio.run(run())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.requests, args.concurrency[0])
+        return
+
+    print(f"{'configuration':<38}{'conc':>5}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for label, env in CONFIGS.items():
+        for concurrency in args.concurrency:
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_submit_proposal", "--child",
+                 "--requests", str(args.requests), "--concurrency", str(concurrency)],
+                env={**os.environ, **env}, capture_output=True, text=True, check=True
+            ).stdout
+            stats = json.loads(out.strip().splitlines()[-1])
+            print(
+                f"{label:<38}{concurrency:>5}{stats['calls_per_s']:>9.0f}"
+                f"{stats['p50_ms']:>9.2f}{stats['p99_ms']:>9.2f}{stats['errors']:>8}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+# benchmarks/bench_trust_batching.py
+"""
+/trust-score with and without request coalescing (EXPENSEAI_TRUST_BATCHING).
+
+Sends bursts of /trust-score requests for new CNICs in-process at several
+concurrency levels, once with one prediction per request and once through
+the micro-batcher, and prints throughput, tail latency and the average
+batch size. Scores are checked to match between the two paths.
+
+    python -m benchmarks.bench_trust_batching [--requests 2000] [--concurrency 1 8 32 128]
+"""
+from benchmarks.common import use_temp_workdir
+
+use_temp_workdir()
+
+import argparse
+import asyncio
+import warnings
+
+import httpx
+
+import main
+from benchmarks.common import run_load
+from src import crud
+
+warnings.filterwarnings("ignore")
+
+
+async def run(args):
+    await main.startup()
+    await main.app.state.warmup
+    model_set = await crud.async_current_models()
+    print(f"model_version {model_set.version}, engine {args.engine}, "
+          f"window {args.window_ms}ms, max batch {args.max_batch}")
+    crud.TRUST_ENGINE = args.engine
+    crud.TRUST_BATCHER.window = args.window_ms / 1000.0
+    crud.TRUST_BATCHER.max_batch = args.max_batch
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        for concurrency in args.concurrency:
+            scores = {}
+            for batching in (False, True):
+                crud.TRUST_BATCHING = batching
+                # The same CNICs for both paths (cache cleared), so their scores can be compared
+                cnics = [f"T{concurrency:04d}{i:08d}" for i in range(args.requests)]
+                crud.TRUST_RESULTS.clear()
+                batches = crud.TRUST_BATCHER.batches
+                responses = {}
+
+                async def send(i):
+                    response = await client.post("/trust-score", json={
+                        "cnic": cnics[i], "phone_number": "03001234567"
+                    })
+                    responses[cnics[i]] = response.json().get("trust_score")
+                    return response
+
+                stats = await run_load(send, args.requests, concurrency)
+                scores[batching] = responses
+                batches = crud.TRUST_BATCHER.batches - batches
+                label = f"batched, avg {args.requests / batches:5.1f}/batch" if batching else "per request"
+                print(f"c={concurrency:<4} {label:<26} {stats['calls_per_s']:>9,.0f} req/s  "
+                      f"p50 {stats['p50_ms']:7.2f}ms  p99 {stats['p99_ms']:7.2f}ms  errors {stats['errors']}")
+            same = scores[False] == scores[True]
+            print(f"       scores match: {'OK' if same else 'MISMATCH'}")
+    await main.shutdown()
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per concurrency level and path")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--engine", default="sklearn", choices=["sklearn", "flat"])
+    parser.add_argument("--window-ms", type=float, default=2.0)
+    parser.add_argument("--max-batch", type=int, default=64)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main_cli()
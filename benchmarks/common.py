@@ -0,0 +1,85 @@
+# benchmarks/common.py
+"""
+Shared timing helpers for the benchmark scripts.
+Run benchmarks from the repository root, e.g. `python -m benchmarks.bench_inference`.
+"""
+import time
+import numpy as np
+
+
+def summarize(samples_s):
+    """Latency summary (milliseconds) for a list of per-call durations in seconds."""
+    ms = np.asarray(samples_s, dtype=float) * 1000.0
+    return {
+        "calls": int(ms.size),
+        "mean_ms": float(ms.mean()),
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+    }
+
+
+def time_calls(fn, args_list, warmup=50):
+    """Calls fn(*args) for every args tuple and returns the latency summary."""
+    for args in args_list[:warmup]:
+        fn(*args)
+    samples = []
+    perf = time.perf_counter
+    for args in args_list:
+        start = perf()
+        fn(*args)
+        samples.append(perf() - start)
+    stats = summarize(samples)
+    stats["calls_per_s"] = stats["calls"] / (sum(samples) or 1e-12)
+    return stats
+
+
+def print_row(label, stats):
+    print(
+        f"{label:<40} {stats['calls_per_s']:>12,.0f}/s  "
+        f"p50 {stats['p50_ms']:.3f}ms  p95 {stats['p95_ms']:.3f}ms  p99 {stats['p99_ms']:.3f}ms"
+    )
+
+
+async def run_load(send, total, concurrency):
+    """
+    Fires `total` requests through the coroutine function send(i) with at most
+    `concurrency` in flight. Returns latency percentiles plus throughput.
+    """
+    import asyncio
+
+    samples = []
+    errors = 0
+    counter = iter(range(total))
+    perf = time.perf_counter
+
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = perf()
+            response = await send(i)
+            samples.append(perf() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = perf()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = perf() - started
+    stats = summarize(samples)
+    stats["calls_per_s"] = total / elapsed
+    stats["errors"] = errors
+    return stats
+
+
+def use_temp_workdir():
+    """Runs the benchmark inside a fresh temp dir so the relative SQLite file is throwaway."""
+    import os
+    import sys
+    import tempfile
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    workdir = tempfile.mkdtemp(prefix="expenseai-bench-")
+    os.chdir(workdir)
+    return workdir
@@ -0,0 +1,375 @@
+# benchmarks/suite.py
+"""
+Reproducible benchmark suite with JSON baselines and a regression gate.
+
+1. Microbenchmarks of get_synthetic_profile, check_scheme_eligibility and
+   calculate_trust_score, each for new CNICs (cold) and repeated ones (cached).
+2. A load test of every API endpoint at fixed concurrency levels, in-process
+   through httpx's ASGI transport.
+
+Everything runs offline in one process against a fresh temporary SQLite
+database, with fixed CNICs and seeds. Without trained models the rule-based
+fallbacks are measured (model_version "none" in the results), so only compare
+runs made with the same setup.
+
+    python -m benchmarks.suite                                    # run and print
+    python -m benchmarks.suite --save baseline.json               # record a baseline
+    python -m benchmarks.suite --baseline baseline.json           # exit 1 on a regression
+    python -m benchmarks.suite --only load --concurrency 1 16 64 --repeat 3
+"""
+import os
+
+from benchmarks.common import use_temp_workdir
+
+# File arguments are relative to where the suite was started, not the temp dir
+INVOKED_FROM = os.getcwd()
+use_temp_workdir()
+
+# Admin routes are part of the load test; hot-reload checks would add file stats to every request
+ADMIN_TOKEN = os.environ.setdefault("EXPENSEAI_ADMIN_TOKEN", "bench")
+os.environ.setdefault("EXPENSEAI_MODEL_RELOAD_SECONDS", "0")
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import warnings
+
+import httpx
+from fastapi.routing import APIRoute
+
+import main
+from benchmarks.common import run_load, summarize, time_calls
+from src import crud
+from src.database import SessionLocal, init_db
+from src.jobs import JOB_QUEUE
+from src.vendors import VENDOR_INDEX
+
+warnings.filterwarnings("ignore")
+
+SEED = 20240601
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _path(path):
+    return os.path.join(INVOKED_FROM, path)
+
+
+def reference_speed(bursts=3, burst_s=0.01):
+    """
+    Ops/s of a fixed pure-Python workload, measured next to every case. The
+    ratio to a baseline's figure scales its expectations, so a slower machine
+    (or a noisy neighbour during one case) is not reported as a regression.
+    """
+    payload = {"cnic": "1234567890123", "scheme_id": "rashan_scheme", "items": list(range(20))}
+    rates = []
+    for _ in range(bursts):
+        n = 0
+        start = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < burst_s:
+            for _ in range(50):
+                decoded = json.loads(json.dumps(payload))
+                sorted(decoded["items"], key=lambda x: -x)
+            n += 50
+        rates.append(n / elapsed)
+    return statistics.median(rates)
+
+def with_reference(stats):
+    stats["reference_ops_per_s"] = reference_speed()
+    return stats
+
+
+# --- Microbenchmarks ---
+def micro_benchmarks(calls, round_=0):
+    """name -> stats for the scoring functions; CNICs are new for "cold" and repeated for "cached"."""
+    init_db()
+    crud.current_models()  # load models outside the timings
+    db = SessionLocal()
+    try:
+        warm = [f"w{round_}-{i:012d}" for i in range(50)]
+        cnics = [f"m{round_}-{i:012d}" for i in range(calls)]
+        cases = {
+            "get_synthetic_profile": lambda cnic: crud.get_synthetic_profile(cnic),
+            "check_scheme_eligibility": lambda cnic: crud.check_scheme_eligibility(db, cnic, "rashan_scheme"),
+            "calculate_trust_score": lambda cnic: crud.calculate_trust_score(cnic, "03001234567"),
+        }
+        results = {}
+        for name, fn in cases.items():
+            for cnic in warm:
+                fn(cnic)
+            # Each function gets its own CNIC range so an earlier case cannot pre-fill its caches
+            args = [(f"{name[:3]}{cnic}",) for cnic in cnics]
+            reference = reference_speed()
+            results[f"micro/{name}/cold"] = time_calls(fn, args, warmup=0)
+            results[f"micro/{name}/cold"]["reference_ops_per_s"] = reference
+            results[f"micro/{name}/cached"] = with_reference(time_calls(fn, args, warmup=0))
+        return results
+    finally:
+        db.close()
+
+
+# --- Load Test ---
+def _cnic(tag, i):
+    return f"{tag}{i:010d}"
+
+def _seed_applications(tag, n):
+    db = SessionLocal()
+    try:
+        crud.create_applications_bulk(db, [
+            {"cnic": _cnic(tag, i), "scheme_id": "rashan_scheme", "eligible": True} for i in range(n)
+        ])
+    finally:
+        db.close()
+
+def _ndjson(tag, i, rows):
+    return "".join(json.dumps({
+        "cnic": _cnic(tag, i * rows + j), "scheme_id": "rashan_scheme", "vendor_cnic": "9999999999999",
+        "total_amount": 2500.0, "products": [{"item": "Rice", "qty": "5kg", "price": 2500}],
+    }) + "\n" for j in range(rows))
+
+ADMIN = {"X-Admin-Token": ADMIN_TOKEN}
+BATCH_SIZE = 100
+
+# name -> (request(client, i, tag), setup(tag, n) or None, share of --requests)
+# Order matters: /submit-proposal fills the expenses table that the reads below scan.
+ENDPOINTS = {
+    "POST /register": (lambda c, i, tag: c.post(
+        "/register", json={"cnic": _cnic(tag, i), "name": "Bench", "role": "customer"}), None, 1.0),
+    "POST /verify-eligibility": (lambda c, i, tag: c.post(
+        "/verify-eligibility", json={"cnic": _cnic(tag, i), "scheme_id": "rashan_scheme"}), None, 1.0),
+    "POST /verify-eligibility/batch": (lambda c, i, tag: c.post(
+        "/verify-eligibility/batch", json={"items": [
+            {"cnic": _cnic(tag, i * BATCH_SIZE + j), "scheme_id": "rashan_scheme"} for j in range(BATCH_SIZE)
+        ]}), None, 0.1),
+    "POST /eligible-schemes": (lambda c, i, tag: c.post(
+        "/eligible-schemes", json={"cnics": [_cnic(tag, i * 10 + j) for j in range(10)]}), None, 1.0),
+    "POST /trust-score": (lambda c, i, tag: c.post(
+        "/trust-score", json={"cnic": _cnic(tag, i), "phone_number": "03001234567"}), None, 1.0),
+    "POST /submit-proposal": (lambda c, i, tag: c.post(
+        "/submit-proposal", json={"cnic": _cnic(tag, i), "scheme_id": "rashan_scheme",
+                                  "government_decision": "ACCEPTED"}), _seed_applications, 1.0),
+    "POST /expenses/bulk": (lambda c, i, tag: c.post(
+        "/expenses/bulk", content=_ndjson(tag, i, BATCH_SIZE),
+        headers={"content-type": "application/x-ndjson"}), None, 0.1),
+    "POST /jobs/verify-eligibility": (lambda c, i, tag: c.post(
+        "/jobs/verify-eligibility", json={"cnic": _cnic(tag, i), "scheme_id": "rashan_scheme"}), None, 1.0),
+    "POST /jobs/submit-proposal": (lambda c, i, tag: c.post(
+        "/jobs/submit-proposal", json={"cnic": _cnic(tag, i), "scheme_id": "rashan_scheme",
+                                       "government_decision": "ACCEPTED"}), _seed_applications, 1.0),
+    "GET /jobs/{job_id}": (lambda c, i, tag: c.get(f"/jobs/{i % 50 + 1}"), None, 1.0),
+    "GET /expenses": (lambda c, i, tag: c.get("/expenses"), None, 1.0),
+    "GET /expenses/export": (lambda c, i, tag: c.get("/expenses/export"), None, 0.1),
+    "GET /aggregates/{dimension}": (lambda c, i, tag: c.get(
+        f"/aggregates/{('scheme', 'vendor', 'citizen')[i % 3]}?group=total&sort=total"), None, 1.0),
+    "GET /aggregates/items/{dimension}": (lambda c, i, tag: c.get(
+        f"/aggregates/items/{('scheme', 'vendor', 'citizen')[i % 3]}?item=Wheat%20Flour&sort=total&limit=100"), None, 1.0),
+    "POST /chatbot": (lambda c, i, tag: c.post("/chatbot", json={"query": "status", "language": "en"}), None, 1.0),
+    "GET /cache-stats": (lambda c, i, tag: c.get("/cache-stats"), None, 1.0),
+    "GET /metrics": (lambda c, i, tag: c.get("/metrics"), None, 1.0),
+    "GET /health": (lambda c, i, tag: c.get("/health"), None, 1.0),
+    "GET /ready": (lambda c, i, tag: c.get("/ready"), None, 1.0),
+    "GET /admin/models": (lambda c, i, tag: c.get("/admin/models", headers=ADMIN), None, 1.0),
+    "GET /admin/profiler": (lambda c, i, tag: c.get("/admin/profiler?format=status", headers=ADMIN), None, 1.0),
+}
+# These change process or database state (model swap, profiler on/off, rollup rebuild) rather than serve traffic
+NOT_LOAD_TESTED = {
+    "POST /admin/models/reload", "POST /admin/profiler/start", "POST /admin/profiler/stop",
+    "POST /admin/aggregates/rebuild",
+}
+
+
+def uncovered_routes():
+    routes = {f"{method} {route.path}" for route in main.app.routes if isinstance(route, APIRoute) for method in route.methods}
+    return sorted(routes - set(ENDPOINTS) - NOT_LOAD_TESTED)
+
+
+async def load_benchmarks(requests, concurrency_levels, round_=0):
+    await main.startup()
+    await main.app.state.warmup
+    transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+    results = {}
+    run = 0
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, (request, setup, share) in ENDPOINTS.items():
+            for concurrency in concurrency_levels:
+                # New CNICs for every run so the result caches never short-circuit the work
+                run += 1
+                tag = f"L{round_}-{run:03d}-"
+                total = max(concurrency, int(requests * share))
+                if setup is not None:
+                    # Blocking database writes: off the loop, so job workers keep running meanwhile
+                    await asyncio.get_running_loop().run_in_executor(None, setup, tag, total)
+                # Vendor picks are the only random draws left in the request path (expense
+                # ids come from src/ids.py): the same picks for this case in every round
+                VENDOR_INDEX.seed(f"{SEED}/{round_}/{run}")
+                reference = reference_speed()
+                stats = await run_load(lambda i: request(client, i, tag), total, concurrency)
+                stats["reference_ops_per_s"] = (reference + reference_speed()) / 2
+                results[f"load/{name}@{concurrency}"] = stats
+                # Jobs accepted by /jobs/* must not keep writing during the next case (or its setup)
+                while not JOB_QUEUE.idle():
+                    await asyncio.sleep(0.01)
+    return results
+
+
+# --- Startup (optional, spawns uvicorn) ---
+def startup_benchmarks(boots):
+    from benchmarks.bench_startup import time_boot, time_import
+    import tempfile
+
+    with tempfile.TemporaryDirectory(prefix="expenseai-startup-") as workdir:
+        imports = [time_import(workdir) / 1000 for _ in range(boots)]
+        boots_ms = [time_boot(workdir) for _ in range(boots)]
+    return {
+        "startup/import_main": with_reference(summarize(imports)),
+        "startup/ready": with_reference(summarize([ready / 1000 for _, ready in boots_ms])),
+    }
+
+
+# --- Runs, Baselines & Comparison ---
+def _median_stats(runs):
+    """Per-field median over repeated runs of one case."""
+    return {key: statistics.median_low(run[key] for run in runs) for key in runs[0]}
+
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True)
+        return out.stdout.strip() or None
+    except OSError:
+        return None
+
+def run_suite(args):
+    repeats = []
+    for round_ in range(args.repeat):
+        results = {}
+        if args.only in (None, "micro"):
+            results.update(micro_benchmarks(args.calls, round_))
+        if args.only in (None, "load"):
+            results.update(asyncio.run(load_benchmarks(args.requests, args.concurrency, round_)))
+        if args.startup:
+            results.update(startup_benchmarks(args.startup))
+        repeats.append(results)
+    results = {name: _median_stats([r[name] for r in repeats]) for name in repeats[0]}
+    meta = {
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "model_version": crud.current_models().version,
+        "settings": {
+            "calls": args.calls, "requests": args.requests, "concurrency": args.concurrency,
+            "repeat": args.repeat, "only": args.only,
+        },
+    }
+    return {"meta": meta, "results": results}
+
+
+def _speed(stats, base, normalize):
+    """How much faster this run's machine was than the baseline's during this case."""
+    if normalize and stats.get("reference_ops_per_s") and base.get("reference_ops_per_s"):
+        return stats["reference_ops_per_s"] / base["reference_ops_per_s"]
+    return 1.0
+
+def compare(current, baseline, threshold, slack_ms, normalize=True, latency="p50_ms"):
+    """
+    Regressions of `current` against `baseline`, for cases present in both:
+    throughput below (1 - threshold) x baseline, `latency` (p50 by default;
+    tails are too noisy to gate on without many repeats) above
+    (1 + threshold) x baseline and more than slack_ms slower, or more failed
+    requests. With `normalize`, baseline figures are first scaled by the
+    reference speed ratio.
+    """
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            continue
+        speed = _speed(stats, base, normalize)
+        expected_rate = base.get("calls_per_s", 0) * speed
+        expected_latency = base[latency] / speed
+        if "calls_per_s" in stats and stats["calls_per_s"] < expected_rate * (1 - threshold):
+            regressions.append(f"{name}: {stats['calls_per_s']:,.0f}/s vs {expected_rate:,.0f}/s expected")
+        if stats[latency] > expected_latency * (1 + threshold) and stats[latency] - expected_latency > slack_ms:
+            regressions.append(f"{name}: {latency[:3]} {stats[latency]:.3f}ms vs {expected_latency:.3f}ms expected")
+        if stats.get("errors", 0) > base.get("errors", 0):
+            regressions.append(f"{name}: {stats['errors']} errors vs {base.get('errors', 0)}")
+    return regressions
+
+
+def print_results(report, baseline=None, normalize=True):
+    print(f"{'case':<46}{'ops/s':>11}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}  {'vs baseline':>11}")
+    for name, stats in report["results"].items():
+        base = (baseline or {}).get("results", {}).get(name)
+        change = ""
+        if base:
+            speed = _speed(stats, base, normalize)
+            if stats.get("calls_per_s") and base.get("calls_per_s"):
+                change = f"{stats['calls_per_s'] / (base['calls_per_s'] * speed) - 1:+.0%}"
+            else:
+                change = f"p50 {stats['p50_ms'] / (base['p50_ms'] / speed) - 1:+.0%}"
+        print(
+            f"{name:<46}{stats.get('calls_per_s', float('nan')):>11,.0f}{stats['p50_ms']:>10.3f}"
+            f"{stats['p95_ms']:>10.3f}{stats['p99_ms']:>10.3f}{stats.get('errors', 0):>8}  {change:>11}"
+        )
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--only", choices=["micro", "load"], help="Run one group only")
+    parser.add_argument("--calls", type=int, default=5000, help="Calls per microbenchmark")
+    parser.add_argument("--requests", type=int, default=500, help="Requests per endpoint and concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--repeat", type=int, default=1, help="Run everything N times and keep the median of each figure")
+    parser.add_argument("--startup", type=int, default=0, metavar="N",
+                        help="Also time N imports and uvicorn boots (see bench_startup)")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--save", help="Write the results as a baseline (same format as --output)")
+    parser.add_argument("--baseline", help="Compare against this baseline; exit 1 on a regression")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative regression (default 0.25)")
+    parser.add_argument("--slack-ms", type=float, default=0.05,
+                        help="Ignore latency increases smaller than this (timer noise on fast cases)")
+    parser.add_argument("--gate-latency", choices=["p50", "p95", "p99"], default="p50",
+                        help="Latency percentile checked against the baseline (default p50)")
+    parser.add_argument("--raw", action="store_true",
+                        help="Compare raw figures, without scaling by the reference workload speed")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(_path(args.baseline)) as f:
+            baseline = json.load(f)
+
+    report = run_suite(args)
+    print_results(report, baseline, normalize=not args.raw)
+    missing = uncovered_routes()
+    if missing:
+        print(f"warning: endpoints without a load case: {', '.join(missing)}", file=sys.stderr)
+
+    for path in filter(None, (args.output, args.save)):
+        with open(_path(path), "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {path}")
+
+    if baseline is not None:
+        if baseline["meta"].get("settings") != report["meta"]["settings"]:
+            print("warning: baseline was recorded with different settings", file=sys.stderr)
+        if baseline["meta"].get("model_version") != report["meta"]["model_version"]:
+            print("warning: baseline was recorded with a different model version", file=sys.stderr)
+        regressions = compare(report, baseline, args.threshold, args.slack_ms, normalize=not args.raw,
+                              latency=f"{args.gate_latency}_ms")
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"no regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main_cli()
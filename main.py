@@ -1,49 +1,152 @@
 # main.py
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import FastAPI, Depends, Header, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.datastructures import MutableHeaders
+from starlette.routing import Match
+from typing import List, Optional
+import asyncio
+import csv
+import datetime
+import io
 import json
-import random
-import string
+import logging
+import time
 
-from src.database import get_db
-from src.models import User, Scheme, Application, Expense
+from src import aggregates, config, ingest, metrics
+from src.database import AsyncSessionLocal, async_init_db, get_async_db, start_db_stats
+from src.models import User, Application
 from src.schemas import (
     UserCreate, UserOut, 
-    VerifyEligibilityRequest, VerifyEligibilityResponse, 
+    VerifyEligibilityRequest, VerifyEligibilityResponse, VerifyEligibilityBatchRequest,
+    SchemeMatchRequest, SchemeMatchResponse,
     TrustScoreRequest, TrustScoreResponse,
-    SubmitProposalRequest, ExpenseRecord, ChatbotQuery
+    SubmitProposalRequest, ExpenseRecord, JobOut, BulkIngestResponse, SpendingRollupOut, ItemTotalOut, ChatbotQuery
+)
+from src.profiles import PROFILE_PROVIDER
+from src.vendors import VENDOR_INDEX
+from src.schemes import SCHEME_CATALOG
+from src.fraud import FRAUD_ENGINE
+from src.ids import EXPENSE_IDS
+from src.line_items import PRODUCT_CATALOG
+from src.jobs import JOB_QUEUE, JobFailed, QueueFull
+from src.registry import MODEL_REGISTRY
+from src.crud import (
+    async_check_scheme_eligibility, async_check_scheme_eligibility_batch, async_match_schemes,
+    async_calculate_trust_score,
+    async_current_models, run_inference,
+    async_create_application, async_create_applications_bulk, async_create_expense_record,
+    async_list_expenses, async_iter_expenses, async_unit_of_work, result_cache_stats, EXPENSE_COLUMNS,
+    async_spending_rollups, async_item_totals,
+    ELIGIBILITY_RESULTS, TRUST_RESULTS, TRUST_BATCHER
 )
-from src.crud import check_scheme_eligibility, calculate_trust_score, create_application, create_expense_record
 
 app = FastAPI(title="ExpenseAI - UraanAI Techathon", version="2.0")
+logger = logging.getLogger("expenseai")
+
+# --- Request Metrics ---
+# Labels each request with its route template (not the raw path, which would
+# explode label cardinality) so spans and DB counters below it can use it.
+# With EXPENSEAI_DEBUG_DB_STATS the statement/commit counts also go out as headers.
+_route_labels = {}
+
+def _route_label(scope):
+    key = (scope["method"], scope["path"])
+    label = _route_labels.get(key)
+    if label is None:
+        label = "unmatched"
+        for route in app.router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                label = route.path
+                break
+            if match == Match.PARTIAL and label == "unmatched":
+                label = route.path
+        if label == "unmatched":
+            return label  # not cached: arbitrary 404 paths would grow the dict
+        _route_labels[key] = label
+    return label
+
+class RequestMetrics:
+    """
+    Plain ASGI middleware: @app.middleware("http") would run every request in
+    an extra task with its own body stream, which costs more than the metrics.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        route = _route_label(scope)
+        metrics.set_endpoint(route)
+        stats = start_db_stats() if config.DEBUG_DB_STATS else None
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_stats(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if stats is not None:
+                    headers = MutableHeaders(scope=message)
+                    headers["X-DB-Statements"] = str(stats["statements"])
+                    headers["X-DB-Commits"] = str(stats["commits"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            if config.METRICS_ENABLED:
+                metrics.REQUEST_SECONDS.observe(time.perf_counter() - started, scope["method"], route, status)
+
+if config.METRICS_ENABLED or config.DEBUG_DB_STATS:
+    app.add_middleware(RequestMetrics)
+
+# --- Startup ---
+# The process is live (/health) as soon as it accepts connections. It is ready
+# (/ready) once the warm-up has loaded the models, rebuilt the fraud windows and
+# filled the vendor index and scheme catalog. Tables and seed data are created
+# here unless EXPENSEAI_BOOTSTRAP_DB=0, for deployments that run
+# `python -m src.database` once.
+WARMUP = {"state": "pending", "seconds": None, "error": None}
+
+async def warm_up():
+    started = time.perf_counter()
+    WARMUP["state"] = "running"
+    try:
+        await async_current_models()
+        async with AsyncSessionLocal() as db:
+            # Rebuild the fraud engine's sliding windows from recent expenses
+            await db.run_sync(FRAUD_ENGINE.rehydrate)
+            await db.run_sync(VENDOR_INDEX.refresh)
+            await db.run_sync(SCHEME_CATALOG.refresh)
+            # Fills the spending rollups once for a database that predates them
+            await db.run_sync(aggregates.ensure_built)
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        WARMUP.update(state="failed", error=f"{type(e).__name__}: {e}")
+        return
+    WARMUP.update(state="done", seconds=round(time.perf_counter() - started, 3))
 
-# Initialize synthetic schemes on first run
 @app.on_event("startup")
-def init_schemes_and_vendors():
-    db = next(get_db())
-    if db.query(Scheme).count() == 0:
-        schemes = [
-            Scheme(scheme_id="rashan_scheme", name="Rashan Scheme", description="Food support", max_income=50000, min_family_size=3),
-            Scheme(scheme_id="scholarship_scheme", name="Scholarship", description="Education aid", max_income=70000)
-        ]
-        db.add_all(schemes)
-        db.commit()
-
-    if db.query(User).filter(User.role == "vendor").count() == 0:
-        default_vendor = User(
-            cnic="9999999999999",
-            name="Default Rashan Vendor",
-            role="vendor",
-            is_active=True
-        )
-        db.add(default_vendor)
-        db.commit()
+async def startup():
+    if config.BOOTSTRAP_DB:
+        await async_init_db()
+    app.state.warmup = asyncio.create_task(warm_up())
+    # Job workers start at once; jobs left queued by an earlier run are picked up again
+    JOB_QUEUE.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await JOB_QUEUE.stop()
 
 # --- User Registration ---
 @app.post("/register", response_model=UserOut)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.cnic == user.cnic).first()
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.cnic == user.cnic))
     if db_user:
         raise HTTPException(status_code=400, detail="CNIC already registered")
     new_user = User(
@@ -51,64 +154,135 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
         name=user.name,
         role=user.role,
         is_active=(user.role == "government"),
-        spending_limit=user.spending_limit
+        spending_limit=user.spending_limit,
+        scheme_id=user.scheme_id,
+        region=user.region
     )
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    if new_user.role == "vendor":
+        VENDOR_INDEX.add_vendor(new_user)
+    if new_user.spending_limit is not None:
+        FRAUD_ENGINE.set_limit(new_user.cnic, new_user.spending_limit)
     return new_user
 
 # --- Endpoint 1: Scheme Eligibility Verification ---
 @app.post("/verify-eligibility", response_model=VerifyEligibilityResponse)
-def verify_eligibility_endpoint(request: VerifyEligibilityRequest, db: Session = Depends(get_db)):
-    eligible, reasons = check_scheme_eligibility(db, request.cnic, request.scheme_id)
+async def verify_eligibility_endpoint(request: VerifyEligibilityRequest, db: AsyncSession = Depends(get_async_db)):
+    model_set = await async_current_models()
+    eligible, reasons = await async_check_scheme_eligibility(db, request.cnic, request.scheme_id, model_set)
     
     if eligible is None:
         raise HTTPException(status_code=404, detail="Scheme not found")
     
     # We create the application record here based on basic eligibility
-    create_application(db, request.cnic, request.scheme_id, eligible)
+    await async_create_application(db, request.cnic, request.scheme_id, eligible)
     
     return VerifyEligibilityResponse(
         cnic=request.cnic,
         scheme_id=request.scheme_id,
         eligible=eligible,
-        reasons=reasons
+        reasons=reasons,
+        model_version=model_set.version
     )
 
+# --- Endpoint 1b: Batch Eligibility Verification ---
+@app.post("/verify-eligibility/batch", response_model=List[VerifyEligibilityResponse])
+async def verify_eligibility_batch_endpoint(request: VerifyEligibilityBatchRequest, db: AsyncSession = Depends(get_async_db)):
+    items = [(item.cnic, item.scheme_id) for item in request.items]
+    model_set = await async_current_models()
+    results = await async_check_scheme_eligibility_batch(db, items, model_set)
+
+    missing = sorted({scheme_id for (_, scheme_id), (eligible, _) in zip(items, results) if eligible is None})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Scheme not found: {', '.join(missing)}")
+
+    # One transaction for all application records
+    await async_create_applications_bulk(db, [
+        {"cnic": cnic, "scheme_id": scheme_id, "eligible": eligible}
+        for (cnic, scheme_id), (eligible, _) in zip(items, results)
+    ])
+
+    return [
+        VerifyEligibilityResponse(
+            cnic=cnic, scheme_id=scheme_id, eligible=eligible, reasons=reasons, model_version=model_set.version
+        )
+        for (cnic, scheme_id), (eligible, reasons) in zip(items, results)
+    ]
+
+# --- Endpoint 1c: Every Scheme a Citizen Qualifies For ---
+@app.post("/eligible-schemes", response_model=List[SchemeMatchResponse])
+async def eligible_schemes_endpoint(request: SchemeMatchRequest, db: AsyncSession = Depends(get_async_db)):
+    # Read-only: checks the in-memory scheme catalog and records no applications.
+    # One snapshot for the whole request, so a refresh cannot drop a scheme between the check and scoring.
+    await SCHEME_CATALOG.ensure_fresh(db)
+    schemes = SCHEME_CATALOG.current()
+    if request.scheme_ids is not None:
+        missing = sorted({s for s in request.scheme_ids if schemes.get(s) is None})
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Scheme not found: {', '.join(missing)}")
+        scheme_ids = list(dict.fromkeys(request.scheme_ids))
+    else:
+        scheme_ids = None
+
+    model_set = await async_current_models()
+    results = await async_match_schemes(db, request.cnics, scheme_ids, request.only_eligible, model_set, schemes)
+
+    # Built as plain JSON: validating thousands of nested decisions per CNIC would cost more than scoring them
+    return JSONResponse([
+        {
+            "cnic": cnic,
+            "eligible_schemes": [scheme_id for scheme_id, eligible, _ in decisions if eligible],
+            "schemes": [
+                {"scheme_id": scheme_id, "eligible": eligible, "reasons": reasons}
+                for scheme_id, eligible, reasons in decisions
+            ],
+            "model_version": model_set.version,
+        }
+        for cnic, decisions in zip(request.cnics, results)
+    ])
+
 # --- Endpoint 2: Trust Score & Identity Check ---
 @app.post("/trust-score", response_model=TrustScoreResponse)
-def get_trust_score(request: TrustScoreRequest):
+async def get_trust_score(request: TrustScoreRequest):
     # This endpoint checks identity (Phone vs CNIC) and returns a score
-    score, verified, reasons = calculate_trust_score(request.cnic, request.phone_number)
+    model_set = await async_current_models()
+    score, verified, reasons = await async_calculate_trust_score(request.cnic, request.phone_number, model_set=model_set)
     
     return TrustScoreResponse(
         cnic=request.cnic,
         phone_number=request.phone_number,
         is_identity_verified=verified,
         trust_score=score,
-        reasons=reasons
+        reasons=reasons,
+        model_version=model_set.version
     )
 
 # --- Submit Government Decision & Trigger Expense ---
 @app.post("/submit-proposal")
-def submit_proposal(request: SubmitProposalRequest, db: Session = Depends(get_db)):
-    app = db.query(Application).filter(
-        Application.cnic == request.cnic,
-        Application.scheme_id == request.scheme_id
-    ).order_by(Application.created_at.desc()).first()
-    
-    if not app:
-        raise HTTPException(status_code=404, detail="Application not found")
-    
-    app.government_decision = request.government_decision
-    db.commit()
+async def submit_proposal(request: SubmitProposalRequest, db: AsyncSession = Depends(get_async_db)):
+    return await process_proposal(db, request)
+
+async def process_proposal(db: AsyncSession, request: SubmitProposalRequest):
+    # Decision update and expense insert commit together, once
+    async with async_unit_of_work(db):
+        app = await db.scalar(select(Application).where(
+            Application.cnic == request.cnic,
+            Application.scheme_id == request.scheme_id
+        ).order_by(Application.created_at.desc()).limit(1))
 
-    if request.government_decision == "ACCEPTED":
-        vendors = db.query(User).filter(User.role == "vendor").all()
-        if not vendors:
+        if not app:
+            raise HTTPException(status_code=404, detail="Application not found")
+
+        app.government_decision = request.government_decision
+
+        if request.government_decision != "ACCEPTED":
+            return {"message": "Proposal rejected"}
+
+        await VENDOR_INDEX.ensure_fresh(db)
+        vendor_cnic = VENDOR_INDEX.choose(request.scheme_id, request.region)
+        if vendor_cnic is None:
             raise HTTPException(status_code=500, detail="No vendors available")
-        vendor = random.choice(vendors)
 
         products = [
             {"item": "Wheat Flour", "qty": "10kg", "price": 1500},
@@ -116,48 +290,343 @@ def submit_proposal(request: SubmitProposalRequest, db: Session = Depends(get_db
         ]
         total = sum(p["price"] for p in products)
 
-        is_fraud = total > 5000
-        reason = "Excessive amount" if is_fraud else None
+        # Scored now, added to the fraud windows only once the expense is committed
+        checked = {
+            "cnic": request.cnic,
+            "scheme_id": request.scheme_id,
+            "vendor_cnic": vendor_cnic,
+            "total_amount": total,
+            "products": products
+        }
+        is_fraud, reason = FRAUD_ENGINE.score(checked)
 
-        expense_id = "EXP" + ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        expense_id = EXPENSE_IDS.new()
         expense_data = {
             "expense_id": expense_id,
             "cnic": request.cnic,
             "scheme_id": request.scheme_id,
-            "vendor_cnic": vendor.cnic,
+            "vendor_cnic": vendor_cnic,
             "total_amount": total,
-            "products": json.dumps(products),
+            "products": products,
             "is_fraudulent": is_fraud,
             "reason": reason
         }
-        create_expense_record(db, expense_data)
-        return {"message": "Expense processed", "expense_id": expense_id, "fraud_flag": is_fraud}
-    else:
-        return {"message": "Proposal rejected"}
+        try:
+            # The spending limit is checked in the same statement as the citizen's rollup write
+            await async_create_expense_record(db, expense_data)
+        except aggregates.SpendingLimitExceeded:
+            raise HTTPException(status_code=409, detail="Spending limit exceeded")
+    FRAUD_ENGINE.record(checked)
+    VENDOR_INDEX.record_assignment(vendor_cnic)
+    return {"message": "Expense processed", "expense_id": expense_id, "fraud_flag": is_fraud}
+
+# --- Background Jobs ---
+# The same work as /verify-eligibility and /submit-proposal, queued in the jobs
+# table and run by src/jobs.py workers; clients poll GET /jobs/{job_id}.
+@JOB_QUEUE.handler("verify_eligibility", batch_size=config.JOB_BATCH_SIZE)
+async def run_eligibility_jobs(payloads):
+    # Coalesced: one model call and one application insert for every queued check
+    items = [(payload["cnic"], payload["scheme_id"]) for payload in payloads]
+    model_set = await async_current_models()
+    async with AsyncSessionLocal() as db:
+        results = await async_check_scheme_eligibility_batch(db, items, model_set)
+        await async_create_applications_bulk(db, [
+            {"cnic": cnic, "scheme_id": scheme_id, "eligible": eligible}
+            for (cnic, scheme_id), (eligible, _) in zip(items, results) if eligible is not None
+        ])
+    return [
+        JobFailed("Scheme not found", 404) if eligible is None else {
+            "cnic": cnic, "scheme_id": scheme_id, "eligible": bool(eligible), "reasons": reasons,
+            "model_version": model_set.version,
+        }
+        for (cnic, scheme_id), (eligible, reasons) in zip(items, results)
+    ]
+
+@JOB_QUEUE.handler("submit_proposal", workers=config.JOB_WORKERS)
+async def run_proposal_job(payloads):
+    # One proposal per call: a retried batch never repeats another job's committed expense
+    async with AsyncSessionLocal() as db:
+        try:
+            return [await process_proposal(db, SubmitProposalRequest(**payloads[0]))]
+        except HTTPException as e:
+            return [JobFailed(e.detail, e.status_code)]
+
+def to_job_out(job):
+    return JobOut(
+        job_id=job.id, kind=job.kind, status=job.status, attempts=job.attempts,
+        result=json.loads(job.result) if job.result is not None else None,
+        error=job.error, error_code=job.error_code, created_at=job.created_at, finished_at=job.finished_at
+    )
+
+async def submit_job(kind: str, payload: dict):
+    try:
+        job = await JOB_QUEUE.submit(kind, payload)
+    except QueueFull:
+        raise HTTPException(status_code=503, detail="Job queue is full", headers={"Retry-After": "1"})
+    return to_job_out(job)
+
+@app.post("/jobs/verify-eligibility", response_model=JobOut, status_code=202)
+async def submit_eligibility_job(request: VerifyEligibilityRequest):
+    return await submit_job("verify_eligibility", request.model_dump())
+
+@app.post("/jobs/submit-proposal", response_model=JobOut, status_code=202)
+async def submit_proposal_job(request: SubmitProposalRequest):
+    return await submit_job("submit_proposal", request.model_dump())
+
+@app.get("/jobs/{job_id}", response_model=JobOut)
+async def get_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    job = await JOB_QUEUE.get(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return to_job_out(job)
+
+# --- Get Expenses (keyset pagination) ---
+async def expense_filters(
+    cnic: Optional[str] = None,
+    scheme_id: Optional[str] = None,
+    vendor_cnic: Optional[str] = None,
+    is_fraudulent: Optional[bool] = None,
+    item: Optional[str] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None
+):
+    return {
+        "cnic": cnic, "scheme_id": scheme_id, "vendor_cnic": vendor_cnic, "is_fraudulent": is_fraudulent,
+        "item": item, "created_from": created_from, "created_to": created_to
+    }
+
+def to_expense_record(row):
+    return ExpenseRecord(**{field: row[field] for field in ExpenseRecord.model_fields})
 
-# --- Get All Expenses ---
 @app.get("/expenses", response_model=List[ExpenseRecord])
-def get_expenses(db: Session = Depends(get_db)):
-    expenses = db.query(Expense).all()
-    return [ExpenseRecord(
-        expense_id=e.expense_id,
-        cnic=e.cnic,
-        scheme_id=e.scheme_id,
-        vendor_cnic=e.vendor_cnic,
-        total_amount=e.total_amount,
-        products=e.products,
-        is_fraudulent=e.is_fraudulent,
-        reason=e.reason
-    ) for e in expenses]
+async def get_expenses(
+    response: Response,
+    cursor: Optional[int] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    filters: dict = Depends(expense_filters),
+    db: AsyncSession = Depends(get_async_db)
+):
+    rows, next_cursor = await async_list_expenses(db, filters, cursor, limit)
+    # Pass X-Next-Cursor back as ?cursor= to fetch the next page
+    if next_cursor is not None:
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+    return [to_expense_record(row) for row in rows]
+
+# --- Stream All Matching Expenses (NDJSON / CSV export) ---
+@app.get("/expenses/export")
+async def export_expenses(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    filters: dict = Depends(expense_filters)
+):
+    async def generate():
+        # Own session: it must stay open until the last chunk is sent
+        async with AsyncSessionLocal() as db:
+            if format == "csv":
+                buffer = io.StringIO()
+                writer = csv.writer(buffer)
+                writer.writerow(EXPENSE_COLUMNS)
+                yield buffer.getvalue()
+            async for chunk in async_iter_expenses(db, filters):
+                if format == "csv":
+                    buffer.seek(0)
+                    buffer.truncate()
+                    # products as a JSON cell, the format POST /expenses/bulk reads back
+                    writer.writerows([
+                        [json.dumps(row[c]) if c == "products" else row[c] for c in EXPENSE_COLUMNS] for row in chunk
+                    ])
+                    yield buffer.getvalue()
+                else:
+                    yield "".join(json.dumps(row, default=str) + "\n" for row in chunk)
+
+    media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(generate(), media_type=media_type)
+
+# --- Bulk Expense Ingestion (vendor POS uploads) ---
+@app.post("/expenses/bulk", response_model=BulkIngestResponse)
+async def bulk_ingest_expenses(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    chunk_size: int = Query(config.BULK_CHUNK_SIZE, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # NDJSON or CSV, streamed as the body or uploaded as the "file" form field.
+    # Rows are committed chunk by chunk; bad rows are reported, not fatal.
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        try:
+            form = await request.form()
+        except AssertionError:
+            raise HTTPException(
+                status_code=415,
+                detail="File uploads need python-multipart (uv sync --extra upload); or send the file as the request body"
+            )
+        upload = form.get("file")
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=422, detail="Expected the upload in a 'file' field")
+        is_csv = (upload.filename or "").lower().endswith(".csv") or (upload.content_type or "").startswith("text/csv")
+        chunks = ingest.read_upload(upload)
+    else:
+        is_csv = content_type.startswith("text/csv")
+        chunks = request.stream()
+    return await ingest.ingest(db, chunks, format or ("csv" if is_csv else "ndjson"), chunk_size)
+
+# --- Spending Aggregates ---
+# Served from the spending_rollups table, never by scanning expenses
+@app.get("/aggregates/{dimension}", response_model=List[SpendingRollupOut])
+async def get_spending_aggregates(
+    dimension: str = Path(..., pattern="^(scheme|vendor|citizen)$"),
+    key: Optional[str] = None,
+    day_from: Optional[datetime.date] = None,
+    day_to: Optional[datetime.date] = None,
+    group: str = Query("day", pattern="^(day|total)$"),
+    sort: str = Query("key", pattern="^(key|total)$"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await async_spending_rollups(
+        db, dimension, key=key, day_from=day_from, day_to=day_to, by_day=(group == "day"), sort=sort, limit=limit
+    )
+
+# Line-item totals, e.g. wheat flour disbursed per scheme, computed in SQL from expense_items
+@app.get("/aggregates/items/{dimension}", response_model=List[ItemTotalOut])
+async def get_item_totals(
+    dimension: str = Path(..., pattern="^(scheme|vendor|citizen)$"),
+    item: Optional[str] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+    sort: str = Query("key", pattern="^(key|total)$"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await async_item_totals(
+        db, dimension, item=item, created_from=created_from, created_to=created_to, sort=sort, limit=limit
+    )
 
 # --- AI Chatbot Stub ---
 @app.post("/chatbot")
-def chatbot(query: ChatbotQuery):
+async def chatbot(query: ChatbotQuery):
     return {
         "response": f"Received query: '{query.query}'. AI analysis placeholder.",
         "detected_intent": "general_inquiry"
     }
 
+# --- Cache Statistics ---
+@app.get("/cache-stats")
+async def cache_stats():
+    return {
+        "profiles": PROFILE_PROVIDER.stats(), **result_cache_stats(),
+        "vendors": VENDOR_INDEX.stats(), "schemes": SCHEME_CATALOG.stats(),
+        "products": PRODUCT_CATALOG.stats(), "jobs": JOB_QUEUE.stats(),
+        "trust_batcher": {"enabled": config.TRUST_BATCHING, **TRUST_BATCHER.stats()}
+    }
+
+# --- Metrics ---
+# Component stats are turned into samples at scrape time
+@metrics.collector
+def _component_samples():
+    yield from metrics.cache_samples("profiles", PROFILE_PROVIDER.stats())
+    yield from metrics.cache_samples("eligibility_results", ELIGIBILITY_RESULTS.stats())
+    yield from metrics.cache_samples("trust_results", TRUST_RESULTS.stats())
+    trust_batches = TRUST_BATCHER.stats()
+    yield "expenseai_trust_batcher_calls_total", "counter", "Trust scores requested through the batcher", {}, trust_batches["calls"]
+    yield "expenseai_trust_batcher_deduplicated_total", "counter", "Calls that shared a waiting CNIC's row", {}, trust_batches["deduplicated"]
+    yield "expenseai_trust_batcher_batches_total", "counter", "Batched trust predictions", {}, trust_batches["batches"]
+    yield "expenseai_fraud_checked_total", "counter", "Expenses scored by the fraud engine", {}, FRAUD_ENGINE.checked
+    for rule, n in FRAUD_ENGINE.flagged.copy().items():
+        yield "expenseai_fraud_flagged_total", "counter", "Expenses flagged, per rule", {"rule": rule}, n
+    yield "expenseai_vendor_assignments_total", "counter", "Expenses assigned to a vendor", {}, VENDOR_INDEX.assignments
+    for kind, depth in JOB_QUEUE.depth().items():
+        yield "expenseai_job_queue_depth", "gauge", "Jobs waiting in this process's queue", {"kind": kind}, depth
+    yield "expenseai_jobs_running", "gauge", "Jobs being run by this process", {}, JOB_QUEUE.stats()["running"]
+    for (kind, status), n in JOB_QUEUE.finished.copy().items():
+        yield "expenseai_jobs_finished_total", "counter", "Jobs finished, per outcome", {"kind": kind, "status": status}, n
+    for kind, n in JOB_QUEUE.retried.copy().items():
+        yield "expenseai_jobs_retried_total", "counter", "Jobs requeued after an error", {"kind": kind}, n
+    for kind, n in JOB_QUEUE.batches.copy().items():
+        yield "expenseai_job_batches_total", "counter", "Handler calls (batches of coalesced jobs)", {"kind": kind}, n
+    version = MODEL_REGISTRY.loaded_version
+    if version is not None:
+        yield "expenseai_model_info", "gauge", "Active model version", {"version": version}, 1
+    yield "expenseai_model_reloads_total", "counter", "Model version swaps since start", {}, MODEL_REGISTRY.reloads
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+# --- Model Administration ---
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin API disabled")
+    if x_admin_token != config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+@app.get("/admin/models", dependencies=[Depends(require_admin)])
+async def list_models():
+    return await run_inference(MODEL_REGISTRY.stats)
+
+@app.post("/admin/models/reload", dependencies=[Depends(require_admin)])
+async def reload_models(version: Optional[str] = None):
+    # Loads the newest (or given) version and swaps it in; a failed load keeps the old one
+    try:
+        model_set = await run_inference(MODEL_REGISTRY.reload, version)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Model load failed: {type(e).__name__}: {e}")
+    return model_set.info()
+
+@app.post("/admin/aggregates/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_aggregates(db: AsyncSession = Depends(get_async_db)):
+    # Recomputes every rollup from expenses; run it while no expenses are being written
+    started = time.perf_counter()
+    await db.run_sync(aggregates.rebuild)
+    return {"status": "rebuilt", "seconds": round(time.perf_counter() - started, 3)}
+
+# --- Sampling Profiler ---
+# Off by default; while running it samples every thread's stack. GET returns
+# collapsed stacks ("a;b;c count") for flamegraph.pl or speedscope.
+@app.post("/admin/profiler/start", dependencies=[Depends(require_admin)])
+async def start_profiler(
+    interval_ms: Optional[float] = Query(None, gt=0),
+    seconds: Optional[float] = Query(None, gt=0, description="Stop automatically after this long")
+):
+    if not metrics.PROFILER.start(interval_ms, seconds):
+        raise HTTPException(status_code=409, detail="Profiler already running")
+    return metrics.PROFILER.status()
+
+@app.post("/admin/profiler/stop", dependencies=[Depends(require_admin)])
+async def stop_profiler():
+    await run_inference(metrics.PROFILER.stop)
+    return metrics.PROFILER.status()
+
+@app.get("/admin/profiler", dependencies=[Depends(require_admin)])
+async def get_profile(
+    format: str = Query("collapsed", pattern="^(collapsed|status)$"),
+    limit: Optional[int] = Query(None, ge=1)
+):
+    if format == "status":
+        return metrics.PROFILER.status()
+    return PlainTextResponse(metrics.PROFILER.collapsed(limit))
+
+# --- Liveness & Readiness ---
 @app.get("/health")
-def health():
-    return {"status": "OK", "db": "connected"}
\ No newline at end of file
+async def health():
+    # Liveness: no I/O, answers while the warm-up is still running
+    return {"status": "OK", "db": "connected", "model_version": MODEL_REGISTRY.loaded_version}
+
+@app.get("/ready")
+async def ready(response: Response, db: AsyncSession = Depends(get_async_db)):
+    try:
+        await db.execute(select(1))
+        db_ok = True
+    except Exception:
+        db_ok = False
+    is_ready = db_ok and WARMUP["state"] == "done"
+    if not is_ready:
+        response.status_code = 503
+    return {
+        "status": "ready" if is_ready else "not_ready",
+        "db": "connected" if db_ok else "unavailable",
+        "warmup": WARMUP,
+        "model_version": MODEL_REGISTRY.loaded_version,
+    }
\ No newline at end of file
@@ -0,0 +1,217 @@
+# score_citizens.py
+"""
+Offline bulk scoring for ministry pre-screening files.
+
+Reads a CSV or Parquet file with a `cnic` column (and optionally
+`phone_number`) in chunks, scores eligibility for every scheme plus the
+trust score with the same batch functions the API uses, and streams the
+results to a CSV or Parquet file. Chunks are fanned out across a process
+pool with a bounded number in flight, so memory stays flat on large inputs.
+
+    uv run python score_citizens.py citizens.csv scored.csv
+    uv run python score_citizens.py citizens.parquet scored.parquet --workers 8 --chunk-size 100000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+import pandas as pd
+
+from src import crud
+from src.profiles import generate_profile
+from src.registry import TRUST_ENGINES
+from src.schemes import SchemeSet
+
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+
+# --- Input / Output ---
+def _is_parquet(path):
+    return path.lower().endswith(PARQUET_SUFFIXES)
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        sys.exit("Parquet files need pyarrow: uv sync --extra parquet")
+    return pyarrow, pyarrow.parquet
+
+def read_chunks(path, chunk_size):
+    """Yields DataFrames of at most chunk_size rows with `cnic` and `phone_number` as strings."""
+    wanted = {"cnic", "phone_number"}
+    if _is_parquet(path):
+        _, pq = _require_pyarrow()
+        parquet = pq.ParquetFile(path)
+        columns = [name for name in parquet.schema_arrow.names if name in wanted]
+        frames = (batch.to_pandas() for batch in parquet.iter_batches(batch_size=chunk_size, columns=columns))
+    else:
+        frames = pd.read_csv(path, chunksize=chunk_size, dtype=str, usecols=lambda name: name in wanted)
+
+    for frame in frames:
+        if "cnic" not in frame:
+            sys.exit(f"{path} has no 'cnic' column")
+        if "phone_number" not in frame:
+            frame["phone_number"] = ""
+        yield frame.astype({"cnic": str}).fillna({"phone_number": ""}).astype({"phone_number": str})
+
+
+class CsvOutput:
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.header = True
+
+    def write(self, frame):
+        frame.to_csv(self.file, header=self.header, index=False)
+        self.header = False
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetOutput:
+    def __init__(self, path):
+        self.pa, self.pq = _require_pyarrow()
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        table = self.pa.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_output(path):
+    return ParquetOutput(path) if _is_parquet(path) else CsvOutput(path)
+
+
+# --- Scoring ---
+def load_schemes(scheme_ids=None):
+    """Compiled (picklable) SchemeSet of the database's schemes, or only `scheme_ids`."""
+    from src.database import SessionLocal
+    from src.models import Scheme
+
+    with SessionLocal() as db:
+        query = db.query(Scheme)
+        if scheme_ids:
+            query = query.filter(Scheme.scheme_id.in_(scheme_ids))
+        return SchemeSet(
+            SimpleNamespace(scheme_id=s.scheme_id, max_income=s.max_income, min_family_size=s.min_family_size)
+            for s in query.order_by(Scheme.scheme_id)
+        )
+
+def score_chunk(frame, schemes, engine=None, model_set=None):
+    """Eligibility for every scheme plus trust for one chunk, as a DataFrame."""
+    cnics = frame["cnic"].tolist()
+    phones = frame["phone_number"].tolist()
+    # Generated directly: a one-off file would only churn the shared profile cache
+    profiles = [generate_profile(cnic) for cnic in cnics]
+
+    out = {"cnic": cnics}
+    # All schemes against the whole chunk at once, with one model call
+    codes, reasons = crud.score_scheme_matrix(profiles, schemes, model_set=model_set)
+    for j, scheme_id in enumerate(schemes.ids):
+        column = codes[:, j].tolist()
+        out[f"{scheme_id}_eligible"] = [code == 0 for code in column]
+        out[f"{scheme_id}_reasons"] = ["; ".join(reasons[code]) for code in column]
+
+    trust = crud.score_trust_batch(cnics, phones, engine, profiles, model_set)
+    out["trust_score"] = [score for score, _, _ in trust]
+    out["is_identity_verified"] = [verified for _, verified, _ in trust]
+    out["trust_reasons"] = ["; ".join(reasons) for _, _, reasons in trust]
+    return pd.DataFrame(out)
+
+
+_WORKER = {}
+
+def _init_worker(schemes, engine, model_set):
+    _WORKER.update(schemes=schemes, engine=engine, model_set=model_set)
+
+def _score_in_worker(frame):
+    return score_chunk(frame, _WORKER["schemes"], _WORKER["engine"], _WORKER["model_set"])
+
+
+def score_file(input_path, output_path, schemes, workers=None, chunk_size=50000, engine=None,
+               model_set=None, progress=True, start_method=None):
+    """
+    Scores input_path into output_path with one model version throughout. Returns (rows, seconds).
+    The workers get the schemes and model set pickled, so they score with exactly the
+    parent's models under any start_method (default: the platform's).
+    """
+    workers = os.cpu_count() if workers is None else workers
+    model_set = model_set or crud.current_models()
+    if not isinstance(schemes, SchemeSet):
+        schemes = SchemeSet(schemes.values())
+    output = open_output(output_path)
+    rows = 0
+    started = time.perf_counter()
+
+    def emit(frame):
+        nonlocal rows
+        output.write(frame)
+        rows += len(frame)
+        if progress:
+            elapsed = time.perf_counter() - started
+            print(f"\r{rows:,} rows  {rows / elapsed:,.0f} rows/s", end="", file=sys.stderr, flush=True)
+
+    try:
+        if workers <= 1:
+            for frame in read_chunks(input_path, chunk_size):
+                emit(score_chunk(frame, schemes, engine, model_set))
+        else:
+            context = multiprocessing.get_context(start_method)
+            with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                     initargs=(schemes, engine, model_set)) as pool:
+                # At most 2 chunks per worker in flight; results are written in input order
+                pending = deque()
+                for frame in read_chunks(input_path, chunk_size):
+                    pending.append(pool.submit(_score_in_worker, frame))
+                    if len(pending) >= 2 * workers:
+                        emit(pending.popleft().result())
+                while pending:
+                    emit(pending.popleft().result())
+    finally:
+        output.close()
+        if progress:
+            print(file=sys.stderr)
+    return rows, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk eligibility and trust scoring for CSV/Parquet citizen files.")
+    parser.add_argument("input", help="CSV or Parquet file with a 'cnic' column (optional 'phone_number')")
+    parser.add_argument("output", help="Output file; .parquet/.pq writes Parquet, anything else CSV")
+    parser.add_argument("--workers", type=int, default=None, help="Scoring processes (default: CPU count, 1 = in-process)")
+    parser.add_argument("--chunk-size", type=int, default=50000, help="Rows per chunk")
+    parser.add_argument("--schemes", nargs="+", help="Only score these scheme_ids (default: all schemes in the database)")
+    parser.add_argument("--trust-engine", choices=TRUST_ENGINES, help="Trust model engine (default: EXPENSEAI_TRUST_ENGINE)")
+    parser.add_argument("--start-method", choices=multiprocessing.get_all_start_methods(),
+                        help="How worker processes are started (default: the platform's)")
+    args = parser.parse_args()
+
+    schemes = load_schemes(args.schemes)
+    if not schemes:
+        sys.exit("No schemes found; start the API once to seed them, or check --schemes")
+
+    model_set = crud.current_models()
+    rows, seconds = score_file(
+        args.input, args.output, schemes,
+        workers=args.workers, chunk_size=args.chunk_size, engine=args.trust_engine, model_set=model_set,
+        start_method=args.start_method
+    )
+    print(f"Scored {rows:,} citizens against {len(schemes)} schemes with models {model_set.version} in {seconds:.1f}s "
+          f"({rows / max(seconds, 1e-9):,.0f} rows/s) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+# src/aggregates.py
+"""
+Materialized spending aggregates.
+
+`spending_rollups` holds one row per (dimension, key, UTC day) with the
+expense count, amount and fraud totals for a scheme, vendor or citizen.
+crud.create_expense_record upserts the rows of each new expense in the same
+transaction as the insert (ON CONFLICT on SQLite and Postgres, update then
+insert elsewhere), so rollups never drift from `expenses`. The citizen row
+goes through add_within_limit, which checks User.spending_limit in the same
+statement, so concurrent expenses cannot both pass the limit (bulk inserts
+use add_many_within_limit, which does the same per limited citizen). Dashboard
+queries read these rows instead of scanning expenses, so their cost depends
+on keys x days, not on the size of the expenses table.
+
+rebuild() recomputes every rollup from `expenses` with one INSERT ... SELECT
+... GROUP BY per dimension (`python -m src.aggregates`, or
+POST /admin/aggregates/rebuild). Run it while no expenses are being written.
+"""
+import datetime
+
+from sqlalchemy import Date, Float, Integer, String, bindparam, case, cast, delete, exists, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session, aliased
+
+from . import models
+from .config import SPENDING_LIMIT_DAYS
+
+# dimension -> Expense column it groups by
+DIMENSIONS = {"scheme": "scheme_id", "vendor": "vendor_cnic", "citizen": "cnic"}
+TOTALS = ("expense_count", "total_amount", "fraud_count", "fraud_amount")
+
+
+# --- Incremental updates ---
+def rollup_rows(expense: dict):
+    """The three rollup increments of one expense (needs created_at)."""
+    amount = float(expense["total_amount"])
+    fraud = bool(expense.get("is_fraudulent"))
+    totals = {
+        "expense_count": 1,
+        "total_amount": amount,
+        "fraud_count": int(fraud),
+        "fraud_amount": amount if fraud else 0.0,
+    }
+    day = expense["created_at"].date()
+    return [
+        {"dimension": dimension, "key": expense[column], "day": day, **totals}
+        for dimension, column in DIMENSIONS.items()
+    ]
+
+
+def merged_rollup_rows(expenses):
+    """Rollup increments of many expenses, summed per (dimension, key, day)."""
+    merged = {}
+    for expense in expenses:
+        for row in rollup_rows(expense):
+            key = (row["dimension"], row["key"], row["day"])
+            total = merged.get(key)
+            if total is None:
+                merged[key] = row
+            else:
+                for name in TOTALS:
+                    total[name] += row[name]
+    return list(merged.values())
+
+
+ON_CONFLICT_DIALECTS = ("sqlite", "postgresql")
+
+def _dialect_insert(dialect_name: str):
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    return dialect_insert
+
+_upserts = {}
+
+def upsert_statement(dialect_name: str):
+    """INSERT that adds to the totals of an existing (dimension, key, day) row (ON_CONFLICT_DIALECTS)."""
+    statement = _upserts.get(dialect_name)
+    if statement is None:
+        R = models.SpendingRollup
+        stmt = _dialect_insert(dialect_name)(R)
+        statement = _upserts[dialect_name] = stmt.on_conflict_do_update(
+            index_elements=[R.dimension, R.key, R.day],
+            set_={name: getattr(R, name) + getattr(stmt.excluded, name) for name in TOTALS},
+        )
+    return statement
+
+
+class SpendingLimitExceeded(Exception):
+    """The expense would take its citizen past User.spending_limit; its rollup row was not written."""
+
+
+def _within_limit(day_total, key, day, window_start, amount):
+    # Spending limit check for the citizen row being written, given that row's current total:
+    # the window is the limit days ending on the row's day
+    R, U = aliased(models.SpendingRollup), models.User
+    limit = select(U.spending_limit).where(U.cnic == key).scalar_subquery()
+    other_days = select(func.coalesce(func.sum(R.total_amount), 0.0)).where(
+        R.dimension == "citizen", R.key == key, R.day >= window_start, R.day < day,
+    ).scalar_subquery()
+    return or_(limit.is_(None), other_days + day_total + amount <= limit)
+
+_limited_upserts = {}
+
+def limited_upsert_statement(dialect_name: str):
+    """
+    upsert_statement for a citizen row, written only while the citizen stays
+    within User.spending_limit (no limit = always). Check and write are one
+    statement: its rowcount is 0 when the limit would be exceeded.
+    Parameters come from limited_rollup_rows.
+    """
+    statement = _limited_upserts.get(dialect_name)
+    if statement is None:
+        R, today = models.SpendingRollup, aliased(models.SpendingRollup)
+        key, day = bindparam("key", type_=String), bindparam("day", type_=Date)
+        window_start, amount = bindparam("window_start", type_=Date), bindparam("total_amount", type_=Float)
+        day_total = select(today.total_amount).where(
+            today.dimension == "citizen", today.key == key, today.day == day
+        ).scalar_subquery()
+        values = select(
+            bindparam("dimension", type_=String), key, day,
+            bindparam("expense_count", type_=Integer), amount,
+            bindparam("fraud_count", type_=Integer), bindparam("fraud_amount", type_=Float),
+        ).where(_within_limit(func.coalesce(day_total, 0.0), key, day, window_start, amount))
+        # On the Table: an ORM-enabled INSERT ... SELECT with parameters would be run as a bulk insert
+        table = R.__table__
+        stmt = _dialect_insert(dialect_name)(table).from_select(["dimension", "key", "day", *TOTALS], values)
+        statement = _limited_upserts[dialect_name] = stmt.on_conflict_do_update(
+            index_elements=[table.c.dimension, table.c.key, table.c.day],
+            set_={name: table.c[name] + stmt.excluded[name] for name in TOTALS},
+            # Re-checked against the row it updates (Postgres re-reads it after a concurrent write)
+            where=_within_limit(table.c.total_amount, key, day, window_start, amount),
+        )
+    return statement
+
+def limited_rollup_rows(expense: dict):
+    """
+    rollup_rows of one expense as (citizen row for add_within_limit, the other
+    rows). The limit window ends on the expense's own day, so backdated
+    expenses are checked against what was spent around them.
+    """
+    *rows, citizen = rollup_rows(expense)  # "citizen" is the last of DIMENSIONS
+    return dict(citizen, window_start=limit_window_start(citizen["day"])), rows
+
+
+# Databases without ON CONFLICT: UPDATE the row in place, INSERT it when there was none.
+# Not atomic; a concurrent first write of the same row fails on the primary key.
+def _row_of(table, row):
+    return (table.c.dimension == row["dimension"], table.c.key == row["key"], table.c.day == row["day"])
+
+def _add_in_place(db: Session, row, *conditions):
+    T = models.SpendingRollup.__table__
+    stmt = update(T).where(*_row_of(T, row), *conditions).values({name: T.c[name] + row[name] for name in TOTALS})
+    return db.execute(stmt).rowcount
+
+def add(db: Session, rows):
+    """Adds rollup increments (rollup_rows or merged_rollup_rows) to their rows, creating missing ones."""
+    if not rows:
+        return
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ON_CONFLICT_DIALECTS:
+        db.execute(upsert_statement(dialect_name), rows)
+        return
+    missing = [row for row in rows if not _add_in_place(db, row)]
+    if missing:
+        db.execute(insert(models.SpendingRollup.__table__), missing)
+
+def add_within_limit(db: Session, citizen: dict):
+    """
+    Adds a limited_rollup_rows citizen row unless that takes the citizen past
+    User.spending_limit; returns whether it was added.
+    """
+    dialect_name = db.get_bind().dialect.name
+    if dialect_name in ON_CONFLICT_DIALECTS:
+        return bool(db.execute(limited_upsert_statement(dialect_name), citizen).rowcount)
+    T = models.SpendingRollup.__table__
+    check = (citizen["key"], citizen["day"], citizen["window_start"], citizen["total_amount"])
+    if _add_in_place(db, citizen, _within_limit(T.c.total_amount, *check)):
+        return True
+    if db.execute(select(T.c.day).where(*_row_of(T, citizen))).first() is not None:
+        return False  # the row exists, so the update was refused by the limit
+    if not db.scalar(select(_within_limit(0.0, *check))):
+        return False
+    db.execute(insert(T), [{column: citizen[column] for column in ("dimension", "key", "day", *TOTALS)}])
+    return True
+
+def add_many_within_limit(db: Session, expenses):
+    """
+    Adds many expenses to the rollups like add, with the citizen row of every
+    citizen who has a spending limit going through add_within_limit, in order.
+    Returns the indexes of the expenses refused by the limit; none of their
+    rows are written.
+    """
+    U = models.User
+    cnics = {expense["cnic"] for expense in expenses}
+    limited = set(db.scalars(select(U.cnic).where(U.cnic.in_(cnics), U.spending_limit.is_not(None)))) if cnics else set()
+    refused = []
+    for i, expense in enumerate(expenses):
+        if expense["cnic"] in limited and not add_within_limit(db, limited_rollup_rows(expense)[0]):
+            refused.append(i)
+    skipped = set(refused)
+    rows = merged_rollup_rows(expense for i, expense in enumerate(expenses) if i not in skipped)
+    # Citizen rows of limited citizens were written by add_within_limit above
+    add(db, [row for row in rows if row["dimension"] != "citizen" or row["key"] not in limited])
+    return refused
+
+
+# --- Rebuild ---
+def _day(dialect_name: str, column):
+    # SQLite stores DateTime as text; CAST(... AS DATE) would keep only the year
+    return func.date(column) if dialect_name == "sqlite" else cast(column, Date)
+
+def rebuild(db: Session):
+    """Replaces every rollup with totals recomputed from `expenses`, in one transaction."""
+    E, R = models.Expense, models.SpendingRollup
+    day = _day(db.get_bind().dialect.name, E.created_at)
+    fraud_amount = func.sum(case((E.is_fraudulent.is_(True), E.total_amount), else_=0.0))
+    db.execute(delete(R))
+    for dimension, column in DIMENSIONS.items():
+        key = getattr(E, column)
+        db.execute(insert(R).from_select(
+            ["dimension", "key", "day", *TOTALS],
+            select(
+                literal(dimension), key, day,
+                func.count(), func.coalesce(func.sum(E.total_amount), 0.0),
+                func.sum(case((E.is_fraudulent.is_(True), 1), else_=0)), fraud_amount,
+            ).where(key.is_not(None)).group_by(key, day)
+        ))
+    db.commit()
+
+def ensure_built(db: Session):
+    """Rebuilds once when expenses exist but no rollups do (first start after an upgrade)."""
+    has_expenses, has_rollups = db.execute(select(
+        exists().where(models.Expense.id.is_not(None)),
+        exists().where(models.SpendingRollup.dimension.is_not(None)),
+    )).one()
+    if has_expenses and not has_rollups:
+        rebuild(db)
+        return True
+    return False
+
+
+# --- Queries ---
+def rollup_query(dimension: str, key=None, day_from=None, day_to=None, by_day=True, sort="key", limit=1000):
+    """
+    Totals per key (and per day with by_day) for one dimension, days in
+    [day_from, day_to]. sort="total" puts the largest total_amount first.
+    """
+    R = models.SpendingRollup
+    groups = [R.key, R.day] if by_day else [R.key]
+    query = select(*groups, *[func.sum(getattr(R, name)).label(name) for name in TOTALS])
+    query = query.where(R.dimension == dimension)
+    if key is not None:
+        query = query.where(R.key == key)
+    if day_from is not None:
+        query = query.where(R.day >= day_from)
+    if day_to is not None:
+        query = query.where(R.day <= day_to)
+    query = query.group_by(*groups)
+    order = [func.sum(R.total_amount).desc(), *groups] if sort == "total" else groups
+    return query.order_by(*order).limit(limit)
+
+def with_fraud_rate(row):
+    row = dict(row)
+    row["fraud_rate"] = row["fraud_count"] / row["expense_count"] if row["expense_count"] else 0.0
+    return row
+
+
+# --- Spending limits ---
+def limit_window_start(today=None, days=SPENDING_LIMIT_DAYS):
+    today = today or datetime.datetime.utcnow().date()
+    return today - datetime.timedelta(days=days - 1)
+
+def spending_limit_query(cnic: str, today=None):
+    """(User.spending_limit, amount spent in the limit window) for one citizen, in one query."""
+    R = models.SpendingRollup
+    spent = select(func.coalesce(func.sum(R.total_amount), 0.0)).where(
+        R.dimension == "citizen", R.key == cnic, R.day >= limit_window_start(today)
+    ).scalar_subquery()
+    return select(models.User.spending_limit, spent).where(models.User.cnic == cnic)
+
+def exceeds_limit(row, amount):
+    """True when a spending_limit_query row leaves no room for `amount`."""
+    if row is None:
+        return False
+    limit, spent = row
+    return limit is not None and spent + amount > limit
+
+
+if __name__ == "__main__":
+    # python -m src.aggregates  ->  rebuild every rollup from the expenses table
+    import time
+    from .database import SessionLocal, init_db
+
+    init_db()
+    started = time.perf_counter()
+    with SessionLocal() as db:
+        rebuild(db)
+        rows = db.scalar(select(func.count()).select_from(models.SpendingRollup))
+    print(f"Rebuilt {rows:,} spending rollups in {time.perf_counter() - started:.2f}s")
@@ -0,0 +1,100 @@
+# src/batching.py
+"""
+Request coalescing for async callers of a batch function.
+
+    batcher = MicroBatcher(score_many, max_batch=64, window_ms=2)
+    result = await batcher(key)
+
+When no batch is running, a call is sent right away (with whatever arrived
+in the same event-loop tick), so a lone caller pays no window. While a batch
+runs, calls are collected until it finishes, `max_batch` distinct keys are
+waiting, or `window_ms` has passed since the first one; then
+`score_many(keys)` runs once and each caller gets the result at its key's
+position. Callers asking for a key that is already waiting share its result
+instead of adding a row.
+"""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    def __init__(self, fn, max_batch=64, window_ms=2.0):
+        """`fn` is an async fn(keys) -> one result per key, in order."""
+        self.fn = fn
+        self.max_batch = max_batch
+        self.window = window_ms / 1000.0
+        self._pending = {}  # key -> future, in arrival order
+        self._timer = None
+        self._tasks = set()
+        self.calls = 0
+        self.deduplicated = 0
+        self.batches = 0
+        self.rows = 0
+        self.full_batches = 0
+
+    async def __call__(self, key):
+        self.calls += 1
+        future = self._pending.get(key)
+        if future is not None:
+            self.deduplicated += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._pending[key] = future
+            if len(self._pending) >= self.max_batch:
+                self.full_batches += 1
+                self._flush()
+            elif self._timer is None:
+                loop = asyncio.get_running_loop()
+                if self._tasks:
+                    self._timer = loop.call_later(self.window, self._flush)
+                else:
+                    self._timer = loop.call_soon(self._flush)
+        # Shielded: a caller that goes away must not cancel the result other callers share
+        return await asyncio.shield(future)
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task):
+        self._tasks.discard(task)
+        if self._pending and not self._tasks:
+            self._flush()  # what queued up behind the batch goes now, not when the window ends
+
+    async def _run(self, batch):
+        self.batches += 1
+        self.rows += len(batch)
+        try:
+            results = await self.fn(list(batch))
+            if len(results) != len(batch):
+                raise RuntimeError(f"batch function returned {len(results)} results for {len(batch)} keys")
+        except Exception as e:
+            logger.warning("Batch of %d failed: %s: %s", len(batch), type(e).__name__, e)
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result in zip(batch.values(), results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "max_batch": self.max_batch,
+            "window_ms": self.window * 1000,
+            "calls": self.calls,
+            "deduplicated": self.deduplicated,
+            "batches": self.batches,
+            "full_batches": self.full_batches,
+            "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+            "waiting": len(self._pending),
+        }
@@ -1,82 +1,138 @@
 # src/crud.py
-import random
-import os
-import joblib
-import pandas as pd
-from sqlalchemy.orm import Session
-from . import models
-
-# --- Load Models ---
-BASE_DIR = os.path.dirname(__file__)
-ELIGIBILITY_MODEL_PATH = os.path.join(BASE_DIR, "eligibility_model.pkl")
-TRUST_MODEL_PATH = os.path.join(BASE_DIR, "trust_model.pkl")
-
-ELIGIBILITY_MODEL = None
-TRUST_MODEL = None
-
-try:
-    if os.path.exists(ELIGIBILITY_MODEL_PATH):
-        ELIGIBILITY_MODEL = joblib.load(ELIGIBILITY_MODEL_PATH)
-        print("Loaded Eligibility Model")
-    if os.path.exists(TRUST_MODEL_PATH):
-        TRUST_MODEL = joblib.load(TRUST_MODEL_PATH)
-        print("Loaded Trust Model")
-except Exception as e:
-    print(f"Error loading models: {e}")
-
-# Synthetic data generator
-def get_synthetic_profile(cnic: str):
-    random.seed(cnic)
+import asyncio
+import contextvars
+import datetime
+import functools
+from itertools import repeat
+from contextlib import asynccontextmanager, contextmanager
+from sqlalchemy import event, exists, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
+from concurrent.futures import ThreadPoolExecutor
+from . import aggregates, line_items, models
+from .batching import MicroBatcher
+from .cache import TTLCache
+from .config import (
+    TRUST_ENGINE, INFERENCE_WORKERS, RESULT_CACHE_SIZE, RESULT_CACHE_TTL, TRUST_BATCHING, TRUST_BATCH_MAX_SIZE,
+    TRUST_BATCH_WINDOW_MS
+)
+from .metrics import count_model_call, span
+from .profiles import PROFILE_PROVIDER
+from .registry import MODEL_REGISTRY, TRUST_ENGINES
+from .schemes import (
+    BILLS_UNPAID, MODEL_INELIGIBLE, SCHEME_CATALOG, SchemeSet, failure_code, reason_table
+)
+
+# --- Models ---
+# Loaded lazily by the registry. Each scoring call works against one ModelSet
+# snapshot, passed in by the caller or taken from the registry.
+def current_models():
+    return MODEL_REGISTRY.current()
+
+# --- Result Caches ---
+# Eligibility is keyed on (cnic, scheme_id, model version, scheme catalog generation),
+# so a catalog reload that changes any scheme (here or in another worker) misses.
+# Both are cleared when models reload; eligibility also after a Scheme commit here.
+ELIGIBILITY_RESULTS = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+TRUST_RESULTS = TTLCache(maxsize=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL)
+
+@MODEL_REGISTRY.on_swap
+def _drop_results_on_model_swap(model_set):
+    ELIGIBILITY_RESULTS.clear()
+    TRUST_RESULTS.clear()
+
+def invalidate_scheme_results():
+    """Drops cached eligibility decisions and reloads the scheme catalog; called after a Scheme row changes."""
+    SCHEME_CATALOG.invalidate()
+    ELIGIBILITY_RESULTS.clear()
+
+@event.listens_for(models.Scheme, "after_insert")
+@event.listens_for(models.Scheme, "after_update")
+@event.listens_for(models.Scheme, "after_delete")
+def _mark_scheme_changed(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        session.info["schemes_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_scheme_commit(session):
+    if session.info.pop("schemes_changed", False):
+        invalidate_scheme_results()
+
+def result_cache_stats():
     return {
-        "income": random.choice([30000, 45000, 60000, 80000, 120000]),
-        "family_size": random.randint(2, 8),
-        "utility_bills_paid": random.choice([True, True, False]),
-        "loan_defaults": random.choice([0, 0, 0, 0, 1]), # 20% chance
-        "credit_history_years": random.randint(0, 15),
-        "suspicious_transactions": random.choice([0, 0, 0, 1, 2])
+        "model_version": MODEL_REGISTRY.loaded_version,
+        "eligibility_results": ELIGIBILITY_RESULTS.stats(),
+        "trust_results": TRUST_RESULTS.stats(),
     }
 
-def check_scheme_eligibility(db: Session, cnic: str, scheme_id: str):
+# Synthetic data generator (thread-safe, memoized per CNIC)
+def get_synthetic_profile(cnic: str):
+    return PROFILE_PROVIDER.get(cnic)
+
+def check_scheme_eligibility(db: Session, cnic: str, scheme_id: str, model_set=None):
     """
     Checks if a user meets the specific requirements of a scheme 
     (Income, Family Size, etc.)
     """
-    scheme = db.query(models.Scheme).filter(models.Scheme.scheme_id == scheme_id).first()
+    model_set = model_set or current_models()
+    SCHEME_CATALOG.refresh_if_stale(db)
+    schemes = SCHEME_CATALOG.current()
+    key = (cnic, scheme_id, model_set.version, schemes.generation)
+    cached = ELIGIBILITY_RESULTS.get(key)
+    if cached is not None:
+        return cached[0], list(cached[1])
+    return score_scheme_eligibility(cnic, schemes.get(scheme_id), key, model_set)
+
+# Reasons per failure code (see src/schemes.py), by how the financial check was made
+MODEL_REASONS = reason_table(MODEL_INELIGIBLE)
+RULE_REASONS = reason_table(BILLS_UNPAID)
+
+def score_scheme_eligibility(cnic: str, scheme, key=None, model_set=None):
+    """
+    CPU part of check_scheme_eligibility for an already loaded scheme.
+    Stores the decision under the result-cache key when one is given.
+    """
     if not scheme:
         return None, ["Scheme not found"]
 
+    model_set = model_set or current_models()
     profile = get_synthetic_profile(cnic)
-    reasons = []
-    eligible = False
-
-    # Predict Eligibility using Model or Rules
-    if ELIGIBILITY_MODEL:
-        features_cls = pd.DataFrame([{
-            "income": profile["income"],
-            "family_size": profile["family_size"],
-            "utility_bills_paid": 1 if profile["utility_bills_paid"] else 0
-        }])
-        eligible = bool(ELIGIBILITY_MODEL.predict(features_cls)[0])
-        
-        if not eligible:
-            reasons.append("AI Model predicted ineligibility based on financial profile.")
+
+    # Financial check by the model, or by the fallback rule; the scheme's own criteria apply either way
+    if model_set.eligibility_kernel:
+        with span("inference"):
+            financial_ok = bool(model_set.eligibility_kernel.predict_one(profile))
+        count_model_call("eligibility", "sklearn", "single")
+        table = MODEL_REASONS
     else:
-        # Fallback Rules
-        eligible = True
-        if profile["income"] > scheme.max_income:
-            eligible = False
-            reasons.append("Income too high")
-        if not profile["utility_bills_paid"]:
-            eligible = False
-            reasons.append("Utility bills unpaid")
-            
+        financial_ok = bool(profile["utility_bills_paid"])
+        table = RULE_REASONS
+
+    code = failure_code(profile, scheme, financial_ok)
+    eligible, reasons = code == 0, list(table[code])
+
+    if key is not None:
+        ELIGIBILITY_RESULTS.set(key, (eligible, tuple(reasons)))
     return eligible, reasons
 
-def calculate_trust_score(cnic: str, phone_number: str):
+def _trust_engine(engine: str = None):
+    engine = engine or TRUST_ENGINE
+    if engine not in TRUST_ENGINES:
+        raise ValueError(f"Unknown trust engine: {engine}")
+    return engine
+
+def _trust_key(cnic, engine, model_set):
+    return (cnic, None, f"{model_set.version}/{engine}")
+
+def calculate_trust_score(cnic: str, phone_number: str, engine: str = None, model_set=None):
     """
     1. Verifies identity (Mock NADRA/State Bank check).
     2. Calculates trust score based on financial history.
+    `engine` picks the trust model engine ("sklearn" or "flat"),
+    defaulting to EXPENSEAI_TRUST_ENGINE.
     """
+    engine = _trust_engine(engine)
     reasons = []
     
     # --- 1. Mock Identity Verification (NADRA/State Bank) ---
@@ -88,19 +144,21 @@ def calculate_trust_score(cnic: str, phone_number: str):
         return 0.0, False, reasons
 
     # --- 2. Calculate Trust Score ---
+    model_set = model_set or current_models()
+    key = _trust_key(cnic, engine, model_set)
+    cached = TRUST_RESULTS.get(key)
+    if cached is not None:
+        return cached[0], True, list(cached[1])
+
     profile = get_synthetic_profile(cnic)
     trust_score = 50.0 # Default neutral
 
-    if TRUST_MODEL:
-        features_reg = pd.DataFrame([{
-            "income": profile["income"],
-            "family_size": profile["family_size"],
-            "utility_bills_paid": 1 if profile["utility_bills_paid"] else 0,
-            "loan_defaults": profile["loan_defaults"],
-            "credit_history_years": profile["credit_history_years"],
-            "suspicious_transactions": profile["suspicious_transactions"]
-        }])
-        trust_score = float(TRUST_MODEL.predict(features_reg)[0])
+    # Without a flattened artifact the "flat" engine falls back to the sklearn trees
+    trust_kernel = model_set.trust_engines[engine] or model_set.trust_kernel
+    if trust_kernel:
+        with span("inference"):
+            trust_score = float(trust_kernel.predict_one(profile))
+        count_model_call("trust", engine, "single")
         
         if trust_score < 40:
             reasons.append("Low Trust Score: History of defaults or suspicious activity detected.")
@@ -113,18 +171,485 @@ def calculate_trust_score(cnic: str, phone_number: str):
         if profile["utility_bills_paid"]:
             trust_score += 10
 
-    return round(trust_score, 1), True, reasons
+    trust_score = round(trust_score, 1)
+    TRUST_RESULTS.set(key, (trust_score, tuple(reasons)))
+    return trust_score, True, reasons
+
+def score_trust_batch(cnics, phone_numbers, engine: str = None, profiles=None, model_set=None):
+    """
+    Vectorized calculate_trust_score without the result cache, for offline scoring.
+    Returns a list of (trust_score, is_identity_verified, reasons) in input order.
+    `profiles` can be passed in when the caller already generated them.
+    phone_numbers=None skips the identity check (the caller already did it).
+    """
+    import numpy as np
+    engine = _trust_engine(engine)
+    if not cnics:
+        return []
+    if profiles is None:
+        profiles = [get_synthetic_profile(cnic) for cnic in cnics]
+
+    model_set = model_set or current_models()
+    trust_kernel = model_set.trust_engines[engine] or model_set.trust_kernel
+    if trust_kernel:
+        with span("inference"):
+            scores = trust_kernel.predict(trust_kernel.matrix(profiles))
+        count_model_call("trust", engine, "batch", len(profiles))
+    else:
+        # Same fallback logic as calculate_trust_score
+        scores = np.full(len(profiles), 50.0)
+        scores -= 20 * np.array([p["loan_defaults"] > 0 for p in profiles])
+        scores -= 15 * np.array([p["suspicious_transactions"] > 0 for p in profiles])
+        scores += 10 * np.array([bool(p["utility_bills_paid"]) for p in profiles])
+
+    results = []
+    for score, phone_number in zip(scores.tolist(), phone_numbers or repeat(None)):
+        if phone_number is not None and phone_number.endswith("0000"):
+            results.append((0.0, False, ["Identity Verification Failed: Phone number not registered to this CNIC."]))
+            continue
+        reasons = []
+        if trust_kernel and score < 40:
+            reasons.append("Low Trust Score: History of defaults or suspicious activity detected.")
+        results.append((round(score, 1), True, reasons))
+    return results
+
+def check_scheme_eligibility_batch(db: Session, items, model_set=None):
+    """
+    Vectorized check_scheme_eligibility for many (cnic, scheme_id) pairs.
+    Builds one feature matrix and calls the model once. Returns a list of
+    (eligible, reasons) in input order; unknown schemes give (None, [...]).
+    """
+    model_set = model_set or current_models()
+    SCHEME_CATALOG.refresh_if_stale(db)
+    schemes = SCHEME_CATALOG.current()
+    keys, results, misses = _cached_batch_results(items, model_set, schemes)
+    if misses:
+        _score_batch_misses(items, schemes, keys, results, misses, model_set)
+    return results
+
+def _cached_batch_results(items, model_set, schemes):
+    generation = schemes.generation
+    keys = [(cnic, scheme_id, model_set.version, generation) for cnic, scheme_id in items]
+    results = [ELIGIBILITY_RESULTS.get(key) for key in keys]
+    misses = [i for i, cached in enumerate(results) if cached is None]
+    for i, cached in enumerate(results):
+        if cached is not None:
+            results[i] = (cached[0], list(cached[1]))
+    return keys, results, misses
+
+def _score_batch_misses(items, schemes, keys, results, misses, model_set):
+    scored = score_eligibility_batch([items[i] for i in misses], schemes, model_set=model_set)
+    for i, (eligible, reasons) in zip(misses, scored):
+        results[i] = (eligible, reasons)
+        if eligible is not None:
+            ELIGIBILITY_RESULTS.set(keys[i], (eligible, tuple(reasons)))
+
+def _financial_checks(profiles, model_set):
+    """Per-profile financial check for a batch (one model call) and the matching reasons table."""
+    import numpy as np
+    kernel = model_set.eligibility_kernel
+    if kernel:
+        with span("inference"):
+            financial_ok = kernel.predict(kernel.matrix(profiles)).astype(bool)
+        count_model_call("eligibility", "sklearn", "batch", len(profiles))
+        return financial_ok, MODEL_REASONS
+    # Fallback Rules
+    return np.array([p["utility_bills_paid"] for p in profiles], dtype=bool), RULE_REASONS
+
+def _profile_columns(profiles):
+    income = [p["income"] for p in profiles]
+    family_size = [p["family_size"] for p in profiles]
+    return income, family_size
+
+def score_eligibility_batch(items, schemes, profiles=None, model_set=None):
+    """
+    CPU part of check_scheme_eligibility_batch. `schemes` is a SchemeSet or a
+    dict mapping scheme_id to a scheme row. `profiles` (one per item) can be
+    passed in when the caller already has them.
+    """
+    if not items:
+        return []
+    if not isinstance(schemes, SchemeSet):
+        schemes = SchemeSet(schemes.values())
+
+    if profiles is None:
+        profiles = [get_synthetic_profile(cnic) for cnic, _ in items]
+    model_set = model_set or current_models()
+    financial_ok, table = _financial_checks(profiles, model_set)
+    income, family_size = _profile_columns(profiles)
+    columns = [schemes.position.get(scheme_id) for _, scheme_id in items]
+    codes = schemes.item_failure_codes(income, family_size, financial_ok, columns)
+
+    return [
+        (code == 0, list(table[code])) if column is not None else (None, ["Scheme not found"])
+        for code, column in zip(codes.tolist(), columns)
+    ]
+
+def score_scheme_matrix(profiles, schemes, scheme_ids=None, model_set=None):
+    """
+    Checks every profile against every scheme of a SchemeSet (or only
+    `scheme_ids`), calling the model once for the whole batch. Returns
+    (codes, reasons_table): an (n_profiles, n_schemes) array of failed-check
+    bits, 0 meaning eligible, and the reasons tuple for each code.
+    """
+    model_set = model_set or current_models()
+    financial_ok, table = _financial_checks(profiles, model_set)
+    income, family_size = _profile_columns(profiles)
+    return schemes.failure_codes(income, family_size, financial_ok, scheme_ids), table
+
+def match_schemes(cnics, scheme_ids=None, only_eligible=False, schemes=None, model_set=None):
+    """
+    Every catalog scheme (or only `scheme_ids`) for each CNIC in one pass.
+    Returns, per CNIC, a list of (scheme_id, eligible, reasons) in catalog
+    order; with only_eligible the ineligible schemes are left out.
+    """
+    import numpy as np
+    schemes = schemes or SCHEME_CATALOG.current()
+    profiles = [get_synthetic_profile(cnic) for cnic in cnics]
+    codes, table = score_scheme_matrix(profiles, schemes, scheme_ids, model_set)
+    ids = schemes.ids if scheme_ids is None else list(scheme_ids)
+
+    results = []
+    for row in codes:
+        if only_eligible:
+            results.append([(ids[j], True, []) for j in np.flatnonzero(row == 0).tolist()])
+        else:
+            results.append([(scheme_id, code == 0, list(table[code])) for scheme_id, code in zip(ids, row.tolist())])
+    return results
+
+# --- Unit of Work ---
+# Inside unit_of_work(db) the create_* helpers only flush; the block commits once.
+# Outside it they commit straight away. Either way ids come back from the
+# INSERT itself (RETURNING), never from a refresh() re-SELECT.
+@contextmanager
+def unit_of_work(db: Session):
+    db.info["unit_of_work"] = True
+    try:
+        yield db
+        with span("db_commit"):
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop("unit_of_work", None)
+
+def _finish_write(db: Session):
+    if db.info.get("unit_of_work"):
+        db.flush()
+    else:
+        with span("db_commit"):
+            db.commit()
 
 def create_application(db: Session, cnic: str, scheme_id: str, eligible: bool):
     app = models.Application(cnic=cnic, scheme_id=scheme_id, eligible=eligible)
     db.add(app)
-    db.commit()
-    db.refresh(app)
+    _finish_write(db)
     return app
 
+def create_applications_bulk(db: Session, rows):
+    """
+    Inserts many Application rows (dicts of cnic, scheme_id, eligible)
+    with a single executemany and one commit.
+    """
+    if rows:
+        db.execute(insert(models.Application), rows)
+        _finish_write(db)
+    return len(rows)
+
+def _with_created_at(expense_data: dict):
+    # Set here rather than by the column default so the rollup day matches the row
+    if expense_data.get("created_at") is None:
+        expense_data = dict(expense_data, created_at=datetime.datetime.utcnow())
+    return expense_data
+
 def create_expense_record(db: Session, expense_data: dict):
-    expense = models.Expense(**expense_data)
+    """
+    Inserts an expense and its product line items (expense_data["products"],
+    a list of item/qty/price dicts) and adds it to the spending rollups, in
+    the same transaction. Raises aggregates.SpendingLimitExceeded, before
+    writing anything else, when it would take the citizen past their
+    spending limit.
+    """
+    expense_data = _with_created_at(expense_data)
+    citizen, rollups = aggregates.limited_rollup_rows(expense_data)
+    if not aggregates.add_within_limit(db, citizen):
+        raise aggregates.SpendingLimitExceeded(expense_data["cnic"])
+    (row,), (products,) = line_items.split_products([expense_data])
+    expense = models.Expense(**row)
+    db.add(expense)
+    db.flush()  # assigns expense.id for the line items
+    if products:
+        ids = line_items.PRODUCT_CATALOG.resolve(db, line_items.product_names([products]))
+        db.execute(insert(models.ExpenseItem), line_items.item_rows([expense.id], [products], ids))
+    aggregates.add(db, rollups)
+    _finish_write(db)
+    return expense
+
+def _insert_expenses_returning_ids():
+    # One executemany whose RETURNING gives the new ids in parameter order
+    return insert(models.Expense).returning(models.Expense.id, sort_by_parameter_order=True)
+
+def create_expenses_bulk(db: Session, rows):
+    """
+    Inserts many expense dicts (with expense_id, created_at and products)
+    with one executemany for the expenses and one for their line items, adds
+    them to the spending rollups and commits once. Rows that would take their
+    citizen past the spending limit are checked in the rollup write, as in
+    create_expense_record, and left out; returns their indexes in `rows`.
+    """
+    refused = []
+    if rows:
+        refused = aggregates.add_many_within_limit(db, rows)
+        rows = _without(rows, refused)
+    if rows:
+        expenses, baskets = line_items.split_products(rows)
+        expense_ids = db.execute(_insert_expenses_returning_ids(), expenses).scalars().all()
+        product_ids = line_items.PRODUCT_CATALOG.resolve(db, line_items.product_names(baskets))
+        items = line_items.item_rows(expense_ids, baskets, product_ids)
+        if items:
+            db.execute(insert(models.ExpenseItem), items)
+        _finish_write(db)
+    return refused
+
+def _without(rows, indexes):
+    skipped = set(indexes)
+    return [row for i, row in enumerate(rows) if i not in skipped]
+
+def spending_limit_exceeded(db: Session, cnic: str, amount: float):
+    """Whether `amount` would take the citizen past User.spending_limit (one indexed query)."""
+    return aggregates.exceeds_limit(db.execute(aggregates.spending_limit_query(cnic)).one_or_none(), amount)
+
+def spending_rollups(db: Session, dimension: str, **filters):
+    return [aggregates.with_fraud_rate(row) for row in db.execute(aggregates.rollup_query(dimension, **filters)).mappings()]
+
+def item_totals(db: Session, dimension: str, **filters):
+    """Per-item line totals for each scheme, vendor or citizen, from expense_items."""
+    query = line_items.item_totals_query(aggregates.DIMENSIONS[dimension], **filters)
+    return db.execute(query).mappings().all()
+
+# --- Expense Listing ---
+# Rows come back with "products" attached from expense_items (one IN query per page or chunk)
+EXPENSE_COLUMNS = [
+    "id", "expense_id", "cnic", "scheme_id", "vendor_cnic",
+    "total_amount", "products", "is_fraudulent", "reason", "created_at"
+]
+
+def _expense_query(filters: dict):
+    E = models.Expense
+    query = select(*[getattr(E, name) for name in EXPENSE_COLUMNS if name != "products"])
+    for name in ("cnic", "scheme_id", "vendor_cnic", "is_fraudulent"):
+        if filters.get(name) is not None:
+            query = query.where(getattr(E, name) == filters[name])
+    if filters.get("item") is not None:
+        I = models.ExpenseItem
+        query = query.where(exists().where(I.expense_id == E.id, I.product_id == line_items.product_id_of(filters["item"])))
+    if filters.get("created_from") is not None:
+        query = query.where(E.created_at >= filters["created_from"])
+    if filters.get("created_to") is not None:
+        query = query.where(E.created_at < filters["created_to"])
+    return query.order_by(E.id)
+
+def list_expenses(db: Session, filters: dict, cursor: int = None, limit: int = 100):
+    """
+    One keyset page of expenses ordered by id. Returns (rows, next_cursor);
+    next_cursor is None on the last page.
+    """
+    query = _expense_query(filters)
+    if cursor is not None:
+        query = query.where(models.Expense.id > cursor)
+    rows = db.execute(query.limit(limit + 1)).mappings().all()
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return _with_products(db, rows[:limit]), next_cursor
+
+def _with_products(db: Session, rows):
+    if not rows:
+        return []
+    items = line_items.group_items(db.execute(line_items.items_query([row["id"] for row in rows])))
+    return line_items.with_products(rows, items)
+
+def iter_expenses(db: Session, filters: dict, chunk_size: int = 1000):
+    """Streams matching expenses from a server-side cursor, chunk_size rows at a time."""
+    result = db.execute(
+        _expense_query(filters).execution_options(stream_results=True, yield_per=chunk_size)
+    ).mappings()
+    for partition in result.partitions():
+        yield _with_products(db, partition)
+
+
+# --- Async Variants ---
+# CPU-bound scoring runs on a dedicated executor so the event loop only waits on I/O
+INFERENCE_EXECUTOR = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+async def run_inference(fn, *args):
+    loop = asyncio.get_running_loop()
+    # Runs in a copy of the caller's context so metrics spans keep the request's endpoint label
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(INFERENCE_EXECUTOR, functools.partial(ctx.run, fn, *args))
+
+async def async_current_models():
+    """current_models() off the event loop: the first call (or a hot reload) reads artifacts."""
+    return await run_inference(current_models)
+
+async def async_check_scheme_eligibility(db: AsyncSession, cnic: str, scheme_id: str, model_set=None):
+    model_set = model_set or await async_current_models()
+    await SCHEME_CATALOG.ensure_fresh(db)
+    schemes = SCHEME_CATALOG.current()
+    key = (cnic, scheme_id, model_set.version, schemes.generation)
+    cached = ELIGIBILITY_RESULTS.get(key)
+    if cached is not None:
+        return cached[0], list(cached[1])
+    return await run_inference(score_scheme_eligibility, cnic, schemes.get(scheme_id), key, model_set)
+
+async def async_check_scheme_eligibility_batch(db: AsyncSession, items, model_set=None):
+    model_set = model_set or await async_current_models()
+    await SCHEME_CATALOG.ensure_fresh(db)
+    schemes = SCHEME_CATALOG.current()
+    keys, results, misses = _cached_batch_results(items, model_set, schemes)
+    if misses:
+        await run_inference(_score_batch_misses, items, schemes, keys, results, misses, model_set)
+    return results
+
+async def async_match_schemes(db: AsyncSession, cnics, scheme_ids=None, only_eligible=False, model_set=None,
+                              schemes=None):
+    """match_schemes off the event loop; pass `schemes` to score against a snapshot the caller already checked."""
+    if schemes is None:
+        await SCHEME_CATALOG.ensure_fresh(db)
+        schemes = SCHEME_CATALOG.current()
+    return await run_inference(match_schemes, cnics, scheme_ids, only_eligible, schemes, model_set)
+
+async def async_calculate_trust_score(cnic: str, phone_number: str, engine: str = None, model_set=None):
+    if not TRUST_BATCHING:
+        return await run_inference(calculate_trust_score, cnic, phone_number, engine, model_set)
+    engine = _trust_engine(engine)
+    if phone_number.endswith("0000"):
+        return calculate_trust_score(cnic, phone_number, engine, model_set)  # fails before any model call
+    model_set = model_set or await async_current_models()
+    cached = TRUST_RESULTS.get(_trust_key(cnic, engine, model_set))
+    if cached is not None:
+        return cached[0], True, list(cached[1])
+    trust_score, reasons = await TRUST_BATCHER((cnic, engine, model_set))
+    return trust_score, True, list(reasons)
+
+def _score_trust_misses(cnics, engine, model_set):
+    """(trust_score, reasons) for verified CNICs from one batched prediction; fills the result cache."""
+    results = []
+    for cnic, (trust_score, _, reasons) in zip(cnics, score_trust_batch(cnics, None, engine, model_set=model_set)):
+        TRUST_RESULTS.set(_trust_key(cnic, engine, model_set), (trust_score, tuple(reasons)))
+        results.append((trust_score, tuple(reasons)))
+    return results
+
+async def _score_trust_keys(keys):
+    # keys are (cnic, engine, model_set); one prediction per engine and model set in the batch
+    groups = {}
+    for i, (cnic, engine, model_set) in enumerate(keys):
+        groups.setdefault((engine, model_set), []).append(i)
+    results = [None] * len(keys)
+    for (engine, model_set), positions in groups.items():
+        scored = await run_inference(_score_trust_misses, [keys[i][0] for i in positions], engine, model_set)
+        for i, result in zip(positions, scored):
+            results[i] = result
+    return results
+
+# Coalesces concurrent async trust scoring into batched predictions (EXPENSEAI_TRUST_BATCHING)
+TRUST_BATCHER = MicroBatcher(_score_trust_keys, max_batch=TRUST_BATCH_MAX_SIZE, window_ms=TRUST_BATCH_WINDOW_MS)
+
+@asynccontextmanager
+async def async_unit_of_work(db: AsyncSession):
+    db.info["unit_of_work"] = True
+    try:
+        yield db
+        with span("db_commit"):
+            await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+    finally:
+        db.info.pop("unit_of_work", None)
+
+async def _async_finish_write(db: AsyncSession):
+    if db.info.get("unit_of_work"):
+        await db.flush()
+    else:
+        with span("db_commit"):
+            await db.commit()
+
+async def async_create_application(db: AsyncSession, cnic: str, scheme_id: str, eligible: bool):
+    app = models.Application(cnic=cnic, scheme_id=scheme_id, eligible=eligible)
+    db.add(app)
+    await _async_finish_write(db)
+    return app
+
+async def async_create_applications_bulk(db: AsyncSession, rows):
+    if rows:
+        await db.execute(insert(models.Application), rows)
+        await _async_finish_write(db)
+    return len(rows)
+
+async def _async_product_ids(db: AsyncSession, baskets):
+    names = line_items.product_names(baskets)
+    ids = line_items.PRODUCT_CATALOG.known(names)
+    if ids is None:  # new product names: insert them in this transaction
+        ids = await db.run_sync(line_items.PRODUCT_CATALOG.resolve, names)
+    return ids
+
+async def async_create_expense_record(db: AsyncSession, expense_data: dict):
+    expense_data = _with_created_at(expense_data)
+    citizen, rollups = aggregates.limited_rollup_rows(expense_data)
+    if not await db.run_sync(aggregates.add_within_limit, citizen):
+        raise aggregates.SpendingLimitExceeded(expense_data["cnic"])
+    (row,), (products,) = line_items.split_products([expense_data])
+    expense = models.Expense(**row)
     db.add(expense)
-    db.commit()
-    db.refresh(expense)
-    return expense
\ No newline at end of file
+    await db.flush()
+    if products:
+        ids = await _async_product_ids(db, [products])
+        await db.execute(insert(models.ExpenseItem), line_items.item_rows([expense.id], [products], ids))
+    await db.run_sync(aggregates.add, rollups)
+    await _async_finish_write(db)
+    return expense
+
+async def async_create_expenses_bulk(db: AsyncSession, rows):
+    refused = []
+    if rows:
+        refused = await db.run_sync(aggregates.add_many_within_limit, rows)
+        rows = _without(rows, refused)
+    if rows:
+        expenses, baskets = line_items.split_products(rows)
+        expense_ids = (await db.execute(_insert_expenses_returning_ids(), expenses)).scalars().all()
+        items = line_items.item_rows(expense_ids, baskets, await _async_product_ids(db, baskets))
+        if items:
+            await db.execute(insert(models.ExpenseItem), items)
+        await _async_finish_write(db)
+    return refused
+
+async def async_spending_limit_exceeded(db: AsyncSession, cnic: str, amount: float):
+    row = (await db.execute(aggregates.spending_limit_query(cnic))).one_or_none()
+    return aggregates.exceeds_limit(row, amount)
+
+async def async_spending_rollups(db: AsyncSession, dimension: str, **filters):
+    rows = (await db.execute(aggregates.rollup_query(dimension, **filters))).mappings()
+    return [aggregates.with_fraud_rate(row) for row in rows]
+
+async def async_item_totals(db: AsyncSession, dimension: str, **filters):
+    query = line_items.item_totals_query(aggregates.DIMENSIONS[dimension], **filters)
+    return (await db.execute(query)).mappings().all()
+
+async def async_list_expenses(db: AsyncSession, filters: dict, cursor: int = None, limit: int = 100):
+    query = _expense_query(filters)
+    if cursor is not None:
+        query = query.where(models.Expense.id > cursor)
+    rows = (await db.execute(query.limit(limit + 1))).mappings().all()
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return await _async_with_products(db, rows[:limit]), next_cursor
+
+async def _async_with_products(db: AsyncSession, rows):
+    if not rows:
+        return []
+    items = line_items.group_items(await db.execute(line_items.items_query([row["id"] for row in rows])))
+    return line_items.with_products(rows, items)
+
+async def async_iter_expenses(db: AsyncSession, filters: dict, chunk_size: int = 1000):
+    result = await db.stream(_expense_query(filters).execution_options(yield_per=chunk_size))
+    async for partition in result.mappings().partitions():
+        yield await _async_with_products(db, partition)
@@ -1,18 +1,215 @@
 # database.py
-from sqlalchemy import create_engine
+import contextvars
+import time
+from sqlalchemy import create_engine, event, exists, insert, inspect, make_url, select, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from .models import Base
+from sqlalchemy.schema import CreateColumn
+from . import config, line_items
+from .metrics import DB_COMMITS, DB_STATEMENTS, current_endpoint, observe_stage
+from .models import Base, Scheme, User
 
-SQLITE_FILE = "expenseai.db"
-engine = create_engine(f"sqlite:///{SQLITE_FILE}", connect_args={"check_same_thread": False})
+
+def _is_memory_sqlite(url: str):
+    # Same test SQLAlchemy uses to pick SingletonThreadPool / StaticPool over QueuePool
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+def _engine_options(url: str):
+    options = {
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+        "echo": config.DB_ECHO,
+    }
+    if not _is_memory_sqlite(url):
+        # In-memory SQLite keeps one connection per thread (or one overall), not a sized pool
+        options.update(pool_size=config.DB_POOL_SIZE, max_overflow=config.DB_MAX_OVERFLOW)
+    if url.startswith("sqlite"):
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # journal_mode=WAL lets readers run alongside the single writer and
+    # synchronous=NORMAL drops the per-commit fsync of the WAL (still crash-safe).
+    # busy_timeout makes writers wait for the lock instead of "database is locked".
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={config.SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={config.SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={config.SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA mmap_size={config.SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA cache_size=-{config.SQLITE_CACHE_SIZE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
+
+
+# --- Per-request statement / commit counters ---
+_db_stats = contextvars.ContextVar("db_stats", default=None)
+
+def start_db_stats():
+    """Starts counting statements and commits for the current request (context)."""
+    stats = {"statements": 0, "commits": 0}
+    _db_stats.set(stats)
+    return stats
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    stats = _db_stats.get()
+    if stats is not None:
+        stats["statements"] += 1
+
+def _start_timer(conn, cursor, statement, parameters, context, executemany):
+    DB_STATEMENTS.inc(current_endpoint())
+    if context is not None:
+        context.query_started = time.perf_counter()
+
+def _observe_query(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "query_started", None)
+    if started is not None:
+        observe_stage("db_query", time.perf_counter() - started)
+
+def _count_commit(conn):
+    stats = _db_stats.get()
+    if stats is not None:
+        stats["commits"] += 1
+    if config.METRICS_ENABLED:
+        DB_COMMITS.inc(current_endpoint())
+
+
+def _instrument(sync_engine, url: str):
+    if url.startswith("sqlite") and config.SQLITE_TUNING:
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+    event.listen(sync_engine, "before_cursor_execute", _count_statement)
+    event.listen(sync_engine, "commit", _count_commit)
+    if config.METRICS_ENABLED:
+        # Per-statement timing for expenseai_stage_seconds{stage="db_query"}
+        event.listen(sync_engine, "before_cursor_execute", _start_timer)
+        event.listen(sync_engine, "after_cursor_execute", _observe_query)
+
+
+def build_engine(url: str = config.DATABASE_URL):
+    engine = create_engine(url, **_engine_options(url))
+    _instrument(engine, url)
+    return engine
+
+
+def build_async_engine(url: str = config.ASYNC_DATABASE_URL):
+    engine = create_async_engine(url, **_engine_options(url))
+    _instrument(engine.sync_engine, url)
+    return engine
+
+
+engine = build_engine()
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-# Create tables
-Base.metadata.create_all(bind=engine)
+# Async engine for the async routes (aiosqlite by default, any async driver via config)
+async_engine = build_async_engine()
+# expire_on_commit=False: expired attributes would need an implicit (blocking) reload
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+
+# --- Explicit schema setup and seeding (no longer an import side effect) ---
+DEFAULT_SCHEMES = [
+    {"scheme_id": "rashan_scheme", "name": "Rashan Scheme", "description": "Food support", "max_income": 50000, "min_family_size": 3},
+    {"scheme_id": "scholarship_scheme", "name": "Scholarship", "description": "Education aid", "max_income": 70000, "min_family_size": 0},
+]
+DEFAULT_VENDOR = {"cnic": "9999999999999", "name": "Default Rashan Vendor", "role": "vendor", "is_active": True}
+
+def _insert_ignoring_duplicates(conn, table, rows):
+    """INSERT that skips rows whose unique key already exists (another worker may seed concurrently)."""
+    if conn.dialect.name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif conn.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        conn.execute(insert(table), rows)
+        return
+    conn.execute(dialect_insert(table).on_conflict_do_nothing(), rows)
+
+def seed_defaults(conn):
+    """
+    Seeds the demo schemes when there are none and the default vendor when
+    there are no vendors. One SELECT when already seeded; safe to run from
+    several workers at once.
+    """
+    has_schemes, has_vendor = conn.execute(select(
+        exists().where(Scheme.id.is_not(None)),
+        exists().where(User.role == "vendor"),
+    )).one()
+    if not has_schemes:
+        _insert_ignoring_duplicates(conn, Scheme.__table__, DEFAULT_SCHEMES)
+    if not has_vendor:
+        _insert_ignoring_duplicates(conn, User.__table__, [DEFAULT_VENDOR])
+
+def add_missing_columns(conn):
+    """
+    Adds model columns missing from tables that already existed (e.g. the
+    vendor scheme_id / region on users); create_all() never alters a table.
+    Only nullable columns can be added this way. Skips existing ones.
+    """
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    quote = conn.dialect.identifier_preparer.quote
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            if not column.nullable:
+                raise RuntimeError(f"Cannot add NOT NULL column {table.name}.{column.name} to an existing table")
+            ddl = CreateColumn(column).compile(dialect=conn.dialect)
+            conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {ddl}"))
+
+def create_missing_indexes(conn):
+    """
+    Creates model indexes missing from tables that already existed;
+    create_all() only indexes the tables it creates. Skips existing ones.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+def _create_and_seed(conn):
+    Base.metadata.create_all(conn)
+    add_missing_columns(conn)
+    create_missing_indexes(conn)
+    line_items.migrate_legacy_products(conn)
+    seed_defaults(conn)
+
+_initialized = False
+
+def init_db():
+    """Creates missing tables, migrates old schemas and seeds defaults (python -m src.database)."""
+    global _initialized
+    with engine.begin() as conn:
+        _create_and_seed(conn)
+    _initialized = True
+
+async def async_init_db():
+    """init_db through the async engine; a no-op once it has run in this process."""
+    global _initialized
+    if _initialized:
+        return
+    async with async_engine.begin() as conn:
+        await conn.run_sync(_create_and_seed)
+    _initialized = True
+
 
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+if __name__ == "__main__":
+    # python -m src.database  ->  create tables and seed defaults without starting the API
+    init_db()
+    print(f"Initialized database at {config.DATABASE_URL}")
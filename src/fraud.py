@@ -0,0 +1,316 @@
+# src/fraud.py
+"""
+Streaming rule-based fraud scoring for expenses.
+
+The engine keeps incremental sliding-window aggregates (count, amount sum,
+basket fingerprints) in memory per cnic, vendor_cnic and scheme_id, and
+evaluates a declarative rule set against them in O(1) per expense (amortized
+window expiry). It is rehydrated from the `expenses` table on startup.
+
+Windows are kept in timestamp order. A backdated expense (bulk uploads carry
+their own created_at) is scored against its key's window as it was at that
+time, and skips the windows it is already older than.
+
+Rules are plain dicts:
+    {"name": ..., "type": ..., "key": "cnic" | "vendor_cnic" | "scheme_id",
+     "window_seconds": ..., "threshold": ..., "reason": ...}
+plus "skip_bulk": True for rules that do not apply to bulk POS uploads.
+Rule types live in RULE_TYPES; register_rule_type adds new ones.
+"""
+import datetime
+import hashlib
+import json
+import threading
+import time
+from collections import Counter, deque
+from itertools import groupby
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import FRAUD_RULES_FILE
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+DEFAULT_RULES = [
+    {"name": "amount_cap", "type": "amount", "threshold": 5000,
+     "reason": "Excessive amount"},
+    {"name": "cnic_velocity", "type": "count", "key": "cnic", "window_seconds": DAY, "threshold": 3,
+     "reason": "Too many expenses for this CNIC in 24h"},
+    # Volume spikes are about live disbursement; an upload is a vendor's batch of past sales
+    {"name": "vendor_spike", "type": "sum", "key": "vendor_cnic", "window_seconds": HOUR, "threshold": 500000,
+     "reason": "Vendor volume spike in the last hour", "skip_bulk": True},
+    {"name": "scheme_spike", "type": "count", "key": "scheme_id", "window_seconds": 60, "threshold": 1000,
+     "reason": "Scheme disbursement spike in the last minute", "skip_bulk": True},
+    {"name": "duplicate_basket", "type": "duplicate", "key": "cnic", "window_seconds": DAY,
+     "reason": "Duplicate basket for this CNIC within 24h"},
+]
+# User.spending_limit is enforced from the spending rollups (src/aggregates.py)
+# when an expense is written. A "limit" rule can still flag over-limit
+# spending inside its own window, e.g. with a custom rule file.
+
+
+def basket_fingerprint(products):
+    """Order-independent fingerprint of a basket (list of item/qty/price dicts)."""
+    # Normalized so a basket read back from expense_items (price 1500.0) matches the one checked (1500)
+    canonical = sorted(
+        json.dumps([p.get("item"), p.get("qty"), float(p.get("price") or 0)]) for p in products or ()
+    )
+    return hashlib.blake2b("|".join(canonical).encode(), digest_size=8).digest()
+
+
+def _timestamp(value):
+    if value is None:
+        return time.time()
+    if isinstance(value, datetime.datetime):
+        # Stored timestamps are naive UTC (datetime.utcnow)
+        return value.replace(tzinfo=datetime.timezone.utc).timestamp()
+    return float(value)
+
+
+class SlidingWindow:
+    """Expenses for one key within the last `span` seconds, with running aggregates."""
+    __slots__ = ("span", "events", "total", "baskets")
+
+    def __init__(self, span):
+        self.span = span
+        self.events = deque()  # (ts, amount, basket)
+        self.total = 0.0
+        self.baskets = Counter()
+
+    def expire(self, now):
+        cutoff = now - self.span
+        events = self.events
+        while events and events[0][0] <= cutoff:
+            _, amount, basket = events.popleft()
+            self.total -= amount
+            self.baskets[basket] -= 1
+            if not self.baskets[basket]:
+                del self.baskets[basket]
+
+    def add(self, ts, amount, basket):
+        events = self.events
+        if events and ts < events[-1][0]:
+            # Backdated: insert in place so expire() still pops the oldest first
+            i = len(events) - 1
+            while i and events[i - 1][0] > ts:
+                i -= 1
+            events.insert(i, (ts, amount, basket))
+        else:
+            events.append((ts, amount, basket))
+        self.total += amount
+        self.baskets[basket] += 1
+
+    def discard(self, ts, amount, basket):
+        """Removes one event added earlier (no-op once it has expired)."""
+        try:
+            self.events.remove((ts, amount, basket))
+        except ValueError:
+            return
+        self.total -= amount
+        self.baskets[basket] -= 1
+        if not self.baskets[basket]:
+            del self.baskets[basket]
+
+    def as_of(self, ts):
+        """A copy holding only the events in (ts - span, ts], for scoring a backdated expense."""
+        window = SlidingWindow(self.span)
+        cutoff = ts - self.span
+        for event in self.events:
+            if event[0] > ts:
+                break
+            if event[0] > cutoff:
+                window.add(*event)
+        return window
+
+
+# --- Rule types: fn(rule, window, expense, engine) -> True when the rule fires ---
+# `window` already holds the aggregates *before* this expense.
+RULE_TYPES = {
+    "amount": lambda rule, window, e, engine: e["total_amount"] > rule["threshold"],
+    "count": lambda rule, window, e, engine: len(window.events) + 1 > rule["threshold"],
+    "sum": lambda rule, window, e, engine: window.total + e["total_amount"] > rule["threshold"],
+    "duplicate": lambda rule, window, e, engine: window.baskets.get(e["_basket"], 0) > 0,
+    "limit": lambda rule, window, e, engine: (
+        e["cnic"] in engine.limits and window.total + e["total_amount"] > engine.limits[e["cnic"]]
+    ),
+}
+
+
+def register_rule_type(name, fn):
+    RULE_TYPES[name] = fn
+
+
+class FraudEngine:
+    SWEEP_EVERY = 10000  # records between sweeps that drop idle keys
+
+    def __init__(self, rules=None):
+        self.rules = list(rules or DEFAULT_RULES)
+        for rule in self.rules:
+            if rule["type"] not in RULE_TYPES:
+                raise ValueError(f"Unknown fraud rule type: {rule['type']}")
+        # One window per (key field, span), shared by rules that use the same pair
+        self._specs = sorted({(r["key"], r["window_seconds"]) for r in self.rules if r.get("key")})
+        # Bulk rows only go into the windows of rules that score them
+        self._bulk_specs = sorted({
+            (r["key"], r["window_seconds"]) for r in self.rules if r.get("key") and not r.get("skip_bulk")
+        })
+        self._windows = {spec: {} for spec in self._specs}
+        self._max_span = max([span for _, span in self._specs], default=0)
+        self.limits = {}  # cnic -> User.spending_limit
+        self._lock = threading.Lock()
+        self._since_sweep = 0
+        self.checked = 0
+        self.flagged = Counter()
+
+    def _window(self, key_field, span, value):
+        windows = self._windows[(key_field, span)]
+        window = windows.get(value)
+        if window is None:
+            window = windows[value] = SlidingWindow(span)
+        return window
+
+    def _add(self, windows, e, ts, now, bulk=False):
+        for key_field, span in self._bulk_specs if bulk else self._specs:
+            if ts > now - span:  # older events would expire straight away
+                window = windows[(key_field, span)].get(e[key_field])
+                if window is None:
+                    window = windows[(key_field, span)][e[key_field]] = SlidingWindow(span)
+                window.add(ts, e["total_amount"], e["_basket"])
+
+    def _record(self, e, ts, now, bulk=False):
+        self._add(self._windows, e, ts, now, bulk)
+        self._since_sweep += 1
+        if self._since_sweep >= self.SWEEP_EVERY:
+            self._sweep(now)
+
+    def _sweep(self, now):
+        for windows in self._windows.values():
+            for value in list(windows):
+                windows[value].expire(now)
+                if not windows[value].events:
+                    del windows[value]
+        self._since_sweep = 0
+
+    def _score(self, e, ts, now, bulk=False):
+        fired = []
+        for rule in self.rules:
+            if bulk and rule.get("skip_bulk"):
+                continue
+            window = None
+            if rule.get("key"):
+                if ts <= now - rule["window_seconds"]:
+                    continue  # older than the window: nothing left to compare it with
+                window = self._window(rule["key"], rule["window_seconds"], e[rule["key"]])
+                if window.events and ts < window.events[-1][0]:
+                    window = window.as_of(ts)  # backdated: later expenses do not count
+                else:
+                    window.expire(ts)
+            if RULE_TYPES[rule["type"]](rule, window, e, self):
+                fired.append(rule)
+        self.checked += 1
+        for rule in fired:
+            self.flagged[rule["name"]] += 1
+        reason = "; ".join(rule["reason"] for rule in fired) or None
+        return bool(fired), reason
+
+    def score(self, expense: dict):
+        """
+        Scores one expense without adding it to the windows; call record()
+        once it is stored. `expense` needs cnic, scheme_id, vendor_cnic,
+        total_amount and products. Returns (is_fraudulent, reason or None).
+        """
+        e = dict(expense, _basket=basket_fingerprint(expense.get("products")))
+        with self._lock:
+            return self._score(e, _timestamp(expense.get("created_at")), time.time())
+
+    def record(self, expense: dict):
+        """Adds a stored expense to the windows."""
+        e = dict(expense, _basket=basket_fingerprint(expense.get("products")))
+        with self._lock:
+            self._record(e, _timestamp(expense.get("created_at")), time.time())
+
+    def check(self, expense: dict, bulk=False):
+        """
+        score() and record() in one step, atomically. `bulk` marks a row of a
+        bulk upload, which skips the "skip_bulk" rules.
+        """
+        ts = _timestamp(expense.get("created_at"))
+        e = dict(expense, _basket=basket_fingerprint(expense.get("products")))
+        now = time.time()
+        with self._lock:
+            result = self._score(e, ts, now, bulk)
+            self._record(e, ts, now, bulk)
+        return result
+
+    def forget(self, expenses, bulk=False):
+        """
+        Takes checked expenses that were not stored back out of the windows.
+        They need the created_at they were checked with.
+        """
+        with self._lock:
+            for expense in expenses:
+                ts, basket = _timestamp(expense["created_at"]), basket_fingerprint(expense.get("products"))
+                for key_field, span in self._bulk_specs if bulk else self._specs:
+                    window = self._windows[(key_field, span)].get(expense[key_field])
+                    if window is not None:
+                        window.discard(ts, expense["total_amount"], basket)
+
+    def set_limit(self, cnic, limit):
+        with self._lock:
+            if limit is None:
+                self.limits.pop(cnic, None)
+            else:
+                self.limits[cnic] = limit
+
+    def rehydrate(self, db: Session, now=None):
+        """
+        Rebuilds the windows from recent `expenses` rows and reloads spending
+        limits. Rows of bulk uploads go back only into the windows they were
+        checked against. The new windows are built first and swapped in at once.
+        """
+        now = time.time() if now is None else now
+        since = datetime.datetime.fromtimestamp(now - self._max_span, datetime.timezone.utc).replace(tzinfo=None)
+        E, I, P = models.Expense, models.ExpenseItem, models.Product
+        # One row per line item (or per expense without items), grouped back into baskets below
+        rows = db.execute(
+            select(E.id, E.cnic, E.scheme_id, E.vendor_cnic, E.total_amount, E.created_at, E.is_bulk,
+                   P.name.label("item"), I.qty, I.price)
+            .outerjoin(I, I.expense_id == E.id).outerjoin(P, P.id == I.product_id)
+            .where(E.created_at >= since).order_by(E.created_at, E.id, I.position)
+            .execution_options(stream_results=True, yield_per=5000)
+        ).mappings()
+        windows = {spec: {} for spec in self._specs}
+        for _, lines in groupby(rows, key=lambda row: row["id"]):
+            lines = list(lines)
+            products = [{"item": r["item"], "qty": r["qty"], "price": r["price"]} for r in lines if r["item"] is not None]
+            e = dict(lines[0], _basket=basket_fingerprint(products))
+            self._add(windows, e, _timestamp(e["created_at"]), now, bool(e["is_bulk"]))
+        limits = dict(db.execute(
+            select(models.User.cnic, models.User.spending_limit).where(models.User.spending_limit.is_not(None))
+        ).all())
+        with self._lock:
+            self._windows = windows
+            self._since_sweep = 0
+            self.limits = limits
+
+    def stats(self):
+        return {
+            "rules": [rule["name"] for rule in self.rules],
+            "checked": self.checked,
+            "flagged": dict(self.flagged),
+            "tracked_keys": {f"{key}/{int(span)}s": len(w) for (key, span), w in self._windows.items()},
+        }
+
+
+def load_rules(path=FRAUD_RULES_FILE):
+    """Rule set from a JSON file (a list of rule dicts), or the defaults."""
+    if not path:
+        return DEFAULT_RULES
+    with open(path) as f:
+        return json.load(f)
+
+
+FRAUD_ENGINE = FraudEngine(load_rules())
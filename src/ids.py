@@ -0,0 +1,92 @@
+# src/ids.py
+"""
+Collision-free expense ids without existence checks.
+
+An id packs the millisecond clock, EXPENSEAI_ID_NODE (one value per host),
+the process id and a per-millisecond sequence, so no two processes on
+distinct nodes can produce the same value, and one process never repeats
+itself. The result is Crockford base32 behind the "EXP" prefix; ids from one
+process sort by creation time. After 4096 ids in one millisecond the
+generator sleeps into the next; when the wall clock has stepped back by more
+than MAX_WAIT_MS it raises instead of holding the lock until it catches up.
+
+    | 42 bits ms since 2024-01-01 | 8 bits node | 22 bits pid | 12 bits sequence |
+"""
+import os
+import threading
+import time
+
+from .config import ID_NODE
+
+EPOCH_MS = 1704067200000  # 2024-01-01T00:00:00Z
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+SEQUENCE_BITS = 12
+PID_BITS = 22
+NODE_BITS = 8
+WIDTH = 17  # base32 digits for 84 bits
+MAX_WAIT_MS = 10  # longest sleep for the clock after a sequence overflow
+
+
+class ExpenseIdGenerator:
+    def __init__(self, node=ID_NODE, clock=time.time):
+        if not 0 <= node < 1 << NODE_BITS:
+            raise ValueError(f"EXPENSEAI_ID_NODE must be between 0 and {(1 << NODE_BITS) - 1}")
+        self.node = node
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._pid = None
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _now_ms(self):
+        return int(self._clock() * 1000) - EPOCH_MS
+
+    def _wait_past(self, last_ms):
+        # 4096 ids this millisecond: sleep into the next one. After the clock stepped
+        # back that could take as long as the step, with the lock held, so give up instead.
+        behind = last_ms + 1 - self._now_ms()
+        if behind > MAX_WAIT_MS:
+            raise RuntimeError(f"Clock is {behind} ms behind the last expense id; not waiting for it to catch up")
+        while behind > 0:
+            time.sleep(behind / 1000)
+            behind = last_ms + 1 - self._now_ms()
+        return last_ms + 1 - behind
+
+    def _next(self):
+        pid = os.getpid()
+        if pid != self._pid:
+            # Forked worker: same object, new process
+            self._pid, self._last_ms, self._sequence = pid, -1, 0
+        now = max(self._now_ms(), self._last_ms)  # never step back with the wall clock
+        sequence = 0
+        if now == self._last_ms:
+            sequence = (self._sequence + 1) & ((1 << SEQUENCE_BITS) - 1)
+            if sequence == 0:
+                now = self._wait_past(self._last_ms)  # raises before any state changes
+        self._last_ms, self._sequence = now, sequence
+        value = now
+        value = (value << NODE_BITS) | self.node
+        value = (value << PID_BITS) | (pid & ((1 << PID_BITS) - 1))
+        return (value << SEQUENCE_BITS) | sequence
+
+    def new(self):
+        with self._lock:
+            value = self._next()
+        return "EXP" + _base32(value)
+
+    def many(self, n):
+        """n ids under one lock acquisition (bulk ingestion)."""
+        with self._lock:
+            values = [self._next() for _ in range(n)]
+        return ["EXP" + _base32(value) for value in values]
+
+
+def _base32(value):
+    digits = []
+    for _ in range(WIDTH):
+        value, digit = divmod(value, 32)
+        digits.append(ALPHABET[digit])
+    return "".join(reversed(digits))
+
+
+EXPENSE_IDS = ExpenseIdGenerator()
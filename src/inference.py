@@ -0,0 +1,329 @@
+# src/inference.py
+"""
+Lightweight inference kernels for the trained models.
+
+The fitted parameters are read once when a model is loaded. Single rows are
+scored from preallocated, per-thread NumPy buffers with a fixed column order,
+so the request hot path never builds a pandas DataFrame or goes through
+sklearn's input validation.
+"""
+import threading
+import numpy as np
+
+ELIGIBILITY_FEATURES = ["income", "family_size", "utility_bills_paid"]
+TRUST_FEATURES = ELIGIBILITY_FEATURES + [
+    "loan_defaults", "credit_history_years", "suspicious_transactions"
+]
+
+
+# Per-thread buffers cannot be pickled (process pools, spawn/forkserver):
+# kernels drop them when pickled and start with empty ones in the new process
+def _without_local(self):
+    state = dict(self.__dict__)
+    del state["_local"]
+    return state
+
+def _with_new_local(self, state):
+    self.__dict__.update(state)
+    self._local = threading.local()
+
+
+def profile_matrix(profiles, features, dtype=np.float64):
+    """Stacks profile dicts into an (n_rows, n_features) array in column order."""
+    X = np.empty((len(profiles), len(features)), dtype=dtype)
+    for j, name in enumerate(features):
+        X[:, j] = [p[name] for p in profiles]
+    return X
+
+
+class _Kernel:
+    """Base class: owns the column order and the per-thread row buffer."""
+    dtype = np.float64
+
+    def __init__(self, model, features):
+        self.model = model
+        self.features = list(getattr(model, "feature_names_in_", features))
+        self._local = threading.local()
+
+    __getstate__ = _without_local
+    __setstate__ = _with_new_local
+
+    def _row(self, profile):
+        # Buffers are per thread because uvicorn runs sync routes in a threadpool
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = np.empty((1, len(self.features)), dtype=self.dtype)
+        row = buf[0]
+        for i, name in enumerate(self.features):
+            row[i] = profile[name]
+        return buf
+
+    def matrix(self, profiles):
+        return profile_matrix(profiles, self.features, self.dtype)
+
+
+class LinearClassifierKernel(_Kernel):
+    """
+    Binary linear classifier (LogisticRegression) evaluated as a dot product
+    plus sigmoid over the extracted coefficients.
+    """
+
+    def __init__(self, model, features=ELIGIBILITY_FEATURES):
+        super().__init__(model, features)
+        if len(model.classes_) != 2:
+            raise ValueError("LinearClassifierKernel only supports binary classifiers")
+        self.coef = np.ascontiguousarray(model.coef_[0], dtype=np.float64)
+        self.intercept = float(model.intercept_[0])
+        self.classes = model.classes_
+
+    def decision_one(self, profile):
+        return float(self._row(profile)[0] @ self.coef) + self.intercept
+
+    def proba_one(self, profile):
+        return 1.0 / (1.0 + np.exp(-self.decision_one(profile)))
+
+    def predict_one(self, profile):
+        # sigmoid(z) > 0.5 <=> z > 0, which is exactly sklearn's decision rule
+        return self.classes[1] if self.decision_one(profile) > 0 else self.classes[0]
+
+    def predict(self, X):
+        scores = X @ self.coef + self.intercept
+        return self.classes[(scores > 0).astype(int)]
+
+
+class TreeEnsembleKernel(_Kernel):
+    """
+    Averaging tree ensemble (RandomForestRegressor) evaluated directly on the
+    fitted low-level trees, in the same order and precision sklearn uses.
+    """
+    dtype = np.float32
+
+    def __init__(self, model, features=TRUST_FEATURES):
+        super().__init__(model, features)
+        self.trees = [est.tree_ for est in model.estimators_]
+
+    def predict_one(self, profile):
+        buf = self._row(profile)
+        total = 0.0
+        for tree in self.trees:
+            total += tree.predict(buf)[0, 0]
+        return total / len(self.trees)
+
+    def predict(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        total = np.zeros(X.shape[0], dtype=np.float64)
+        for tree in self.trees:
+            total += tree.predict(X)[:, 0]
+        return total / len(self.trees)
+
+
+class EstimatorKernel(_Kernel):
+    """Fallback for estimators without a dedicated kernel: defers to model.predict."""
+
+    def predict_one(self, profile):
+        return self.predict(self._row(profile))[0]
+
+    def predict(self, X):
+        import pandas as pd
+        return self.model.predict(pd.DataFrame(X, columns=self.features))
+
+
+def compile_model(model, features):
+    """Returns the fastest kernel able to reproduce model.predict exactly."""
+    if model is None:
+        return None
+    if hasattr(model, "coef_") and hasattr(model, "classes_") and len(model.classes_) == 2:
+        return LinearClassifierKernel(model, features)
+    if hasattr(model, "estimators_") and all(hasattr(est, "tree_") for est in model.estimators_):
+        if not hasattr(model, "classes_") and getattr(model, "n_outputs_", 1) == 1:
+            return TreeEnsembleKernel(model, features)
+    return EstimatorKernel(model, features)
+
+
+# --- Flattened Forest Engine ---
+# Accuracy budget for lossy variants (quantized leaf values or truncated depth):
+# the largest absolute deviation from the full forest, in trust-score points,
+# measured on a reference sample when the variant is built.
+FLAT_FOREST_ERROR_BUDGET = 0.5
+
+
+class FlatForest:
+    """
+    A tree ensemble exported into contiguous node arrays (feature, threshold,
+    left, right, value) with one root offset per tree. All trees are walked
+    together, one level per step, for single rows and batches alike.
+
+    Leaves point to themselves, so `max_depth` steps always settle on a leaf.
+    Thresholds are stored as float32 rounded towards -inf, which keeps
+    `x <= threshold` identical to sklearn for float32 inputs.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth, features, meta=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.features = list(features)
+        self.meta = dict(meta or {})
+        # Traversal views: interleaved (left, right) pairs so one take() picks the child
+        self._children = np.stack([left, right], axis=1).ravel().astype(np.intp)
+        self._feature = feature.astype(np.intp)
+        self._roots = roots.astype(np.intp)
+        self._local = threading.local()
+
+    __getstate__ = _without_local
+    __setstate__ = _with_new_local
+
+    @property
+    def n_nodes(self):
+        return int(self.feature.shape[0])
+
+    def _walk(self, x_flat, offsets, nodes):
+        for _ in range(self.max_depth):
+            go_right = x_flat.take(offsets + self._feature.take(nodes)) > self.threshold.take(nodes)
+            nodes = self._children.take(2 * nodes + go_right)
+        # cumsum adds trees left to right, matching sklearn's accumulation order
+        return self.value.take(nodes).astype(np.float64).cumsum(axis=-1)[..., -1] / self._roots.shape[0]
+
+    def predict(self, X, chunk_size=512):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X[None, :]
+        out = np.empty(X.shape[0], dtype=np.float64)
+        # Chunking keeps the (rows x trees) node matrix cache-sized
+        for start in range(0, X.shape[0], chunk_size):
+            chunk = X[start:start + chunk_size]
+            offsets = (np.arange(chunk.shape[0], dtype=np.intp) * chunk.shape[1])[:, None]
+            nodes = np.broadcast_to(self._roots, (chunk.shape[0], self._roots.shape[0]))
+            out[start:start + chunk_size] = self._walk(chunk.ravel(), offsets, nodes)
+        return out
+
+    def predict_one(self, profile):
+        buf = getattr(self._local, "buf", None)
+        if buf is None:
+            buf = self._local.buf = np.empty(len(self.features), dtype=np.float32)
+        for i, name in enumerate(self.features):
+            buf[i] = profile[name]
+        return float(self._walk(buf, 0, self._roots))
+
+    def matrix(self, profiles):
+        return profile_matrix(profiles, self.features, np.float32)
+
+    def save(self, path):
+        np.savez(
+            path,
+            feature=self.feature, threshold=self.threshold, left=self.left, right=self.right,
+            value=self.value, roots=self.roots, max_depth=self.max_depth,
+            features=np.array(self.features), meta=np.array(repr(self.meta))
+        )
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Loads a saved forest; with mmap_mode the node arrays are memory-mapped."""
+        import ast
+        with np.load(path) as data:
+            arrays = _mmap_npz(path, mmap_mode) if mmap_mode else data
+            return cls(
+                arrays["feature"], arrays["threshold"], arrays["left"], arrays["right"], arrays["value"],
+                arrays["roots"], int(data["max_depth"]), data["features"].tolist(),
+                ast.literal_eval(str(data["meta"]))
+            )
+
+
+def _mmap_npz(path, mode):
+    """
+    Memory-maps the members of an uncompressed .npz (np.savez output).
+    np.load ignores mmap_mode for archives, but stored members are plain
+    .npy files at a fixed offset inside the zip.
+    """
+    import zipfile
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f"{path} is compressed and cannot be memory-mapped")
+            # Local file header: 30 fixed bytes, then the name and extra field
+            f.seek(info.header_offset + 26)
+            name_len, extra_len = np.frombuffer(f.read(4), dtype="<u2")
+            f.seek(info.header_offset + 30 + int(name_len) + int(extra_len))
+            major, _ = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if major == 1 else np.lib.format.read_array_header_2_0
+            shape, fortran, dtype = read_header(f)
+            if dtype.hasobject:
+                continue
+            arrays[info.filename.removesuffix(".npy")] = np.memmap(
+                path, dtype=dtype, mode=mode, offset=f.tell(), shape=shape, order="F" if fortran else "C"
+            )
+    return arrays
+
+
+def flatten_forest(model, features=TRUST_FEATURES, max_depth=None, quantize=False, reference_X=None):
+    """
+    Exports a fitted RandomForestRegressor into a FlatForest.
+
+    max_depth truncates every tree, turning nodes at that depth into leaves
+    that predict their training mean. quantize stores leaf values as float16.
+    Both are lossy: pass reference_X to measure the deviation from the full
+    forest, which must stay within FLAT_FOREST_ERROR_BUDGET.
+    """
+    features = list(getattr(model, "feature_names_in_", features))
+    parts = {"feature": [], "threshold": [], "left": [], "right": [], "value": []}
+    roots = []
+    offset = 0
+    depth_reached = 0
+
+    for est in model.estimators_:
+        tree = est.tree_
+        left, right = tree.children_left, tree.children_right
+        # Children always have larger ids than their parent in sklearn trees
+        depth = np.zeros(tree.node_count, dtype=np.int64)
+        for node in range(tree.node_count):
+            if left[node] >= 0:
+                depth[left[node]] = depth[node] + 1
+                depth[right[node]] = depth[node] + 1
+
+        keep = np.ones(tree.node_count, dtype=bool) if max_depth is None else depth <= max_depth
+        new_id = np.cumsum(keep) - 1 + offset
+        is_leaf = (left < 0) | (depth == max_depth if max_depth is not None else False)
+        kept = np.nonzero(keep)[0]
+        leaf = is_leaf[kept]
+        self_ids = new_id[kept]
+
+        threshold = tree.threshold[kept].astype(np.float32)
+        # Round down so float32 x <= threshold32 exactly when x <= threshold64
+        too_high = threshold.astype(np.float64) > tree.threshold[kept]
+        threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+
+        parts["feature"].append(np.where(leaf, 0, tree.feature[kept]).astype(np.int8))
+        parts["threshold"].append(np.where(leaf, np.float32(np.inf), threshold))
+        parts["left"].append(np.where(leaf, self_ids, new_id[np.where(leaf, 0, left[kept])]).astype(np.int32))
+        parts["right"].append(np.where(leaf, self_ids, new_id[np.where(leaf, 0, right[kept])]).astype(np.int32))
+        parts["value"].append(tree.value[kept, 0, 0])
+
+        roots.append(offset)
+        offset += len(kept)
+        depth_reached = max(depth_reached, int(depth[kept].max()))
+
+    value = np.concatenate(parts["value"]).astype(np.float16 if quantize else np.float64)
+    forest = FlatForest(
+        np.concatenate(parts["feature"]), np.concatenate(parts["threshold"]),
+        np.concatenate(parts["left"]), np.concatenate(parts["right"]), value,
+        np.array(roots, dtype=np.int32), depth_reached, features,
+        {"n_trees": len(roots), "max_depth": max_depth, "quantized": bool(quantize)}
+    )
+
+    if reference_X is not None:
+        reference_X = np.asarray(reference_X, dtype=np.float32)
+        error = np.abs(forest.predict(reference_X) - TreeEnsembleKernel(model, features).predict(reference_X))
+        forest.meta["max_abs_error"] = float(error.max())
+        forest.meta["mean_abs_error"] = float(error.mean())
+        lossy = quantize or max_depth is not None
+        if lossy and forest.meta["max_abs_error"] > FLAT_FOREST_ERROR_BUDGET:
+            raise ValueError(
+                f"Flattened forest deviates by {forest.meta['max_abs_error']:.3f} points, "
+                f"over the {FLAT_FOREST_ERROR_BUDGET} point budget"
+            )
+    return forest
@@ -0,0 +1,214 @@
+# src/ingest.py
+"""
+Bulk expense ingestion for vendor POS uploads (POST /expenses/bulk).
+
+Entries arrive as NDJSON or CSV lines, streamed in the request body or as an
+uploaded file, and are processed EXPENSEAI_BULK_CHUNK_SIZE at a time:
+  1. validate the chunk with one pydantic call; bad rows become row errors
+  2. check scheme and vendor against the in-memory catalog and vendor index
+  3. run the fraud engine (without the live volume-spike rules) and assign
+     ids from the expense id generator
+  4. add the rollups, refusing rows past their citizen's spending limit in
+     the same statements as /submit-proposal, then insert the rest with one
+     executemany and commit
+A chunk that fails to commit is reported row by row and the upload goes on.
+"""
+import csv
+import datetime
+import json
+from typing import List
+
+from pydantic import TypeAdapter, ValidationError
+
+from . import crud
+from .config import BULK_CHUNK_SIZE, BULK_MAX_ERRORS
+from .fraud import FRAUD_ENGINE
+from .ids import EXPENSE_IDS
+from .schemas import ExpenseIngestRecord
+from .schemes import SCHEME_CATALOG
+from .vendors import VENDOR_INDEX
+
+READ_BYTES = 1 << 16
+_RECORDS = TypeAdapter(List[ExpenseIngestRecord])
+
+
+# --- Reading ---
+async def read_upload(upload):
+    """Byte chunks of an UploadFile, without reading it into memory at once."""
+    while chunk := await upload.read(READ_BYTES):
+        yield chunk
+
+async def iter_lines(chunks):
+    """(line number, bytes) for every non-blank line of a byte stream."""
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+def _decode(line_no, line):
+    # A BOM can only start the first line
+    return line.decode("utf-8-sig" if line_no == 1 else "utf-8").rstrip("\r")
+
+def parse_ndjson(line_no, line):
+    entry = json.loads(_decode(line_no, line))
+    if not isinstance(entry, dict):
+        raise ValueError("expected a JSON object")
+    return entry
+
+class CsvParser:
+    """Parses lines after a header row; empty cells count as missing. Quoted cells cannot span lines."""
+
+    def __init__(self):
+        self.header = None
+
+    def __call__(self, line_no, line):
+        values = next(csv.reader([_decode(line_no, line)]))
+        if self.header is None:
+            self.header = [name.strip() for name in values]
+            return None
+        if len(values) != len(self.header):
+            raise ValueError(f"expected {len(self.header)} columns, got {len(values)}")
+        return {name: value for name, value in zip(self.header, values) if value != ""}
+
+
+# --- Report ---
+class IngestReport:
+    def __init__(self, max_errors=BULK_MAX_ERRORS):
+        self.max_errors = max_errors
+        self.received = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.fraud_flagged = 0
+        self.chunks = 0
+        self.errors = []
+        self.errors_truncated = False
+
+    def error(self, line, message):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": message})
+        else:
+            self.errors_truncated = True
+
+    def as_dict(self):
+        return {
+            "received": self.received, "inserted": self.inserted, "rejected": self.rejected,
+            "fraud_flagged": self.fraud_flagged, "chunks": self.chunks,
+            "errors": self.errors, "errors_truncated": self.errors_truncated,
+        }
+
+
+# --- Chunk processing ---
+def validate_chunk(entries):
+    """
+    Validates (line, dict) entries. Returns ([(line, record)], [(line, message)]).
+    One pydantic call for the chunk, and a second one for the good rows if any failed.
+    """
+    try:
+        return list(zip([line for line, _ in entries], _RECORDS.validate_python([e for _, e in entries]))), []
+    except ValidationError as exc:
+        bad = {}
+        for err in exc.errors():
+            # Skips union branch tags such as "json[list[ProductItem]]"
+            field = ".".join(str(part) for part in err["loc"][1:] if "[" not in str(part)) or "entry"
+            bad.setdefault(err["loc"][0], f"{field}: {err['msg']}")
+    good = [entry for i, entry in enumerate(entries) if i not in bad]
+    records = _RECORDS.validate_python([e for _, e in good])
+    return list(zip([line for line, _ in good], records)), [(entries[i][0], message) for i, message in sorted(bad.items())]
+
+def _naive_utc(value):
+    if value is None:
+        return datetime.datetime.utcnow()
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+def check_chunk(entries):
+    """
+    CPU part before the fraud checks: validation, scheme and vendor.
+    Returns ([(line, row)], [(line, message)]).
+    """
+    records, errors = validate_chunk(entries)
+    candidates = []
+    schemes = SCHEME_CATALOG.current()
+    for line, record in records:
+        if schemes.get(record.scheme_id) is None:
+            errors.append((line, f"Scheme not found: {record.scheme_id}"))
+            continue
+        if not VENDOR_INDEX.is_vendor(record.vendor_cnic):
+            errors.append((line, f"Unknown vendor: {record.vendor_cnic}"))
+            continue
+        row = {
+            "cnic": record.cnic,
+            "scheme_id": record.scheme_id,
+            "vendor_cnic": record.vendor_cnic,
+            "total_amount": record.total_amount,
+            "products": [product.model_dump() for product in record.products],
+            "created_at": _naive_utc(record.created_at),
+            "is_bulk": True,
+        }
+        candidates.append((line, row))
+    return candidates, errors
+
+def finish_chunk(candidates):
+    """Fraud checks and expense ids for checked rows. Returns (rows, lines)."""
+    lines, rows = [line for line, _ in candidates], [row for _, row in candidates]
+    for row in rows:
+        row["is_fraudulent"], row["reason"] = FRAUD_ENGINE.check(row, bulk=True)
+    for row, expense_id in zip(rows, EXPENSE_IDS.many(len(rows))):
+        row["expense_id"] = expense_id
+    return rows, lines
+
+async def _ingest_chunk(db, entries, report):
+    report.chunks += 1
+    candidates, errors = await crud.run_inference(check_chunk, entries)
+    rows, lines = await crud.run_inference(finish_chunk, candidates)
+    try:
+        async with crud.async_unit_of_work(db):
+            refused = await crud.async_create_expenses_bulk(db, rows)
+    except Exception as e:
+        FRAUD_ENGINE.forget(rows, bulk=True)
+        for line in lines:
+            report.error(line, f"Chunk not saved: {type(e).__name__}: {e}")
+    else:
+        FRAUD_ENGINE.forget([rows[i] for i in refused], bulk=True)
+        errors += [(lines[i], "Spending limit exceeded") for i in refused]
+        skipped = set(refused)
+        saved = [row for i, row in enumerate(rows) if i not in skipped]
+        report.inserted += len(saved)
+        report.fraud_flagged += sum(row["is_fraudulent"] for row in saved)
+    for line, message in sorted(errors):
+        report.error(line, message)
+
+
+async def ingest(db, chunks, format="ndjson", chunk_size=BULK_CHUNK_SIZE):
+    """Ingests a stream of NDJSON or CSV bytes; returns the report as a dict."""
+    await SCHEME_CATALOG.ensure_fresh(db)
+    await VENDOR_INDEX.ensure_fresh(db)
+    parse = CsvParser() if format == "csv" else parse_ndjson
+    report = IngestReport()
+    entries = []
+    async for line_no, line in iter_lines(chunks):
+        try:
+            entry = parse(line_no, line)
+        except (ValueError, csv.Error) as e:  # ValueError covers JSON and UTF-8 decoding errors
+            report.received += 1
+            report.error(line_no, f"Unparseable line: {e}")
+            continue
+        if entry is None:  # CSV header
+            continue
+        report.received += 1
+        entries.append((line_no, entry))
+        if len(entries) >= chunk_size:
+            await _ingest_chunk(db, entries, report)
+            entries = []
+    if entries:
+        await _ingest_chunk(db, entries, report)
+    return report.as_dict()
@@ -0,0 +1,363 @@
+# src/jobs.py
+"""
+In-process background jobs backed by the `jobs` table.
+
+A job is a JSON payload of a registered kind. submit() writes it as "queued"
+and puts its id on the kind's in-memory queue; worker tasks take ids off the
+queue and run the kind's handler. Submits are group-committed: jobs submitted
+while an insert is in flight are written together by the next one. Jobs are micro-batched: a worker waits up
+to EXPENSEAI_JOB_BATCH_WAIT_MS for more queued jobs of the same kind and
+hands up to `batch_size` payloads to one handler call, so e.g. eligibility
+jobs share one vectorized model call.
+
+    @JOB_QUEUE.handler("verify_eligibility", batch_size=256)
+    async def run(payloads):          # -> one result per payload
+        ...
+
+A result is any JSON-able value, or a JobFailed for a permanent failure of
+that job. An exception from the handler fails the whole batch; those jobs
+are retried with exponential backoff until EXPENSEAI_JOB_MAX_ATTEMPTS.
+
+Jobs are claimed with a conditional UPDATE (queued -> running, with a lease),
+so a job runs once even when several processes queue its id. A janitor task
+requeues running jobs whose lease expired (their process died) and deletes
+finished jobs after EXPENSEAI_JOB_RETENTION_HOURS. Delivery is at-least-once:
+a job whose result could not be saved runs again.
+"""
+import asyncio
+import datetime
+import json
+import logging
+from collections import Counter
+
+from sqlalchemy import delete, insert, select, update
+
+from . import models
+from .config import (
+    JOB_BATCH_WAIT_MS, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_QUEUE_MAX_DEPTH,
+    JOB_RETENTION_HOURS, JOB_RETRY_BACKOFF_SECONDS
+)
+from .database import AsyncSessionLocal
+from .metrics import span
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class QueueFull(Exception):
+    """More than max_depth jobs are queued in this process."""
+
+
+class JobFailed(Exception):
+    """A permanent failure of one job (returned or raised by a handler); never retried."""
+
+    def __init__(self, detail, status_code=400):
+        super().__init__(detail)
+        self.detail = detail
+        self.status_code = status_code
+
+
+class _Kind:
+    __slots__ = ("name", "handler", "batch_size", "workers", "queue")
+
+    def __init__(self, name, handler, batch_size, workers):
+        self.name = name
+        self.handler = handler
+        self.batch_size = batch_size
+        self.workers = workers
+        self.queue = None  # asyncio.Queue of job ids, created by start()
+
+
+def _utcnow():
+    return datetime.datetime.utcnow()
+
+
+class JobQueue:
+    def __init__(self, sessions=AsyncSessionLocal, max_depth=JOB_QUEUE_MAX_DEPTH, max_attempts=JOB_MAX_ATTEMPTS,
+                 batch_wait_ms=JOB_BATCH_WAIT_MS, retry_backoff=JOB_RETRY_BACKOFF_SECONDS,
+                 lease_seconds=JOB_LEASE_SECONDS, retention_hours=JOB_RETENTION_HOURS):
+        self.sessions = sessions
+        self.max_depth = max_depth
+        self.max_attempts = max_attempts
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.retry_backoff = retry_backoff
+        self.lease = datetime.timedelta(seconds=lease_seconds)
+        self.retention = datetime.timedelta(hours=retention_hours)
+        self._kinds = {}
+        self._tasks = []
+        self._running = set()  # ids claimed by this process
+        self._queued = set()   # ids in the in-memory queues
+        self._taken = set()    # ids off a queue, from dequeue until their batch is done
+        self._delayed = set()  # ids waiting out a retry backoff
+        self._pending = []     # (job row, future) waiting for the next insert
+        self._writer = None    # task inserting _pending
+        self._recovered = False
+        self.finished = Counter()  # (kind, status) -> jobs
+        self.retried = Counter()   # kind -> jobs requeued after an error
+        self.batches = Counter()   # kind -> handler calls
+
+    # --- Registration ---
+    def handler(self, kind, batch_size=1, workers=1):
+        """Registers an async fn(payloads) -> results as the runner of `kind` jobs."""
+        def register(fn):
+            self._kinds[kind] = _Kind(kind, fn, batch_size, workers)
+            return fn
+        return register
+
+    @property
+    def kinds(self):
+        return list(self._kinds)
+
+    # --- Lifecycle ---
+    def start(self):
+        """Creates the queues and starts the workers and the janitor (needs a running loop)."""
+        if self._tasks:
+            return
+        self._queued.clear()
+        for kind in self._kinds.values():
+            kind.queue = asyncio.Queue()
+            self._tasks += [asyncio.create_task(self._worker(kind)) for _ in range(kind.workers)]
+        self._tasks.append(asyncio.create_task(self._janitor()))
+
+    async def stop(self):
+        """Cancels the workers and hands the jobs they were running back to the queue."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._writer is not None:
+            await asyncio.gather(self._writer, return_exceptions=True)
+        if self._running:
+            async with self.sessions() as db:
+                await db.execute(
+                    update(models.Job)
+                    .where(models.Job.id.in_(self._running), models.Job.status == RUNNING)
+                    .values(status=QUEUED, lease_until=None)
+                )
+                await db.commit()
+            self._running.clear()
+
+    # --- Submitting and polling ---
+    def depth(self):
+        return {name: kind.queue.qsize() if kind.queue else 0 for name, kind in self._kinds.items()}
+
+    def idle(self):
+        """True when this process has no job queued, being submitted, picked up, running or waiting to retry."""
+        return not (self._pending or self._taken or self._delayed or any(self.depth().values()))
+
+    async def submit(self, kind, payload):
+        """
+        Stores a queued job and schedules it; returns the (detached) Job.
+        Raises KeyError (unknown kind) or QueueFull.
+        """
+        if kind not in self._kinds:
+            raise KeyError(kind)
+        if sum(self.depth().values()) + len(self._pending) >= self.max_depth:
+            raise QueueFull(f"{self.max_depth} jobs queued")
+        row = {"kind": kind, "status": QUEUED, "payload": json.dumps(payload), "attempts": 0, "created_at": _utcnow()}
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((row, future))
+        if self._writer is None or self._writer.done():
+            self._writer = asyncio.create_task(self._write_pending())
+        return await future
+
+    async def _write_pending(self):
+        # One INSERT ... RETURNING and one commit per round, for every job submitted meanwhile
+        J = models.Job
+        while self._pending:
+            pending, self._pending = self._pending, []
+            try:
+                async with self.sessions() as db:
+                    ids = (await db.execute(
+                        insert(J).returning(J.id, sort_by_parameter_order=True), [row for row, _ in pending]
+                    )).scalars().all()
+                    await db.commit()
+            except Exception as e:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (row, future), job_id in zip(pending, ids):
+                self._enqueue(row["kind"], job_id)
+                if not future.done():  # the submitter may have gone away; the job still runs
+                    future.set_result(J(id=job_id, **row))
+
+    async def get(self, db, job_id):
+        return await db.get(models.Job, job_id)
+
+    def _enqueue(self, kind, job_id):
+        queue = self._kinds[kind].queue
+        if queue is not None and job_id not in self._queued:
+            self._queued.add(job_id)
+            queue.put_nowait(job_id)
+
+    def _take(self, job_id):
+        self._queued.discard(job_id)
+        self._taken.add(job_id)
+        return job_id
+
+    def _retry(self, kind, job_id):
+        self._delayed.discard(job_id)
+        self._enqueue(kind, job_id)
+
+    # --- Workers ---
+    async def _next_batch(self, kind):
+        """
+        Waits for one job id, then collects more for up to batch_wait seconds.
+        Every id is in _taken from the moment it leaves the queue.
+        """
+        ids = [self._take(await kind.queue.get())]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait
+        while len(ids) < kind.batch_size:
+            try:
+                ids.append(self._take(kind.queue.get_nowait()))
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                ids.append(self._take(await asyncio.wait_for(kind.queue.get(), remaining)))
+            except asyncio.TimeoutError:
+                break
+        return ids
+
+    async def _worker(self, kind):
+        while True:
+            ids = await self._next_batch(kind)
+            try:
+                await self._run_batch(kind, ids)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Bookkeeping failed (e.g. the database is down): the lease brings the jobs back
+                logger.exception("Job batch of %s failed", kind.name)
+            finally:
+                self._taken.difference_update(ids)
+
+    async def _claim(self, ids):
+        J = models.Job
+        async with self.sessions() as db:
+            rows = (await db.execute(
+                update(J)
+                .where(J.id.in_(ids), J.status == QUEUED)
+                .values(status=RUNNING, attempts=J.attempts + 1, lease_until=_utcnow() + self.lease)
+                .returning(J.id, J.payload, J.attempts)
+            )).all()
+            await db.commit()
+        return sorted(rows)
+
+    async def _run_batch(self, kind, ids):
+        claimed = await self._claim(ids)
+        if not claimed:
+            return  # already run, e.g. queued twice after recovery
+        job_ids = [job_id for job_id, _, _ in claimed]
+        self._running.update(job_ids)
+        self.batches[kind.name] += 1
+        try:
+            try:
+                with span(f"job_{kind.name}"):
+                    results = await kind.handler([json.loads(payload) for _, payload, _ in claimed])
+                if len(results) != len(claimed):
+                    raise RuntimeError(f"{kind.name} handler returned {len(results)} results for {len(claimed)} jobs")
+            except JobFailed as e:
+                await self._finish(kind, job_ids, [e] * len(job_ids))
+            except Exception as e:
+                logger.warning("Job batch of %s raised %s: %s", kind.name, type(e).__name__, e)
+                await self._retry_or_fail(kind, claimed, f"{type(e).__name__}: {e}")
+            else:
+                await self._finish(kind, job_ids, results)
+        finally:
+            self._running.difference_update(job_ids)
+
+    async def _finish(self, kind, job_ids, results):
+        now = _utcnow()
+        rows = []
+        for job_id, result in zip(job_ids, results):
+            if isinstance(result, JobFailed):
+                rows.append({"id": job_id, "status": FAILED, "error": result.detail, "error_code": result.status_code,
+                             "lease_until": None, "finished_at": now})
+            else:
+                rows.append({"id": job_id, "status": DONE, "result": json.dumps(result, default=str),
+                             "lease_until": None, "finished_at": now})
+        async with self.sessions() as db:
+            await db.execute(update(models.Job), rows)  # executemany by primary key
+            await db.commit()
+        for row in rows:
+            self.finished[kind.name, row["status"]] += 1
+
+    async def _retry_or_fail(self, kind, claimed, error):
+        now = _utcnow()
+        rows, retries = [], []
+        for job_id, _, attempts in claimed:
+            if attempts < self.max_attempts:
+                rows.append({"id": job_id, "status": QUEUED, "error": error, "lease_until": None})
+                retries.append((job_id, self.retry_backoff * 2 ** (attempts - 1)))
+            else:
+                rows.append({"id": job_id, "status": FAILED, "error": error, "error_code": 500,
+                             "lease_until": None, "finished_at": now})
+                self.finished[kind.name, FAILED] += 1
+        async with self.sessions() as db:
+            await db.execute(update(models.Job), rows)
+            await db.commit()
+        loop = asyncio.get_running_loop()
+        for job_id, delay in retries:
+            self._delayed.add(job_id)
+            loop.call_later(delay, self._retry, kind.name, job_id)
+        self.retried[kind.name] += len(retries)
+
+    # --- Recovery and cleanup ---
+    async def _janitor(self):
+        while True:
+            try:
+                await self.recover()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job recovery failed")
+            await asyncio.sleep(min(self.lease.total_seconds(), 60.0))
+
+    async def recover(self):
+        """
+        Requeues running jobs with an expired lease, queues jobs nobody picked up
+        (on startup: everything still queued) and deletes old finished jobs.
+        """
+        J = models.Job
+        now = _utcnow()
+        async with self.sessions() as db:
+            await db.execute(
+                update(J).where(J.status == RUNNING, J.lease_until < now).values(status=QUEUED, lease_until=None)
+            )
+            await db.execute(delete(J).where(J.status.in_([DONE, FAILED]), J.finished_at < now - self.retention))
+            query = select(J.id, J.kind).where(J.status == QUEUED, J.kind.in_(self.kinds)).order_by(J.id)
+            if self._recovered:
+                # Later rounds only pick up jobs left queued for a whole lease (their process died)
+                query = query.where(J.created_at < now - self.lease)
+            rows = (await db.execute(query)).all()
+            await db.commit()
+        self._recovered = True
+        # Jobs this process still holds (queued, being picked up or waiting out a retry
+        # backoff) also look abandoned once they are older than a lease
+        held = self._queued | self._taken | self._delayed
+        rows = [(job_id, kind) for job_id, kind in rows if job_id not in held]
+        for job_id, kind in rows:
+            self._enqueue(kind, job_id)
+        return len(rows)
+
+    def stats(self):
+        return {
+            "kinds": self.kinds,
+            "depth": self.depth(),
+            "running": len(self._running),
+            "submitting": len(self._pending),
+            "max_depth": self.max_depth,
+            "finished": {f"{kind}/{status}": n for (kind, status), n in self.finished.items()},
+            "retried": dict(self.retried),
+            "batches": dict(self.batches),
+        }
+
+
+JOB_QUEUE = JobQueue()
@@ -0,0 +1,240 @@
+# src/line_items.py
+"""
+Normalized product line items.
+
+Each product of an expense is one `expense_items` row (expense id, position,
+product id, qty, price) instead of a JSON string on the expense. Item names
+are interned in `products`, so a line costs a few bytes of integers, and
+item queries such as "wheat flour disbursed per scheme" run in SQL on the
+(product_id, expense_id) index instead of parsing JSON.
+
+PRODUCT_CATALOG maps names to ids in memory. Unknown names are inserted in
+the writer's transaction and only cached once it commits, so a rolled-back
+write never leaves an id behind that does not exist.
+
+Databases created before these tables existed keep products as a JSON
+string in `expenses.products`. migrate_legacy_products() moves them into
+`expense_items` and drops the column; it runs with the schema setup
+(`python -m src.database`, or on startup with EXPENSEAI_BOOTSTRAP_DB).
+JSON it cannot fully read (not JSON, not a list, a price that is not a
+number) is copied verbatim to `legacy_products` first, so dropping the
+column loses nothing.
+"""
+import json
+import logging
+import threading
+from itertools import groupby
+
+from sqlalchemy import column, event, func, inspect, insert, select, table, text
+from sqlalchemy.orm import Session
+
+from . import models
+
+logger = logging.getLogger(__name__)
+
+MIGRATE_BATCH = 5000
+
+
+# --- Product names ---
+class ProductCatalog:
+    def __init__(self):
+        self._ids = {}
+        self._lock = threading.Lock()
+
+    def known(self, names):
+        """name -> id when every name is cached, else None."""
+        ids = self._ids
+        try:
+            return {name: ids[name] for name in names}
+        except KeyError:
+            return None
+
+    def resolve(self, db: Session, names):
+        """
+        name -> id for every name. Unknown names are inserted in db's
+        transaction and cached after it commits.
+        """
+        names = set(names)
+        ids = {name: self._ids[name] for name in names if name in self._ids}
+        missing = names - ids.keys()
+        if missing:
+            new = product_ids(db, db.get_bind().dialect.name, missing)
+            db.info.setdefault("new_products", {}).update(new)
+            ids.update(new)
+        return ids
+
+    def remember(self, ids):
+        with self._lock:
+            self._ids = {**self._ids, **ids}
+
+    def stats(self):
+        return {"products": len(self._ids)}
+
+
+def product_ids(db, dialect_name, names):
+    """name -> id, inserting the names that have no row yet (uncached)."""
+    P = models.Product
+    names = sorted(names)
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        # No ON CONFLICT: insert the names not found (a concurrent insert of one fails on the unique name)
+        ids = dict(db.execute(select(P.name, P.id).where(P.name.in_(names))).all())
+        missing = [{"name": name} for name in names if name not in ids]
+        if missing:
+            db.execute(insert(P.__table__), missing)
+            ids.update(db.execute(select(P.name, P.id).where(P.name.in_([row["name"] for row in missing]))).all())
+        return ids
+    db.execute(dialect_insert(P).on_conflict_do_nothing(index_elements=[P.name]), [{"name": name} for name in names])
+    return dict(db.execute(select(P.name, P.id).where(P.name.in_(names))).all())
+
+
+PRODUCT_CATALOG = ProductCatalog()
+
+@event.listens_for(Session, "after_commit")
+def _remember_committed_products(session):
+    new = session.info.pop("new_products", None)
+    if new:
+        PRODUCT_CATALOG.remember(new)
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_products(session):
+    session.info.pop("new_products", None)
+
+
+# --- Writing ---
+def split_products(expenses):
+    """(expense dicts without "products", their product lists)."""
+    rows = [{k: v for k, v in expense.items() if k != "products"} for expense in expenses]
+    return rows, [expense.get("products") or [] for expense in expenses]
+
+def product_names(baskets):
+    return {product["item"] for products in baskets for product in products}
+
+def item_rows(expense_ids, baskets, ids):
+    """expense_items rows for parallel lists of expense ids and product lists; ids maps names to product ids."""
+    return [
+        {"expense_id": expense_id, "position": position, "product_id": ids[product["item"]],
+         "qty": product.get("qty"), "price": float(product["price"])}
+        for expense_id, products in zip(expense_ids, baskets)
+        for position, product in enumerate(products)
+    ]
+
+
+# --- Reading ---
+def items_query(expense_ids):
+    I, P = models.ExpenseItem, models.Product
+    return (
+        select(I.expense_id, P.name, I.qty, I.price)
+        .join(P, P.id == I.product_id)
+        .where(I.expense_id.in_(expense_ids))
+        .order_by(I.expense_id, I.position)
+    )
+
+def group_items(rows):
+    """expense id -> [{"item", "qty", "price"}] from items_query rows."""
+    return {
+        expense_id: [{"item": item, "qty": qty, "price": price} for _, item, qty, price in items]
+        for expense_id, items in groupby(rows, key=lambda row: row[0])
+    }
+
+def with_products(rows, items):
+    """Expense row mappings as dicts, with their "products" list attached."""
+    return [dict(row, products=items.get(row["id"], [])) for row in rows]
+
+def product_id_of(item):
+    return select(models.Product.id).where(models.Product.name == item).scalar_subquery()
+
+def item_totals_query(dimension_column, item=None, created_from=None, created_to=None, sort="key", limit=1000):
+    """
+    Line count, expense count and amount per (key, item), where key is the
+    Expense column `dimension_column`, e.g. wheat flour disbursed per scheme.
+    """
+    E, I, P = models.Expense, models.ExpenseItem, models.Product
+    key = getattr(E, dimension_column).label("key")
+    query = (
+        select(key, P.name.label("item"), func.count().label("line_count"),
+               func.count(func.distinct(I.expense_id)).label("expense_count"),
+               func.sum(I.price).label("total_amount"))
+        .select_from(I).join(E, E.id == I.expense_id).join(P, P.id == I.product_id)
+    )
+    if item is not None:
+        query = query.where(I.product_id == product_id_of(item))
+    if created_from is not None:
+        query = query.where(E.created_at >= created_from)
+    if created_to is not None:
+        query = query.where(E.created_at < created_to)
+    query = query.group_by(key, P.name)
+    order = [func.sum(I.price).desc(), key, P.name] if sort == "total" else [key, P.name]
+    return query.order_by(*order).limit(limit)
+
+
+# --- Migration from the JSON column ---
+def _legacy_item(p):
+    if not isinstance(p, dict):
+        raise ValueError("not an object")
+    try:
+        price = float(p.get("price") or 0)
+    except (TypeError, ValueError):
+        raise ValueError(f"price {p.get('price')!r} is not a number") from None
+    return {"item": str(p.get("item", "")), "qty": None if p.get("qty") is None else str(p["qty"]), "price": price}
+
+def _legacy_products(value):
+    """(readable items, what could not be read or None) of one expenses.products value."""
+    try:
+        products = json.loads(value) if value else []
+    except ValueError:
+        return [], "not JSON"
+    if not isinstance(products, list):
+        return [], "not a list"
+    items, errors = [], []
+    for position, p in enumerate(products):
+        try:
+            items.append(_legacy_item(p))
+        except ValueError as e:
+            errors.append(f"item {position}: {e}")
+    return items, "; ".join(errors) or None
+
+def migrate_legacy_products(conn):
+    """
+    Moves `expenses.products` JSON into expense_items, in id order and batches,
+    then drops the column. The readable items of a partly unreadable value
+    are moved too, and the whole value is kept in legacy_products. A no-op
+    when the column does not exist. Returns the number of items written.
+    Runs in the caller's transaction.
+    """
+    if "products" not in {c["name"] for c in inspect(conn).get_columns("expenses")}:
+        return 0
+    legacy = table("expenses", column("id"), column("products"))
+    last_id, written, kept = 0, 0, 0
+    while True:
+        batch = conn.execute(
+            select(legacy.c.id, legacy.c.products)
+            .where(legacy.c.id > last_id, legacy.c.products.is_not(None))
+            .order_by(legacy.c.id).limit(MIGRATE_BATCH)
+        ).all()
+        if not batch:
+            break
+        parsed = [_legacy_products(products) for _, products in batch]
+        baskets = [items for items, _ in parsed]
+        unreadable = [
+            {"expense_id": expense_id, "products": products, "error": error}
+            for (expense_id, products), (_, error) in zip(batch, parsed) if error is not None
+        ]
+        if unreadable:
+            conn.execute(insert(models.LegacyProducts), unreadable)
+        kept += len(unreadable)
+        names = product_names(baskets)
+        ids = product_ids(conn, conn.dialect.name, names) if names else {}
+        rows = item_rows([expense_id for expense_id, _ in batch], baskets, ids)
+        if rows:
+            conn.execute(insert(models.ExpenseItem), rows)
+        written += len(rows)
+        last_id = batch[-1][0]
+    conn.execute(text("ALTER TABLE expenses DROP COLUMN products"))
+    logger.info("Migrated %d product line items out of expenses.products", written)
+    if kept:
+        logger.warning("%d expenses had products JSON that could not be fully read; kept as is in legacy_products", kept)
+    return written
@@ -0,0 +1,276 @@
+# src/metrics.py
+"""
+In-process metrics in the Prometheus text format, plus a sampling profiler.
+
+Counters and histograms are plain thread-safe dicts keyed by label values.
+Collectors registered with `collector` are called at scrape time to turn
+existing stats (cache hit counters, fraud flags, ...) into samples, so those
+components don't need to know about metrics at all.
+
+`span(stage)` times a block into expenseai_stage_seconds. The endpoint label
+comes from a context variable the HTTP middleware sets, which also reaches
+the inference threads through run_inference.
+"""
+import contextvars
+import sys
+import threading
+import time
+from collections import Counter as _Tally
+from contextlib import contextmanager
+
+from .config import METRICS_ENABLED, PROFILER_INTERVAL_MS
+
+# Seconds; spans range from microsecond cache hits to multi-second bulk requests
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_endpoint = contextvars.ContextVar("metrics_endpoint", default="background")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values):
+        return self._values.get(label_values, 0)
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            yield f"{self.name}{_format_labels(self.labels, label_values)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, *label_values):
+        series = self._series.get(label_values)
+        return series[-1] if series else 0
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        names = self.labels + ("le",)
+        for label_values, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                yield f"{self.name}_bucket{_format_labels(names, label_values + (repr(bound),))} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(names, label_values + ('+Inf',))} {series[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, label_values)} {series[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, label_values)} {series[-1]}"
+
+
+# --- Registry ---
+_METRICS = []
+_COLLECTORS = []
+
+def counter(name, help, labels=()):
+    metric = Counter(name, help, labels)
+    _METRICS.append(metric)
+    return metric
+
+def histogram(name, help, labels=(), buckets=LATENCY_BUCKETS):
+    metric = Histogram(name, help, labels, buckets)
+    _METRICS.append(metric)
+    return metric
+
+def collector(fn):
+    """
+    Registers fn() -> iterable of (name, type, help, {labels}, value), read at
+    scrape time. Samples sharing a name are grouped under one HELP/TYPE header.
+    """
+    _COLLECTORS.append(fn)
+    return fn
+
+def render():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    families = {}
+    for fn in _COLLECTORS:
+        for name, kind, help, labels, value in fn():
+            family = families.setdefault(name, (kind, help, []))
+            family[2].append((labels, value))
+    for name, (kind, help, samples) in families.items():
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Request & stage metrics ---
+REQUEST_SECONDS = histogram(
+    "expenseai_http_request_duration_seconds", "HTTP request latency", ("method", "route", "status"))
+STAGE_SECONDS = histogram(
+    "expenseai_stage_seconds", "Time spent in one stage of a request", ("endpoint", "stage"))
+DB_STATEMENTS = counter(
+    "expenseai_db_statements_total", "SQL statements executed", ("endpoint",))
+DB_COMMITS = counter(
+    "expenseai_db_commits_total", "Database commits", ("endpoint",))
+MODEL_CALLS = counter(
+    "expenseai_model_calls_total", "Model invocations (a batch counts once)", ("model", "engine", "mode"))
+MODEL_ROWS = counter(
+    "expenseai_model_rows_total", "Rows scored by the models", ("model", "engine", "mode"))
+
+
+def set_endpoint(label):
+    """Labels spans and DB counters in the current context (one request) with `label`."""
+    return _endpoint.set(label)
+
+def current_endpoint():
+    return _endpoint.get()
+
+def observe_stage(stage, seconds):
+    if METRICS_ENABLED:
+        STAGE_SECONDS.observe(seconds, _endpoint.get(), stage)
+
+@contextmanager
+def span(stage):
+    """Times the block into expenseai_stage_seconds{endpoint, stage}."""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, _endpoint.get(), stage)
+
+def count_model_call(model, engine, mode, rows=1):
+    if METRICS_ENABLED:
+        MODEL_CALLS.inc(model, engine, mode)
+        MODEL_ROWS.inc(model, engine, mode, amount=rows)
+
+
+def cache_samples(name, stats):
+    """Collector samples for a TTLCache.stats() dict."""
+    labels = {"cache": name}
+    yield "expenseai_cache_hits_total", "counter", "Cache hits", labels, stats["hits"]
+    yield "expenseai_cache_misses_total", "counter", "Cache misses", labels, stats["misses"]
+    yield "expenseai_cache_evictions_total", "counter", "Entries evicted for size", labels, stats["evictions"]
+    yield "expenseai_cache_expirations_total", "counter", "Entries dropped after their TTL", labels, stats["expirations"]
+    yield "expenseai_cache_entries", "gauge", "Entries currently cached", labels, stats["size"]
+
+
+# --- Sampling Profiler ---
+class SamplingProfiler:
+    """
+    Samples the Python stacks of all other threads every `interval_ms` and
+    counts them in collapsed form ("outer;inner;leaf" -> samples), which
+    flamegraph.pl and speedscope read directly. Off until started; the
+    sampling thread is the only cost while it runs.
+    """
+
+    def __init__(self, interval_ms=PROFILER_INTERVAL_MS, max_depth=64):
+        self.interval_ms = interval_ms
+        self.max_depth = max_depth
+        self.stacks = _Tally()
+        self.samples = 0
+        self.started_at = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=None, duration_s=None):
+        """Starts sampling (clearing earlier samples); stops by itself after duration_s if given."""
+        with self._lock:
+            if self.running:
+                return False
+            self.interval_ms = interval_ms or self.interval_ms
+            self.stacks = _Tally()
+            self.samples = 0
+            self.started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, args=(duration_s,), name="sampling-profiler", daemon=True)
+            self._thread.start()
+            return True
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self, duration_s):
+        own = threading.get_ident()
+        deadline = time.monotonic() + duration_s if duration_s else None
+        interval = self.interval_ms / 1000.0
+        while not self._stop.wait(interval):
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+            sampled = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                sampled.append(";".join(reversed(stack)))
+            # Under the lock so collapsed() never iterates the tally while it grows
+            with self._lock:
+                for stack in sampled:
+                    self.stacks[stack] += 1
+                self.samples += 1
+
+    def collapsed(self, limit=None):
+        """Collapsed stacks, most frequent first."""
+        with self._lock:
+            top = self.stacks.most_common(limit)
+        return "\n".join(f"{stack} {n}" for stack, n in top) + "\n"
+
+    def status(self):
+        return {
+            "running": self.running,
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "distinct_stacks": len(self.stacks),
+            "started_at": self.started_at,
+        }
+
+
+PROFILER = SamplingProfiler()
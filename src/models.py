@@ -1,5 +1,5 @@
 # models.py
-from sqlalchemy import Column, Integer, String, Boolean, Float, DateTime
+from sqlalchemy import Column, Integer, String, Boolean, Float, Date, DateTime, ForeignKey, Index
 from sqlalchemy.ext.declarative import declarative_base
 import datetime
 
@@ -13,6 +13,9 @@ class User(Base):
     role = Column(String)
     is_active = Column(Boolean, default=False)
     spending_limit = Column(Float, nullable=True)
+    # Vendors only: scheme and region served (NULL = all)
+    scheme_id = Column(String, nullable=True)
+    region = Column(String, nullable=True)
 
 class Scheme(Base):
     __tablename__ = "schemes"
@@ -34,13 +37,83 @@ class Application(Base):
 
 class Expense(Base):
     __tablename__ = "expenses"
+    # Composite (filter, id) indexes serve keyset pagination: WHERE col = ? AND id > ? ORDER BY id
+    __table_args__ = (
+        Index("ix_expenses_cnic_id", "cnic", "id"),
+        Index("ix_expenses_scheme_id_id", "scheme_id", "id"),
+        Index("ix_expenses_vendor_cnic_id", "vendor_cnic", "id"),
+        Index("ix_expenses_is_fraudulent_id", "is_fraudulent", "id"),
+        Index("ix_expenses_created_at_id", "created_at", "id"),
+    )
     id = Column(Integer, primary_key=True, index=True)
     expense_id = Column(String, unique=True, index=True)
-    cnic = Column(String, index=True)
-    scheme_id = Column(String, index=True)
+    cnic = Column(String)
+    scheme_id = Column(String)
     vendor_cnic = Column(String)
     total_amount = Column(Float)
-    products = Column(String)
+    # Products are rows of expense_items (src/line_items.py)
     is_fraudulent = Column(Boolean, default=False)
     reason = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.datetime.utcnow)
\ No newline at end of file
+    # Rows of bulk uploads (POST /expenses/bulk), which the fraud engine checks without the volume-spike rules
+    is_bulk = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+
+class Product(Base):
+    """Distinct line item names, referenced by id from expense_items."""
+    __tablename__ = "products"
+    id = Column(Integer, primary_key=True)
+    name = Column(String, unique=True, nullable=False)
+
+class ExpenseItem(Base):
+    """One product line of an expense, in basket order (src/line_items.py)."""
+    __tablename__ = "expense_items"
+    # (product_id, expense_id) serves item filters and per-item totals joined to expenses.
+    # Clustered on the primary key in SQLite (no rowid, no second copy of the key).
+    __table_args__ = (
+        Index("ix_expense_items_product_id_expense_id", "product_id", "expense_id"),
+        {"sqlite_with_rowid": False},
+    )
+    expense_id = Column(Integer, ForeignKey("expenses.id"), primary_key=True)
+    position = Column(Integer, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
+    qty = Column(String, nullable=True)  # as given, e.g. "10kg"
+    price = Column(Float, nullable=False)
+
+class LegacyProducts(Base):
+    """expenses.products JSON the line item migration could not fully read, kept verbatim (src/line_items.py)."""
+    __tablename__ = "legacy_products"
+    expense_id = Column(Integer, ForeignKey("expenses.id"), primary_key=True)
+    products = Column(String, nullable=False)
+    error = Column(String, nullable=False)  # what could not be read
+
+class SpendingRollup(Base):
+    """Per-day expense totals by scheme, vendor or citizen, maintained by src/aggregates.py."""
+    __tablename__ = "spending_rollups"
+    __table_args__ = (
+        Index("ix_spending_rollups_dimension_day", "dimension", "day"),
+    )
+    dimension = Column(String, primary_key=True)  # "scheme", "vendor" or "citizen"
+    key = Column(String, primary_key=True)        # scheme_id, vendor_cnic or cnic
+    day = Column(Date, primary_key=True)          # UTC day of Expense.created_at
+    expense_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Float, nullable=False, default=0.0)
+    fraud_count = Column(Integer, nullable=False, default=0)
+    fraud_amount = Column(Float, nullable=False, default=0.0)
+
+class Job(Base):
+    """Background job run by src/jobs.py; payload and result are JSON text."""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        Index("ix_jobs_status_id", "status", "id"),
+    )
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    payload = Column(String, nullable=False)
+    result = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    error_code = Column(Integer, nullable=True)  # HTTP-style status of a permanent failure
+    attempts = Column(Integer, nullable=False, default=0)
+    lease_until = Column(DateTime, nullable=True)  # running jobs: requeued after this
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
@@ -0,0 +1,50 @@
+# src/profiles.py
+"""
+Synthetic citizen profiles.
+
+Each CNIC gets its own seeded random.Random, so profiles are deterministic
+and never touch the process-global RNG that other request threads use.
+Profiles are memoized in a bounded LRU/TTL cache shared by eligibility and
+trust scoring, so a citizen hitting several endpoints is derived once.
+"""
+import random
+from types import MappingProxyType
+
+from .cache import TTLCache
+from .config import PROFILE_CACHE_SIZE, PROFILE_CACHE_TTL
+from .metrics import span
+
+
+def generate_profile(cnic: str):
+    # Same draw sequence as the original random.seed(cnic) generator
+    rng = random.Random(cnic)
+    return {
+        "income": rng.choice([30000, 45000, 60000, 80000, 120000]),
+        "family_size": rng.randint(2, 8),
+        "utility_bills_paid": rng.choice([True, True, False]),
+        "loan_defaults": rng.choice([0, 0, 0, 0, 1]), # 20% chance
+        "credit_history_years": rng.randint(0, 15),
+        "suspicious_transactions": rng.choice([0, 0, 0, 1, 2])
+    }
+
+
+class ProfileProvider:
+    """Memoizing front for generate_profile. Returned profiles are read-only."""
+
+    def __init__(self, maxsize=PROFILE_CACHE_SIZE, ttl=PROFILE_CACHE_TTL):
+        self.cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, cnic: str):
+        return self.cache.get_or_compute(cnic, lambda: self._generate(cnic))
+
+    @staticmethod
+    def _generate(cnic):
+        # Only misses are timed; a hit is a dict lookup
+        with span("profile"):
+            return MappingProxyType(generate_profile(cnic))
+
+    def stats(self):
+        return self.cache.stats()
+
+
+PROFILE_PROVIDER = ProfileProvider()
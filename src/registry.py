@@ -0,0 +1,264 @@
+# src/registry.py
+"""
+Model registry: discovers model artifacts, loads them lazily and swaps them atomically.
+
+Artifacts are looked up in MODEL_DIR:
+    MODEL_DIR/versions/<name>/{eligibility_model.pkl, trust_model.pkl, trust_model_flat.npz}
+    MODEL_DIR/{eligibility_model.pkl, ...}   (unversioned layout train_models.py writes by default)
+The newest version name (sorted, so timestamps work) is active unless one is
+pinned. Nothing is read until the first request that needs a model.
+
+A loaded version is an immutable ModelSet. Readers grab the current set once
+per call, and a reload builds the new set completely before replacing the
+reference, so a request never mixes two versions. When MODEL_RELOAD_SECONDS
+is set, changed or newly added artifacts are picked up on the next access.
+train_models.py gives the files of a set one mtime; a set whose mtimes
+disagree (e.g. the unversioned files while they are being replaced one by
+one) is only picked up once it is unchanged at the next check.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from .config import MODEL_DIR, MODEL_MMAP_MODE, MODEL_RELOAD_SECONDS, MODEL_VERSION_PIN, TRUST_ENGINE
+
+logger = logging.getLogger(__name__)
+
+ELIGIBILITY_FILE = "eligibility_model.pkl"
+TRUST_FILE = "trust_model.pkl"
+TRUST_FLAT_FILE = "trust_model_flat.npz"
+ARTIFACT_FILES = (ELIGIBILITY_FILE, TRUST_FILE, TRUST_FLAT_FILE)
+UNVERSIONED = "default"
+# Trust engines a ModelSet can serve ("flat" falls back to "sklearn" without its artifact)
+TRUST_ENGINES = ("sklearn", "flat")
+
+
+def artifact_fingerprint(directory):
+    """Short fingerprint of the artifact files in a directory (name, size, mtime)."""
+    stamp = []
+    for name in ARTIFACT_FILES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            st = os.stat(path)
+            stamp.append(f"{name}:{st.st_size}:{st.st_mtime_ns}")
+    return hashlib.sha1("|".join(stamp).encode()).hexdigest()[:12] if stamp else None
+
+def artifacts_agree(directory):
+    """Whether the artifact files in a directory share one mtime, as train_models.py publishes them."""
+    mtimes = set()
+    for name in ARTIFACT_FILES:
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            mtimes.add(os.stat(path).st_mtime_ns)
+    return len(mtimes) <= 1
+
+
+class ModelSet:
+    """One loaded model version: the raw estimators plus their compiled kernels."""
+
+    def __init__(self, name, directory, fingerprint, eligibility_model=None, trust_model=None,
+                 trust_flat=None, error=None):
+        self.name = name
+        self.directory = directory
+        self.fingerprint = fingerprint
+        self.eligibility_model = eligibility_model
+        self.trust_model = trust_model
+        self.trust_flat = trust_flat
+        self.error = error
+        self.loaded_at = time.time()
+        # numpy is only imported once a model set is built, not with the app
+        from .inference import ELIGIBILITY_FEATURES, TRUST_FEATURES, compile_model
+        # Compiled single-row kernels (no pandas on the request path)
+        self.eligibility_kernel = compile_model(eligibility_model, ELIGIBILITY_FEATURES)
+        self.trust_kernel = compile_model(trust_model, TRUST_FEATURES)
+        self.trust_engines = {"sklearn": self.trust_kernel, "flat": trust_flat}
+
+    @property
+    def version(self):
+        """Identifies the loaded content: the version name plus the artifact fingerprint."""
+        if self.fingerprint is None:
+            return "none"
+        return self.fingerprint if self.name == UNVERSIONED else f"{self.name}@{self.fingerprint[:8]}"
+
+    def info(self):
+        return {
+            "version": self.version,
+            "name": self.name,
+            "directory": self.directory,
+            "loaded_at": self.loaded_at,
+            "eligibility_model": self.eligibility_model is not None,
+            "trust_model": self.trust_model is not None,
+            "trust_flat": self.trust_flat is not None,
+            "error": self.error,
+        }
+
+
+def load_model_set(name, directory, mmap_mode=MODEL_MMAP_MODE, trust_engine=TRUST_ENGINE):
+    """Reads one version's artifacts. Raises if a file exists but cannot be loaded."""
+    import joblib
+    from .inference import FlatForest, flatten_forest
+
+    fingerprint = artifact_fingerprint(directory)
+    eligibility_path = os.path.join(directory, ELIGIBILITY_FILE)
+    trust_path = os.path.join(directory, TRUST_FILE)
+    flat_path = os.path.join(directory, TRUST_FLAT_FILE)
+
+    eligibility_model = joblib.load(eligibility_path, mmap_mode=mmap_mode) if os.path.exists(eligibility_path) else None
+    trust_model = joblib.load(trust_path, mmap_mode=mmap_mode) if os.path.exists(trust_path) else None
+    trust_flat = None
+    if os.path.exists(flat_path):
+        trust_flat = FlatForest.load(flat_path, mmap_mode=mmap_mode)
+    elif trust_engine == "flat" and trust_model is not None:
+        trust_flat = flatten_forest(trust_model)
+    return ModelSet(name, directory, fingerprint, eligibility_model, trust_model, trust_flat)
+
+
+class ModelRegistry:
+    def __init__(self, root=MODEL_DIR, pin=MODEL_VERSION_PIN, mmap_mode=MODEL_MMAP_MODE,
+                 reload_seconds=MODEL_RELOAD_SECONDS):
+        self.root = root
+        self.pin = pin or None
+        self.mmap_mode = mmap_mode
+        self.reload_seconds = reload_seconds
+        self._active = None
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._unsettled = None  # fingerprint of a mixed-mtime set seen at the last check
+        self._listeners = []
+        self.reloads = 0
+
+    # --- Discovery ---
+    def available(self):
+        """Version name -> directory, for every location that holds at least one artifact."""
+        found = {}
+        versions_dir = os.path.join(self.root, "versions")
+        if os.path.isdir(versions_dir):
+            for name in sorted(os.listdir(versions_dir)):
+                directory = os.path.join(versions_dir, name)
+                if not name.startswith(".") and os.path.isdir(directory) and artifact_fingerprint(directory):
+                    found[name] = directory
+        if artifact_fingerprint(self.root):
+            found[UNVERSIONED] = self.root
+        return found
+
+    def _target(self, available):
+        if self.pin:
+            if self.pin not in available:
+                raise LookupError(f"Model version {self.pin!r} not found in {self.root}")
+            return self.pin
+        versioned = [name for name in available if name != UNVERSIONED]
+        if versioned:
+            return versioned[-1]
+        return UNVERSIONED if UNVERSIONED in available else None
+
+    # --- Access ---
+    def current(self):
+        """The active ModelSet, loading it on first use and re-checking the files periodically."""
+        active = self._active
+        if active is None:
+            with self._lock:
+                if self._active is None:
+                    self._swap(self._load_target())
+                return self._active
+        if self.reload_seconds > 0 and time.monotonic() >= self._next_check:
+            self._check_for_changes()
+        return self._active
+
+    @property
+    def version(self):
+        return self.current().version
+
+    @property
+    def loaded_version(self):
+        """Version of the active set without triggering a load (None before first use)."""
+        active = self._active
+        return active.version if active is not None else None
+
+    def on_swap(self, fn):
+        """Registers fn(new_model_set), called after every swap (e.g. to drop cached results)."""
+        self._listeners.append(fn)
+        return fn
+
+    # --- Reloading ---
+    def reload(self, version=None):
+        """
+        Loads `version` (or the newest / pinned one) and swaps it in.
+        Raises LookupError for an unknown version and re-raises load errors,
+        leaving the active set untouched.
+        """
+        with self._lock:
+            if version is not None:
+                available = self.available()
+                if version not in available:
+                    raise LookupError(f"Model version {version!r} not found in {self.root}")
+                model_set = load_model_set(version, available[version], self.mmap_mode)
+                self.pin = version
+            else:
+                model_set = self._load_target(raise_errors=True)
+            self._swap(model_set)
+            return model_set
+
+    def _load_target(self, raise_errors=False):
+        try:
+            available = self.available()
+            name = self._target(available)
+            if name is None:
+                logger.warning("No model artifacts in %s; using rule-based scoring", self.root)
+                return ModelSet(None, None, None)
+            return load_model_set(name, available[name], self.mmap_mode)
+        except Exception as e:
+            if raise_errors:
+                raise
+            logger.exception("Loading models from %s failed; using rule-based scoring", self.root)
+            return ModelSet(None, None, None, error=f"{type(e).__name__}: {e}")
+
+    def _swap(self, model_set):
+        previous = self._active
+        self._active = model_set
+        self._next_check = time.monotonic() + self.reload_seconds
+        self.reloads += previous is not None
+        logger.info("Model version %s active (%s)", model_set.version, model_set.directory or "no artifacts")
+        for fn in self._listeners:
+            fn(model_set)
+
+    def _check_for_changes(self):
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is checking or reloading
+        try:
+            self._next_check = time.monotonic() + self.reload_seconds
+            active = self._active
+            available = self.available()
+            try:
+                name = self._target(available)
+            except LookupError:
+                return
+            directory = available.get(name)
+            fingerprint = artifact_fingerprint(directory) if directory else None
+            if name == active.name and fingerprint == active.fingerprint:
+                return
+            if directory and fingerprint != self._unsettled and not artifacts_agree(directory):
+                # Possibly caught between the moves of a publish; load it if it is still there next time
+                self._unsettled = fingerprint
+                return
+            try:
+                self._swap(load_model_set(name, directory, self.mmap_mode) if name else ModelSet(None, None, None))
+            except Exception:
+                # Typically a file caught mid-write; keep serving and retry next interval
+                logger.exception("Reloading model version %s failed; keeping %s", name, active.version)
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        info = self.current().info()
+        info.update(
+            pinned=self.pin,
+            mmap_mode=self.mmap_mode,
+            reloads=self.reloads,
+            available=list(self.available()),
+        )
+        return info
+
+
+MODEL_REGISTRY = ModelRegistry()
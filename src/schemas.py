@@ -1,12 +1,15 @@
 # src/schemas.py
-from pydantic import BaseModel
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field, Json
+from typing import Any, Optional, List, Union
+import datetime
 
 class UserCreate(BaseModel):
     cnic: str
     name: str
     role: str  # 'admin', 'employee', 'vendor', 'customer', 'government'
     spending_limit: Optional[float] = None
+    scheme_id: Optional[str] = None  # vendors: scheme served (None = all)
+    region: Optional[str] = None     # vendors: region served (None = all)
 
 class UserOut(BaseModel):
     id: int
@@ -25,6 +28,27 @@ class VerifyEligibilityResponse(BaseModel):
     scheme_id: str
     eligible: bool
     reasons: List[str]
+    model_version: Optional[str] = None
+
+class VerifyEligibilityBatchRequest(BaseModel):
+    items: List[VerifyEligibilityRequest] = Field(..., max_length=10000)
+
+# --- Multi-Scheme Eligibility ---
+class SchemeMatchRequest(BaseModel):
+    cnics: List[str] = Field(..., min_length=1, max_length=1000)
+    scheme_ids: Optional[List[str]] = None  # None = every scheme in the catalog
+    only_eligible: bool = False
+
+class SchemeDecision(BaseModel):
+    scheme_id: str
+    eligible: bool
+    reasons: List[str]
+
+class SchemeMatchResponse(BaseModel):
+    cnic: str
+    eligible_schemes: List[str]
+    schemes: List[SchemeDecision]
+    model_version: Optional[str] = None
 
 # --- Trust Score Schemas ---
 class TrustScoreRequest(BaseModel):
@@ -37,11 +61,19 @@ class TrustScoreResponse(BaseModel):
     is_identity_verified: bool
     trust_score: float
     reasons: List[str]
+    model_version: Optional[str] = None
 
 class SubmitProposalRequest(BaseModel):
     cnic: str
     scheme_id: str
     government_decision: str  # "ACCEPTED" or "REJECTED"
+    region: Optional[str] = None  # prefer vendors serving this region
+
+class ProductItem(BaseModel):
+    model_config = ConfigDict(coerce_numbers_to_str=True)  # qty may arrive as a number
+    item: str = Field(..., min_length=1)
+    qty: Optional[str] = None  # e.g. "10kg"
+    price: float = Field(..., ge=0)
 
 class ExpenseRecord(BaseModel):
     expense_id: str
@@ -49,10 +81,60 @@ class ExpenseRecord(BaseModel):
     scheme_id: str
     vendor_cnic: str
     total_amount: float
-    products: str  # JSON string
+    products: List[ProductItem]
     is_fraudulent: bool
     reason: Optional[str]
 
+# --- Bulk Expense Ingestion ---
+class ExpenseIngestRecord(BaseModel):
+    # ExpenseRecord-shaped; expense_id, is_fraudulent and reason are assigned on ingest
+    cnic: str = Field(..., min_length=1)
+    scheme_id: str
+    vendor_cnic: str
+    total_amount: float = Field(..., gt=0)
+    products: Union[Json[List[ProductItem]], List[ProductItem]] = Field(default_factory=list)  # list or its JSON string
+    created_at: Optional[datetime.datetime] = None  # sale time; defaults to now
+
+class BulkIngestError(BaseModel):
+    line: int  # 1-based line of the upload (CSV header included)
+    error: str
+
+class BulkIngestResponse(BaseModel):
+    received: int
+    inserted: int
+    rejected: int
+    fraud_flagged: int
+    chunks: int
+    errors: List[BulkIngestError]
+    errors_truncated: bool
+
+class SpendingRollupOut(BaseModel):
+    key: str  # scheme_id, vendor_cnic or cnic
+    day: Optional[datetime.date] = None  # None when totals span the whole range
+    expense_count: int
+    total_amount: float
+    fraud_count: int
+    fraud_amount: float
+    fraud_rate: float
+
+class ItemTotalOut(BaseModel):
+    key: str  # scheme_id, vendor_cnic or cnic
+    item: str
+    line_count: int
+    expense_count: int
+    total_amount: float
+
+class JobOut(BaseModel):
+    job_id: int
+    kind: str  # "verify_eligibility" or "submit_proposal"
+    status: str  # queued | running | done | failed
+    attempts: int
+    result: Optional[Any] = None  # the synchronous endpoint's response body, once done
+    error: Optional[str] = None
+    error_code: Optional[int] = None  # HTTP status the synchronous endpoint would have returned
+    created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+
 class ChatbotQuery(BaseModel):
     query: str
     language: str  # "ur" or "en"
\ No newline at end of file
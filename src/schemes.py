@@ -0,0 +1,207 @@
+# src/schemes.py
+"""
+In-memory scheme catalog and compiled eligibility rules.
+
+SchemeCatalog keeps every Scheme row in memory as a SchemeSet: the criteria
+compiled into column arrays, so one profile or a batch of profiles is checked
+against all schemes with a few broadcast comparisons and no per-request
+queries. It is reloaded after a Scheme commit in this process (see crud) and
+every EXPENSEAI_SCHEME_REFRESH_SECONDS for writers elsewhere. A reload that
+changes the schemes bumps `generation`, which is part of every cached
+eligibility decision's key.
+
+A scheme's checks, in reason order:
+  - income <= max_income                   (NULL = no cap)
+  - family_size >= min_family_size         (NULL = no minimum)
+  - financial: the eligibility model's prediction, or utility bills paid
+    when no model is loaded
+"""
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import SCHEME_REFRESH_SECONDS
+
+INCOME_TOO_HIGH = "Income too high"
+FAMILY_TOO_SMALL = "Family size below scheme minimum"
+BILLS_UNPAID = "Utility bills unpaid"
+MODEL_INELIGIBLE = "AI Model predicted ineligibility based on financial profile."
+
+# Failed checks as bit flags; each of the 8 codes maps to one reasons tuple
+INCOME, FAMILY, FINANCIAL = 1, 2, 4
+
+
+def reason_table(financial_reason):
+    """Reasons tuple for every failure code, given the wording of the financial check."""
+    checks = ((INCOME, INCOME_TOO_HIGH), (FAMILY, FAMILY_TOO_SMALL), (FINANCIAL, financial_reason))
+    return [tuple(reason for bit, reason in checks if code & bit) for code in range(8)]
+
+
+def failure_code(profile, scheme, financial_ok):
+    """Failed-check bits of one profile against one scheme (0 = eligible)."""
+    code = 0
+    if scheme.max_income is not None and profile["income"] > scheme.max_income:
+        code |= INCOME
+    if scheme.min_family_size is not None and profile["family_size"] < scheme.min_family_size:
+        code |= FAMILY
+    if not financial_ok:
+        code |= FINANCIAL
+    return code
+
+
+def _as_scheme(row):
+    return SimpleNamespace(
+        scheme_id=row["scheme_id"], name=row.get("name"), description=row.get("description"),
+        max_income=row.get("max_income"), min_family_size=row.get("min_family_size"),
+    )
+
+
+class SchemeSet:
+    """
+    Immutable, compiled set of schemes. `max_income` and `min_family_size` are
+    arrays in `ids` order, with NULLs turned into inf and 0. `generation` is
+    the catalog generation the set was loaded as.
+    """
+
+    def __init__(self, schemes, generation=0):
+        import numpy as np
+        self.generation = generation
+        self.schemes = {s.scheme_id: s for s in schemes}
+        self.ids = list(self.schemes)
+        self.position = {scheme_id: i for i, scheme_id in enumerate(self.ids)}
+        self.max_income = np.array(
+            [np.inf if s.max_income is None else s.max_income for s in self.schemes.values()], dtype=float
+        )
+        self.min_family_size = np.array(
+            [s.min_family_size or 0 for s in self.schemes.values()], dtype=float
+        )
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds a set from mappings with the Scheme column names."""
+        return cls([_as_scheme(row) for row in rows])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def criteria(self):
+        """What eligibility decisions depend on, per scheme."""
+        return [(s.scheme_id, s.max_income, s.min_family_size) for s in self.schemes.values()]
+
+    def get(self, scheme_id):
+        return self.schemes.get(scheme_id)
+
+    def failure_codes(self, income, family_size, financial_ok, scheme_ids=None):
+        """
+        (n_profiles, n_schemes) array of failed-check bits for profile columns
+        income, family_size and financial_ok. Restricted to `scheme_ids` (in
+        that order) when given; unknown ids must be filtered out first.
+        """
+        import numpy as np
+        max_income, min_family_size = self.max_income, self.min_family_size
+        if scheme_ids is not None:
+            columns = [self.position[scheme_id] for scheme_id in scheme_ids]
+            max_income, min_family_size = max_income[columns], min_family_size[columns]
+        income = np.asarray(income, dtype=float)[:, None]
+        family_size = np.asarray(family_size, dtype=float)[:, None]
+        financial_ok = np.asarray(financial_ok, dtype=bool)[:, None]
+        return _codes(income, family_size, financial_ok, max_income, min_family_size)
+
+    def item_failure_codes(self, income, family_size, financial_ok, columns):
+        """
+        Failed-check bits of profile i against scheme column columns[i] only.
+        A None column (unknown scheme) gets an arbitrary code.
+        """
+        import numpy as np
+        columns = np.array([0 if c is None else c for c in columns], dtype=np.intp)
+        if not len(self.ids):
+            return np.zeros(len(columns), dtype=np.uint8)
+        return _codes(
+            np.asarray(income, dtype=float), np.asarray(family_size, dtype=float),
+            np.asarray(financial_ok, dtype=bool), self.max_income[columns], self.min_family_size[columns]
+        )
+
+
+def _codes(income, family_size, financial_ok, max_income, min_family_size):
+    import numpy as np
+    return (
+        (income > max_income) * INCOME
+        | (family_size < min_family_size) * FAMILY
+        | ~financial_ok * FINANCIAL
+    ).astype(np.uint8)
+
+
+class SchemeCatalog:
+    def __init__(self, refresh_seconds=SCHEME_REFRESH_SECONDS):
+        self.refresh_seconds = refresh_seconds
+        self._set = None
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        self.refreshes = 0
+        self.generation = 0
+
+    # --- Loading ---
+    def is_stale(self):
+        return self._set is None or time.monotonic() >= self._next_refresh
+
+    def invalidate(self):
+        self._next_refresh = 0.0
+
+    def load(self, rows):
+        """
+        Replaces the catalog with schemes built from plain rows (no database).
+        Bumps the generation when their criteria differ from the loaded ones,
+        including edits made by other workers.
+        """
+        scheme_set = SchemeSet.from_rows(rows)
+        with self._lock:
+            if self._set is not None and self._set.criteria() != scheme_set.criteria():
+                self.generation += 1
+            scheme_set.generation = self.generation
+            self._set = scheme_set
+            self.refreshes += 1
+        return scheme_set
+
+    def refresh(self, db: Session):
+        """Reloads every Scheme row (sync Session)."""
+        # Push the deadline first so concurrent callers keep using the old snapshot
+        self._next_refresh = time.monotonic() + self.refresh_seconds
+        S = models.Scheme
+        rows = db.execute(
+            select(S.scheme_id, S.name, S.description, S.max_income, S.min_family_size).order_by(S.scheme_id)
+        ).mappings()
+        return self.load(rows)
+
+    def refresh_if_stale(self, db: Session):
+        if self.is_stale():
+            self.refresh(db)
+
+    async def ensure_fresh(self, db):
+        """Refreshes through an AsyncSession when the snapshot is older than the interval."""
+        if self.is_stale():
+            await db.run_sync(self.refresh)
+
+    # --- Lookup ---
+    def current(self):
+        """The loaded SchemeSet; callers keep one snapshot for a whole request."""
+        if self._set is None:
+            raise RuntimeError("Scheme catalog not loaded; call refresh() first")
+        return self._set
+
+    def get(self, scheme_id):
+        return self.current().get(scheme_id)
+
+    def stats(self):
+        return {
+            "schemes": len(self._set) if self._set is not None else 0,
+            "refreshes": self.refreshes,
+            "generation": self.generation,
+            "refresh_seconds": self.refresh_seconds,
+        }
+
+
+SCHEME_CATALOG = SchemeCatalog()
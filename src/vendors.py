@@ -0,0 +1,174 @@
+# src/vendors.py
+"""
+Vendor assignment for accepted proposals.
+
+VendorIndex keeps the vendor table in memory, grouped into pools by
+(scheme_id, region), and refreshes it periodically instead of loading every
+vendor row per disbursement. A vendor with no scheme or region serves all.
+
+Strategies (EXPENSEAI_VENDOR_STRATEGY):
+  - "random":      uniform pick (the original behavior)
+  - "round_robin": rotate through the pool
+  - "load":        weighted pick favoring vendors with less recent expense
+                   volume, O(1) per pick via an alias table
+"""
+import datetime
+import random
+import threading
+import time
+from itertools import count
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from . import models
+from .config import (
+    VENDOR_ACTIVE_ONLY, VENDOR_LOAD_WINDOW_HOURS, VENDOR_REFRESH_SECONDS, VENDOR_STRATEGY
+)
+
+
+def _alias_table(weights):
+    """Vose's alias method: O(n) build, O(1) weighted sampling."""
+    n = len(weights)
+    total = float(sum(weights))
+    prob = [w * n / total for w in weights]
+    alias = [0] * n
+    small = [i for i, p in enumerate(prob) if p < 1.0]
+    large = [i for i, p in enumerate(prob) if p >= 1.0]
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1.0 - prob[s]
+        (small if prob[l] < 1.0 else large).append(l)
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+
+class _Pool:
+    def __init__(self, vendors, loads):
+        self.cnics = [v["cnic"] for v in vendors]
+        # Fewer recent expenses -> larger share of new assignments
+        self.prob, self.alias = _alias_table([1.0 / (1.0 + loads.get(c, 0)) for c in self.cnics])
+        self.turn = count()
+
+
+class VendorIndex:
+    def __init__(self, strategy=VENDOR_STRATEGY, refresh_seconds=VENDOR_REFRESH_SECONDS,
+                 load_window_hours=VENDOR_LOAD_WINDOW_HOURS, active_only=VENDOR_ACTIVE_ONLY):
+        if strategy not in ("random", "round_robin", "load"):
+            raise ValueError(f"Unknown vendor strategy: {strategy}")
+        self.strategy = strategy
+        self.refresh_seconds = refresh_seconds
+        self.load_window = datetime.timedelta(hours=load_window_hours)
+        self.active_only = active_only
+        self._vendors = []
+        self._loads = {}   # vendor_cnic -> expenses in the load window (+ assignments since)
+        self._pools = {}   # (scheme_id, region) -> _Pool, built on first use
+        self._cnics = None  # set of vendor CNICs, built on first use
+        self._next_refresh = 0.0
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+        self.refreshes = 0
+        self.assignments = 0
+
+    # --- Loading ---
+    def is_stale(self):
+        return time.monotonic() >= self._next_refresh
+
+    def invalidate(self):
+        self._next_refresh = 0.0
+
+    def refresh(self, db: Session):
+        """Reloads vendors and their recent expense volume (sync Session)."""
+        # Push the deadline first so concurrent callers keep using the old snapshot
+        self._next_refresh = time.monotonic() + self.refresh_seconds
+        query = select(models.User.cnic, models.User.scheme_id, models.User.region).where(
+            models.User.role == "vendor"
+        )
+        if self.active_only:
+            query = query.where(models.User.is_active.is_(True))
+        vendors = [dict(row) for row in db.execute(query).mappings()]
+
+        since = datetime.datetime.utcnow() - self.load_window
+        loads = dict(db.execute(
+            select(models.Expense.vendor_cnic, func.count())
+            .where(models.Expense.created_at >= since)
+            .group_by(models.Expense.vendor_cnic)
+        ).all())
+
+        with self._lock:
+            self._vendors, self._loads, self._pools, self._cnics = vendors, loads, {}, None
+            self.refreshes += 1
+
+    async def ensure_fresh(self, db):
+        """Refreshes through an AsyncSession when the snapshot is older than the interval."""
+        if self.is_stale():
+            await db.run_sync(self.refresh)
+
+    def add_vendor(self, user):
+        """Makes a newly registered vendor assignable without a reload."""
+        with self._lock:
+            self._vendors = self._vendors + [{"cnic": user.cnic, "scheme_id": user.scheme_id, "region": user.region}]
+            self._pools, self._cnics = {}, None
+
+    # --- Selection ---
+    def _pool(self, scheme_id, region):
+        key = (scheme_id, region)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                members = [
+                    v for v in self._vendors
+                    if v["scheme_id"] in (None, scheme_id)
+                    and (region is None or v["region"] in (None, region))
+                ]
+                pool = _Pool(members, self._loads) if members else None
+                self._pools[key] = pool
+        return pool
+
+    def choose(self, scheme_id, region=None):
+        """Returns a vendor CNIC for the scheme (and region), or None if none serve it."""
+        pool = self._pool(scheme_id, region)
+        if pool is None:
+            return None
+        n = len(pool.cnics)
+        if self.strategy == "round_robin":
+            i = next(pool.turn) % n
+        elif self.strategy == "load":
+            i = self._rng.randrange(n)
+            if self._rng.random() >= pool.prob[i]:
+                i = pool.alias[i]
+        else:
+            i = self._rng.randrange(n)
+        return pool.cnics[i]
+
+    def seed(self, value):
+        """Makes the "random" and "load" picks repeatable from here on (benchmarks)."""
+        self._rng.seed(value)
+
+    def is_vendor(self, cnic):
+        """Whether `cnic` is a known (and, with VENDOR_ACTIVE_ONLY, active) vendor."""
+        cnics = self._cnics
+        if cnics is None:
+            with self._lock:
+                cnics = self._cnics = {v["cnic"] for v in self._vendors}
+        return cnic in cnics
+
+    def record_assignment(self, vendor_cnic):
+        """Counts an assignment; load weights pick it up at the next refresh."""
+        with self._lock:
+            self._loads[vendor_cnic] = self._loads.get(vendor_cnic, 0) + 1
+            self.assignments += 1
+
+    def stats(self):
+        return {
+            "strategy": self.strategy,
+            "vendors": len(self._vendors),
+            "pools": len(self._pools),
+            "refreshes": self.refreshes,
+            "assignments": self.assignments,
+        }
+
+
+VENDOR_INDEX = VendorIndex()
@@ -1,84 +1,171 @@
 # train_model.py
-import pandas as pd
-import random
+import argparse
 import os
+import resource
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+import pandas as pd
 import joblib
 import matplotlib.pyplot as plt
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.ensemble import RandomForestRegressor
+from src.inference import flatten_forest
 from sklearn.metrics import (
     accuracy_score, f1_score, classification_report, ConfusionMatrixDisplay,
     mean_absolute_error, r2_score
 )
 
-random.seed(42)
-os.environ['PYTHONHASHSEED'] = '42'
+SEED = 42
+COLUMNS = [
+    'income', 'family_size', 'utility_bills_paid',
+    'loan_defaults', 'credit_history_years', 'suspicious_transactions',
+    'is_eligible', 'trust_score'
+]
+# Large runs only sample this many rows for plots and the flattened-forest error check
+PLOT_SAMPLE = 20000
+REFERENCE_SAMPLE = 100000
+
+# --- Stage Timing ---
+STAGES = []
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+@contextmanager
+def stage(name):
+    """Records wall time and peak RSS growth for one pipeline stage."""
+    peak_before = _peak_rss_mb()
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    peak = _peak_rss_mb()
+    STAGES.append((name, elapsed, peak, peak - peak_before))
+    print(f"[{name}] {elapsed:.2f}s, peak RSS {peak:.0f} MB (+{peak - peak_before:.0f} MB)")
+
+def print_stage_report():
+    print("\n--- Stage Report ---")
+    print(f"{'stage':<28}{'seconds':>10}{'peak MB':>10}{'+MB':>8}")
+    for name, elapsed, peak, grown in STAGES:
+        print(f"{name:<28}{elapsed:>10.2f}{peak:>10.0f}{grown:>8.0f}")
 
 # --- 1. Synthetic Data Generation ---
-def generate_synthetic_data(num_samples=10000):
-    data = []
+def _generate_block(rng, num_samples):
+    # -- Features --
+    income = rng.integers(20000, 100000, size=num_samples, endpoint=True, dtype=np.int32)
+    family_size = rng.integers(1, 10, size=num_samples, endpoint=True, dtype=np.int8)
+    utility_bills_paid = rng.integers(0, 1, size=num_samples, endpoint=True, dtype=np.int8)
+
+    # New Features for Trust Score
+    loan_defaults = (rng.random(num_samples) < 0.25).astype(np.int8) # 25% chance of default
+    credit_history_years = rng.integers(0, 20, size=num_samples, endpoint=True, dtype=np.int8)
+    suspicious_transactions = rng.integers(0, 5, size=num_samples, endpoint=True, dtype=np.int8)
+
+    # -- Ground Truth Logic: Eligibility (Classification) --
+    is_eligible = (
+        (utility_bills_paid == 1)
+        & ((income <= 50000) | ((income <= 70000) & (family_size >= 4)))
+    ).astype(np.int8)
+
+    # -- Ground Truth Logic: Trust Score (Regression 0-100) --
+    # Base score 50
+    score = np.full(num_samples, 50.0)
+    score += utility_bills_paid * 20          # +20 if bills paid
+    score += credit_history_years * 1.5       # +1.5 per year of history
+    score -= loan_defaults * 30               # -30 if defaulted
+    score -= suspicious_transactions * 10     # -10 per suspicious txn
+    score += income / 5000                    # Slight boost from income
+
+    # Clamp between 0 and 100
+    np.clip(score, 0, 100, out=score)
+    # Add some random noise to make it realistic for ML
+    score += rng.integers(-5, 5, size=num_samples, endpoint=True)
+    np.clip(score, 0, 100, out=score)
+
+    return pd.DataFrame({
+        'income': income, 'family_size': family_size, 'utility_bills_paid': utility_bills_paid,
+        'loan_defaults': loan_defaults, 'credit_history_years': credit_history_years,
+        'suspicious_transactions': suspicious_transactions,
+        'is_eligible': is_eligible, 'trust_score': score
+    }, columns=COLUMNS)
+
+def iter_synthetic_chunks(num_samples, chunk_size=1_000_000, seed=SEED):
+    """
+    Yields the dataset in DataFrames of at most chunk_size rows.
+    Each chunk draws from its own child of SeedSequence(seed), so a given
+    (num_samples, chunk_size, seed) always produces the same rows.
+    """
+    n_chunks = max(1, -(-num_samples // chunk_size))
+    for i, child in enumerate(np.random.SeedSequence(seed).spawn(n_chunks)):
+        rows = min(chunk_size, num_samples - i * chunk_size)
+        yield _generate_block(np.random.default_rng(child), rows)
+
+def generate_synthetic_data(num_samples=10000, chunk_size=1_000_000, seed=SEED, path=None):
+    """
+    Vectorized synthetic dataset. With `path`, chunks are also streamed to
+    a CSV file or, for .parquet paths, a Parquet file (needs pyarrow).
+    """
     print(f"Generating {num_samples} synthetic records...")
-    
-    for _ in range(num_samples):
-        # -- Features --
-        income = random.randint(20000, 100000)
-        family_size = random.randint(1, 10)
-        utility_bills_paid = random.choice([0, 1]) 
-        
-        # New Features for Trust Score
-        loan_defaults = random.choice([0, 0, 0, 1]) # 25% chance of default
-        credit_history_years = random.randint(0, 20)
-        suspicious_transactions = random.randint(0, 5)
-
-        # -- Ground Truth Logic: Eligibility (Classification) --
-        is_eligible = 0
-        if utility_bills_paid == 1:
-            if income <= 50000:
-                is_eligible = 1
-            elif income <= 70000 and family_size >= 4:
-                is_eligible = 1
-        
-        # -- Ground Truth Logic: Trust Score (Regression 0-100) --
-        # Base score 50
-        score = 50 
-        score += (utility_bills_paid * 20)      # +20 if bills paid
-        score += (credit_history_years * 1.5)   # +1.5 per year of history
-        score -= (loan_defaults * 30)           # -30 if defaulted
-        score -= (suspicious_transactions * 10) # -10 per suspicious txn
-        score += (income / 5000)                # Slight boost from income
-        
-        # Clamp between 0 and 100
-        score = max(0, min(100, score))
-        # Add some random noise to make it realistic for ML
-        score += random.randint(-5, 5)
-        score = max(0, min(100, score))
-
-        data.append([
-            income, family_size, utility_bills_paid, 
-            loan_defaults, credit_history_years, suspicious_transactions,
-            is_eligible, score
-        ])
-
-    columns = [
-        'income', 'family_size', 'utility_bills_paid', 
-        'loan_defaults', 'credit_history_years', 'suspicious_transactions',
-        'is_eligible', 'trust_score'
-    ]
-    return pd.DataFrame(data, columns=columns)
+    writer = None
+    chunks = []
+    try:
+        for i, chunk in enumerate(iter_synthetic_chunks(num_samples, chunk_size, seed)):
+            if path and path.endswith(".parquet"):
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                writer = writer or pq.ParquetWriter(path, table.schema)
+                writer.write_table(table)
+            elif path:
+                chunk.to_csv(path, mode="w" if i == 0 else "a", header=i == 0, index=False)
+            chunks.append(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else chunks[0]
 
-def train():
-    df = generate_synthetic_data()
-    df.to_csv("synthetic_data.csv", index=False)
-    print("Synthetic data saved to synthetic_data.csv")
+# --- Publishing Artifacts ---
+# The API hot-reloads artifacts, so they are written to a staging directory
+# first and only moved into place once all of them are complete. They all get
+# one mtime: the registry does not hot-reload a set whose mtimes disagree until
+# it has stayed that way for a check interval, which covers the moment between
+# the moves into src/.
+ARTIFACTS = ["eligibility_model.pkl", "trust_model.pkl", "trust_model_flat.npz"]
+
+def publish_artifacts(staging, version=None):
+    """Moves staged artifacts to src/ or, for a named version, to src/versions/<version>/."""
+    stamp = time.time_ns()
+    for name in ARTIFACTS:
+        os.utime(os.path.join(staging, name), ns=(stamp, stamp))
+    if version:
+        target = os.path.join("src", "versions", version)
+        if os.path.exists(target):
+            raise FileExistsError(f"Model version {version} already exists at {target}")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.rename(staging, target)
+    else:
+        target = "src"
+        for name in ARTIFACTS:
+            os.replace(os.path.join(staging, name), os.path.join(target, name))
+        shutil.rmtree(staging)
+    return target
+
+def train(rows=10000, n_jobs=-1, data_path="synthetic_data.csv", chunk_size=1_000_000, seed=SEED, version=None):
+    with stage("generate data"):
+        df = generate_synthetic_data(rows, chunk_size, seed, data_path)
+    if data_path:
+        print(f"Synthetic data saved to {data_path}")
     
     os.makedirs("results/eligibility_model", exist_ok=True)
     os.makedirs("results/trust_model", exist_ok=True)
     
-    # Create src directory
+    # Create src directory and a staging area for this run's artifacts
     if not os.path.exists("src"):
         os.makedirs("src")
+    staging = tempfile.mkdtemp(prefix=".staging-", dir="src")
 
     # ==========================================
     # MODEL 1: Eligibility Classifier
@@ -89,47 +176,50 @@ def train():
     
     X_train_c, X_test_c, y_train_c, y_test_c = train_test_split(X_cls, y_cls, test_size=0.2, random_state=42)
     
-    clf = LogisticRegression(max_iter=1000, random_state=42)
-    clf.fit(X_train_c, y_train_c)
+    with stage("train eligibility"):
+        clf = LogisticRegression(max_iter=1000, random_state=42)
+        clf.fit(X_train_c, y_train_c)
     
     # Evaluation
-    y_pred_c = clf.predict(X_test_c)
-    acc = accuracy_score(y_test_c, y_pred_c)
-    f1 = f1_score(y_test_c, y_pred_c)
+    with stage("evaluate eligibility"):
+        y_pred_c = clf.predict(X_test_c)
+        acc = accuracy_score(y_test_c, y_pred_c)
+        f1 = f1_score(y_test_c, y_pred_c)
+        report = classification_report(y_test_c, y_pred_c, output_dict=True)
     print(f"Accuracy: {acc:.2%}, F1: {f1:.2f}")
 
     # Save Classifier
-    joblib.dump(clf, "src/eligibility_model.pkl")
-
-    # Graph: Confusion Matrix
-    plt.figure(figsize=(6, 5))
-    ConfusionMatrixDisplay.from_estimator(clf, X_test_c, y_test_c, cmap=plt.cm.Blues)
-    plt.title("Eligibility Confusion Matrix")
-    plt.savefig(os.path.join("results/eligibility_model", "confusion_matrix.png"))
-    plt.close()
-    
-    # Calculate and Save Classification Report(f1, recall, precision, accuracy) as bar chart
-    report = classification_report(y_test_c, y_pred_c, output_dict=True)
-    metrics = ['precision', 'recall', 'f1-score']
-    labels = ['0', '1']
-    x = np.arange(len(labels))
-    width = 0.2
-    plt.figure(figsize=(8, 6))
-    for i, metric in enumerate(metrics):
-        values = [report[label][metric] for label in labels]
-        plt.bar(x + i*width, values, width, label=metric)
-    
-    # Add accuracy as a horizontal line
-    plt.axhline(y=acc, color='red', linestyle='--', linewidth=2, label=f'Accuracy: {acc:.2f}')
-    
-    plt.xlabel("Classes")
-    plt.ylabel("Scores")
-    plt.title("Classification Report Metrics")
-    plt.xticks(x + width, labels)
-    plt.ylim(0, 1)
-    plt.legend()
-    plt.savefig(os.path.join("results/eligibility_model", "classification_report.png"))
-    plt.close()
+    joblib.dump(clf, os.path.join(staging, "eligibility_model.pkl"))
+
+    with stage("plot eligibility"):
+        # Graph: Confusion Matrix
+        plt.figure(figsize=(6, 5))
+        ConfusionMatrixDisplay.from_predictions(y_test_c, y_pred_c, cmap=plt.cm.Blues)
+        plt.title("Eligibility Confusion Matrix")
+        plt.savefig(os.path.join("results/eligibility_model", "confusion_matrix.png"))
+        plt.close()
+        
+        # Save Classification Report(f1, recall, precision, accuracy) as bar chart
+        metrics = ['precision', 'recall', 'f1-score']
+        labels = ['0', '1']
+        x = np.arange(len(labels))
+        width = 0.2
+        plt.figure(figsize=(8, 6))
+        for i, metric in enumerate(metrics):
+            values = [report[label][metric] for label in labels]
+            plt.bar(x + i*width, values, width, label=metric)
+        
+        # Add accuracy as a horizontal line
+        plt.axhline(y=acc, color='red', linestyle='--', linewidth=2, label=f'Accuracy: {acc:.2f}')
+        
+        plt.xlabel("Classes")
+        plt.ylabel("Scores")
+        plt.title("Classification Report Metrics")
+        plt.xticks(x + width, labels)
+        plt.ylim(0, 1)
+        plt.legend()
+        plt.savefig(os.path.join("results/eligibility_model", "classification_report.png"))
+        plt.close()
 
     # ==========================================
     # MODEL 2: Trust Score Regressor
@@ -145,31 +235,56 @@ def train():
 
     X_train_r, X_test_r, y_train_r, y_test_r = train_test_split(X_reg, y_reg, test_size=0.2, random_state=42)
 
-    reg = RandomForestRegressor(n_estimators=100, random_state=42)
-    reg.fit(X_train_r, y_train_r)
+    with stage("train trust"):
+        # Trees are built in parallel; n_jobs=-1 uses every core
+        reg = RandomForestRegressor(n_estimators=100, random_state=42, n_jobs=n_jobs)
+        reg.fit(X_train_r, y_train_r)
 
     # Evaluation
-    y_pred_r = reg.predict(X_test_r)
-    mae = mean_absolute_error(y_test_r, y_pred_r)
-    r2 = r2_score(y_test_r, y_pred_r)
+    with stage("evaluate trust"):
+        y_pred_r = reg.predict(X_test_r)
+        mae = mean_absolute_error(y_test_r, y_pred_r)
+        r2 = r2_score(y_test_r, y_pred_r)
     print(f"Mean Absolute Error: {mae:.2f} points")
     print(f"R2 Score: {r2:.2f}")
 
     # Save Regressor
-    joblib.dump(reg, "src/trust_model.pkl")
+    with stage("save trust"):
+        joblib.dump(reg, os.path.join(staging, "trust_model.pkl"))
+
+        # Save the array-backed forest used by the "flat" trust engine
+        flat = flatten_forest(reg, reference_X=X_test_r.head(REFERENCE_SAMPLE))
+        flat.save(os.path.join(staging, "trust_model_flat.npz"))
+    print(f"Flattened forest: {flat.n_nodes} nodes, max abs error {flat.meta['max_abs_error']:.4f}")
+
+    # Graph: Actual vs Predicted Trust Scores (a sample keeps large runs plottable)
+    with stage("plot trust"):
+        shown = np.random.default_rng(seed).permutation(len(y_test_r))[:PLOT_SAMPLE]
+        plt.figure(figsize=(10, 6))
+        plt.scatter(y_test_r.to_numpy()[shown], y_pred_r[shown], alpha=0.3, color='purple')
+        plt.plot([0, 100], [0, 100], color='red', linestyle='--') # Ideal line
+        plt.xlabel("Actual Trust Score")
+        plt.ylabel("Predicted Trust Score")
+        plt.title(f"Trust Score Prediction (MAE: {mae:.2f})")
+        plt.grid(True)
+        plt.savefig(os.path.join("results/trust_model", "actual_vs_predicted.png"))
+        plt.close()
 
-    # Graph: Actual vs Predicted Trust Scores
-    plt.figure(figsize=(10, 6))
-    plt.scatter(y_test_r, y_pred_r, alpha=0.3, color='purple')
-    plt.plot([0, 100], [0, 100], color='red', linestyle='--') # Ideal line
-    plt.xlabel("Actual Trust Score")
-    plt.ylabel("Predicted Trust Score")
-    plt.title(f"Trust Score Prediction (MAE: {mae:.2f})")
-    plt.grid(True)
-    plt.savefig(os.path.join("results/trust_model", "actual_vs_predicted.png"))
-    plt.close()
+    target = publish_artifacts(staging, version)
+    print(f"\nTraining complete. Models saved to {target}, graphs to results/.")
+    print_stage_report()
 
-    print("\nTraining complete. Models and graphs saved.")
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic data and train the ExpenseAI models.")
+    parser.add_argument("--rows", type=int, default=10000, help="Synthetic rows to generate (default: 10000)")
+    parser.add_argument("--n-jobs", type=int, default=-1, help="Parallel jobs for the trust forest (default: all cores)")
+    parser.add_argument("--data", default="synthetic_data.csv",
+                        help="Where to write the dataset; .parquet writes Parquet, '' skips it")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="Rows generated (and written) per chunk")
+    parser.add_argument("--seed", type=int, default=SEED)
+    parser.add_argument("--version", help="Publish to src/versions/<version>/ (e.g. a timestamp) instead of src/")
+    args = parser.parse_args()
+    train(args.rows, args.n_jobs, args.data, args.chunk_size, args.seed, args.version)
 
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    main()